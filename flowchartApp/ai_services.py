@@ -1,57 +1,109 @@
-import requests
-import re
+import os
+import time
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
+import metrics
+from flowchart_cache import FlowchartCache, make_cache_key
+from flowchart_library import LIBRARY_PATH, FlowchartLibrary
+from ollama_client import KEEP_ALIVE, OLLAMA_HOST, StreamTally, get_client
+from prompt_index import PromptIndex
+from single_flight import SingleFlight
+# parse_steps / build_flowchart used to live here; still importable from this module
+from step_parser import StepParser, build_flowchart, parse_step_line, parse_steps
+
+OLLAMA_URL = f"{OLLAMA_HOST}/api/generate"
 OLLAMA_MODEL = "phi3"
 
+# bump whenever the prompt below changes so stale cached charts are not reused
+PROMPT_TEMPLATE_VERSION = 1
 
-import json
+# Ollama options per profile. num_predict bounds the worst case; the stop
+# strings catch the "Explanation:" paragraph phi3 likes to add after "End".
+GENERATION_PROFILES = {
+    "default": {"num_predict": 400, "temperature": 0.2, "num_ctx": 2048,
+                "stop": ["\n\n\n", "\nExplanation", "\nNote:", "\nThis flowchart"]},
+    "fast": {"num_predict": 200, "temperature": 0.0, "num_ctx": 1024,
+             "stop": ["\n\n\n", "\nExplanation", "\nNote:"]},
+    "long": {"num_predict": 1200, "temperature": 0.2, "num_ctx": 4096,
+             "stop": ["\n\n\n", "\nExplanation", "\nNote:", "\nThis flowchart"]},
+}
+GENERATION_PROFILE = os.getenv("FLOWCHART_PROFILE", "default")
+# hard stop for runaway completions, whatever the profile says
+MAX_RESPONSE_BYTES = int(os.getenv("FLOWCHART_MAX_RESPONSE_BYTES", 16384))
 
-def _ollama_call(prompt: str) -> str:
-    payload = {
-        "model": OLLAMA_MODEL,
-        "prompt": prompt,
-        "stream": False
-    }
-    try:
-        response = requests.post(OLLAMA_URL, json=payload, timeout=120)
-        response.raise_for_status()
-        
-        
-        try:
-            return response.json().get("response", "")
-        except json.JSONDecodeError:
-            
-            full_response = []
-            for line in response.text.strip().split('\n'):
-                if line.strip():
-                    try:
-                        obj = json.loads(line)
-                        if "response" in obj:
-                            full_response.append(obj["response"])
-                    except json.JSONDecodeError:
-                        continue 
-            
-            if full_response:
-                return "".join(full_response)
-            
-          
-            raise ValueError(f"Failed to parse Ollama response. Raw text snippet: {response.text[:200]}")
-            
-    except Exception as e:
-        raise Exception(f"Ollama API Error: {str(e)}")
-
-
-def generate_flowchart_with_ai(user_prompt: str):
+CUTOFFS = metrics.counter("flowchart_generation_cutoff_total",
+                          "Streams closed before Ollama finished", ("reason",))
+
+flowchart_cache = FlowchartCache()
+# identical prompts arriving together share one generation
+inflight = SingleFlight()
+# reworded prompts reuse a chart already in flowchart_cache
+prompt_index = PromptIndex()
+# fresh generations are also kept in the searchable library, see `save` (FLOWCHART_LIBRARY_PATH="" turns it off)
+library = FlowchartLibrary() if LIBRARY_PATH else None
+
+
+def _profile(name=None):
+    name = name or GENERATION_PROFILE
+    if name not in GENERATION_PROFILES:
+        raise ValueError(f"Unknown generation profile {name!r} (have {', '.join(GENERATION_PROFILES)})")
+    return name
+
+
+def _cache_version(profile):
+    # profiles change what the model returns, but keep existing default-profile keys valid
+    return PROMPT_TEMPLATE_VERSION if profile == "default" else f"{PROMPT_TEMPLATE_VERSION}/{profile}"
+
+
+def _similar_cached(user_prompt, profile):
+    with metrics.span("similar"):
+        match = prompt_index.lookup(user_prompt, scope=f"{OLLAMA_MODEL}:{_cache_version(profile)}")
+        if match is None:
+            return None
+        key, score, kind = match
+        result = flowchart_cache.get(key)
+    if result is not None:
+        metrics.annotate(cache="similar", similarity=round(score, 3), match=kind)
+    return result
+
+
+def _remember(user_prompt, cache_key, result, profile):
+    flowchart_cache.put(cache_key, result)
+    prompt_index.add(user_prompt, cache_key, scope=f"{OLLAMA_MODEL}:{_cache_version(profile)}")
+
+
+def cached_flowchart(user_prompt: str, profile: str = None):
+    """The cached chart for exactly this prompt (after normalizing), or None. Never calls the model."""
+    profile = _profile(profile)
+    return flowchart_cache.get(make_cache_key(user_prompt, OLLAMA_MODEL, _cache_version(profile)))
+
+
+def _ollama_stream(prompt: str, profile="default"):
     """
-    BULLETPROOF STRATEGY:
-    - LLM gives ONLY a numbered list
-    - Python extracts ONLY valid numbered steps
-    - Python builds nodes + edges
-    - NO JSON parsing from AI
+    Yield completion text as Ollama produces it.
+    With "stream": True the body is NDJSON, one object per generated chunk.
+    Connect failures and 5xx are retried inside the client; anything raised
+    here is an OllamaError subclass saying what went wrong.
     """
+    options = GENERATION_PROFILES[profile]
+    tally = StreamTally()
+    chunks = get_client().generate_stream(prompt, OLLAMA_MODEL, options=options, keep_alive=KEEP_ALIVE)
+    try:
+        for obj in chunks:
+            tally.add(obj)
+            if obj.get("response"):
+                yield obj["response"]
+            if obj.get("done"):
+                metrics.record_ollama_stats(obj)
+    finally:
+        chunks.close()
+        # closed before Ollama's final object (a cutoff): its stats never
+        # arrive, record what the chunks themselves tell us
+        if not tally.done and tally.tokens:
+            metrics.record_ollama_stats(tally.final())
+
 
-    prompt = f"""
+def build_prompt(user_prompt: str) -> str:
+    return f"""
 Return ONLY a numbered list of flowchart steps.
 Do NOT explain.
 Do NOT output JSON.
@@ -76,109 +128,136 @@ Example:
 6. End
 """
 
+
+def generate_flowchart_with_ai(user_prompt: str, use_cache: bool = True, profile: str = None,
+                               save: bool = None):
+    """
+    BULLETPROOF STRATEGY:
+    - LLM gives ONLY a numbered list
+    - Python extracts ONLY valid numbered steps
+    - Python builds nodes + edges
+    - NO JSON parsing from AI
+    - Results are cached by normalized prompt + model + template version,
+      and reworded prompts close enough to a cached one reuse its chart
+    - Fresh charts go to the library when `save` is true (default: use_cache)
+    - Concurrent identical requests share one generation
+    - Reading stops at "End" once every decision has its branches
+    """
+
+    profile = _profile(profile)
+    with metrics.start_trace(model=OLLAMA_MODEL, profile=profile):
+        cache_key = make_cache_key(user_prompt, OLLAMA_MODEL, _cache_version(profile))
+        if use_cache:
+            cached = flowchart_cache.get(cache_key)
+            if cached is not None:
+                metrics.annotate(cache="hit")
+                return cached
+            similar = _similar_cached(user_prompt, profile)
+            if similar is not None:
+                return similar
+        metrics.annotate(cache="miss" if use_cache else "off")
+
+        return inflight.do(cache_key, lambda: _generate(user_prompt, cache_key, use_cache, profile, save))
+
+
+def _generate(user_prompt, cache_key, use_cache, profile, save):
+    # streamed under the hood too, so the early cutoff applies
+    result = None
+    for result in _generate_stream(user_prompt, cache_key, use_cache, profile, save):
+        pass
+    return result
+
+
+def generate_flowchart_stream(user_prompt: str, use_cache: bool = True, profile: str = None,
+                              save: bool = None):
+    """
+    Streaming version of generate_flowchart_with_ai.
+    Yields a growing {"nodes", "edges"} dict each time a complete numbered
+    line arrives; the last value yielded is the finished flowchart.
+    """
+
+    profile = _profile(profile)
+    cache_key = make_cache_key(user_prompt, OLLAMA_MODEL, _cache_version(profile))
+    if use_cache:
+        cached = flowchart_cache.get(cache_key)
+        if cached is not None:
+            metrics.annotate(cache="hit")
+            yield cached
+            return
+        similar = _similar_cached(user_prompt, profile)
+        if similar is not None:
+            yield similar
+            return
+    metrics.annotate(cache="miss" if use_cache else "off", model=OLLAMA_MODEL, profile=profile)
+
+    yield from inflight.stream(cache_key, lambda: _generate_stream(user_prompt, cache_key, use_cache, profile, save))
+
+
+def _generate_stream(user_prompt, cache_key, use_cache, profile, save):
+    builder = StepParser()
+    buffer = ""
+    received = 0
+    cutoff = None
+    parse_time = 0.0
+    consumer_time = 0.0
+    started = time.perf_counter()
+
+    stream = _ollama_stream(build_prompt(user_prompt), profile)
     try:
-        raw_text = _ollama_call(prompt)
-    except Exception as e:
-       
-        raise e
-
-  
-    steps = []
-    for line in raw_text.splitlines():
-        
-        match = re.match(r"^\s*(\d+)\.\s*(?:\((Yes|No|Else)\))?\s*(.*)", line, re.IGNORECASE)
-        if match:
-            step_num = match.group(1)
-            branch_type = match.group(2) 
-            text = match.group(3).strip()
-            
-            steps.append({
-                "id": step_num,
-                "branch": branch_type.lower() if branch_type else None,
-                "text": text,
-                "raw": line
-            })
-
-    if len(steps) < 2:
+        for chunk in stream:
+            buffer += chunk
+            received += len(chunk.encode("utf-8"))
+            # past the limit, still parse the lines already complete before stopping
+            over_limit = received > MAX_RESPONSE_BYTES
+            if "\n" not in buffer and not over_limit:
+                continue
+
+            parse_start = time.perf_counter()
+            *lines, buffer = buffer.split("\n")
+            added = False
+            for line in lines:
+                if builder.feed(line):
+                    added = True
+                    if builder.complete():
+                        cutoff = "end"
+                        break
+            parse_time += time.perf_counter() - parse_start
+            if over_limit and not cutoff:
+                cutoff = "bytes"
+
+            if cutoff:
+                break
+            if added:
+                yield_start = time.perf_counter()
+                yield builder.snapshot()
+                consumer_time += time.perf_counter() - yield_start
+    finally:
+        # closing the HTTP response makes Ollama stop generating the tail we'd throw away
+        stream.close()
+
+    if cutoff:
+        CUTOFFS.inc(reason=cutoff)
+        metrics.annotate(cutoff=cutoff, response_bytes=received)
+    elif buffer:
+        builder.feed(buffer)
+    diagnostics = builder.finish()
+    if diagnostics:
+        metrics.annotate(parse_warnings=len(diagnostics))
+
+    # time spent waiting on the model, excluding our parsing and the caller's redraws
+    generate_time = time.perf_counter() - started - parse_time - consumer_time
+    metrics.add_stage_time("generate", generate_time)
+    metrics.add_stage_time("parse", parse_time)
+
+    if len(builder.nodes) < 2:
         raise ValueError("AI did not return a valid step list")
 
-    nodes = []
-    edges = []
-
- 
-    
-    last_node_id = None
-    last_decision_id = None
-    
-   
-    for step in steps:
-        node_id = step["id"]
-        text = step["text"]
-        branch = step["branch"]
-        
-        node_type = "process"
-        if "start" in text.lower():
-            node_type = "start"
-            text = "Start"
-        elif "end" in text.lower():
-            node_type = "end"
-            text = "End"
-        elif text.lower().startswith("decision") or "?" in text:
-            node_type = "decision"
-            text = text.replace("Decision:", "").strip()
-            
-        nodes.append({
-            "id": node_id,
-            "type": node_type,
-            "text": text,
-            "branch": branch
-        })
-
-    
-    decision_stack = [] 
-    
-    previous_step = None
-    
-    for i, node in enumerate(nodes):
-        if i == 0:
-            previous_step = node
-            continue
-            
-        current_node = node
-        branch_type = current_node["branch"]
-        
-        source_id = None
-        label = None
-        
-        if branch_type:
-             
-             found_decision = None
-             for j in range(i-1, -1, -1):
-                 if nodes[j]["type"] == "decision":
-                     found_decision = nodes[j]
-                     break
-             
-             if found_decision:
-                 source_id = found_decision["id"]
-                 label = branch_type.capitalize()
-                 
-                 
-        else:
-           
-            
-            if previous_step:
-                source_id = previous_step["id"]
-
-        if source_id:
-            edges.append({
-                "from": source_id,
-                "to": current_node["id"],
-                "label": label
-            })
-            
-        previous_step = current_node
-
-    return {
-        "nodes": nodes,
-        "edges": edges
-    }
+    result = builder.snapshot()
+
+    if use_cache:
+        _remember(user_prompt, cache_key, result, profile)
+    # uncached runs (benchmarks, tests) stay out of the library unless asked
+    if library is not None and (use_cache if save is None else save):
+        library.save(result, user_prompt, OLLAMA_MODEL, profile, generate_s=generate_time + parse_time)
+
+    yield result
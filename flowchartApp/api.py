@@ -0,0 +1,454 @@
+"""
+HTTP API for generation, layout and rendering, without Streamlit.
+
+    python flowchartApp/api.py --port 8080
+
+    POST /generate          {"prompt", "profile"?}            -> {"hash", "flowchart"}
+    POST /generate/stream   same body, text/event-stream:
+                            "queued", then "step" events with the nodes/edges
+                            added since the previous one, then "done" or "error"
+    POST /layout            {"steps": "1. Start\\n..."} or {"nodes", "edges"}
+                            -> {"hash", "positions", "edges": [{"from", "to", "label", "points"}]}
+    POST /render            same input (or the step list as text/plain)
+                            -> image/svg+xml, ?background=%230e1117 for a filled canvas
+    GET  /charts/{hash}     a library chart as JSON, /charts/{hash}.svg as SVG
+    GET  /metrics           Prometheus text
+    GET  /health
+
+One asyncio event loop serves every client. The slow parts run off the loop:
+generations go through a JobQueue (a fixed worker pool, so the number of
+concurrent model calls is bounded whatever the traffic), and layout/render
+run on a small thread pool. A cached prompt is answered straight from
+flowchart_cache without waiting for a worker.
+
+Every chart response carries an ETag derived from the chart's content hash.
+A client sending it back in If-None-Match gets a 304 with no body, and the
+check happens before any layout or SVG work. Bodies above GZIP_MIN_BYTES
+are gzipped when the client accepts it. Encoded bodies are kept in a small
+LRU by ETag, and parsed request bodies by digest, so repeated requests for
+the same chart skip parsing and rendering too. Concurrent requests for one
+chart share a single parse/render.
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+import metrics
+from ai_services import cached_flowchart, library
+from edge_routing import route_edges
+from flowchart_layout import layered_layout
+from flowchart_model import Flowchart, content_hash
+from job_queue import FAILED, FINISHED, QUEUED, JobQueue, QueueFull
+from step_parser import parse_flowchart
+from svg_writer import iter_svg
+
+API_HOST = os.getenv("FLOWCHART_API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("FLOWCHART_API_PORT", 8080))
+# threads for layout / render; requests themselves never get a thread
+API_CPU_WORKERS = int(os.getenv("FLOWCHART_API_CPU_WORKERS", 4))
+API_MAX_BODY = int(os.getenv("FLOWCHART_API_MAX_BODY", 8 * 1024 * 1024))
+# encoded response bodies kept by ETag
+API_CACHE_BYTES = int(os.getenv("FLOWCHART_API_CACHE_BYTES", 64 * 1024 * 1024))
+# parsed request bodies kept by digest
+CHART_MEMO_ENTRIES = 256
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+# how often a waiting request checks its job
+JOB_POLL_INTERVAL = 0.05
+# POST /generate gives up (and cancels the job) after this long
+API_GENERATE_TIMEOUT = float(os.getenv("FLOWCHART_API_GENERATE_TIMEOUT", 300))
+
+API_REQUESTS = metrics.counter("flowchart_api_requests_total", "API requests", ("endpoint", "status"))
+API_SECONDS = metrics.histogram("flowchart_api_seconds", "API request latency", labelnames=("endpoint",))
+API_BODY_CACHE = metrics.counter("flowchart_api_body_cache_total", "Encoded body lookups", ("result",))
+API_NOT_MODIFIED = metrics.counter("flowchart_api_not_modified_total", "304 responses", ("endpoint",))
+
+
+def _json_error(status, message):
+    return web.json_response({"error": message}, status=status)
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def make_etag(chart_hash, kind, *params):
+    """Strong ETag for one representation of a chart."""
+    params = tuple(p for p in params if p is not None)
+    if params:
+        kind += "-" + hashlib.sha1(repr(params).encode("utf-8")).hexdigest()[:8]
+    return f'"{chart_hash[:32]}-{kind}"'
+
+
+def etag_matches(header, etag):
+    """If-None-Match check; the gzipped variant's tag matches too."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag or tag.replace('-gz"', '"') == etag:
+            return True
+    return False
+
+
+def _accepts_gzip(request):
+    return "gzip" in request.headers.get("Accept-Encoding", "").lower()
+
+
+class BodyCache:
+    """Encoded bodies by ETag (plain and gzipped), LRU bounded by total bytes."""
+
+    def __init__(self, max_bytes=API_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        API_BODY_CACHE.inc(result="hit" if entry is not None else "miss")
+        return entry
+
+    def put(self, key, body, compressed):
+        size = len(body) + (len(compressed) if compressed else 0)
+        if size > self.max_bytes // 4:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0]) + (len(old[1]) if old[1] else 0)
+            self._entries[key] = (body, compressed)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (b, c) = self._entries.popitem(last=False)
+                self._size -= len(b) + (len(c) if c else 0)
+
+
+def encode(body):
+    """(body, gzipped body or None); small bodies aren't worth compressing."""
+    if len(body) < GZIP_MIN_BYTES:
+        return body, None
+    return body, gzip.compress(body, GZIP_LEVEL)
+
+
+def _load_chart(raw, content_type):
+    """(Flowchart, diagnostics, content hash) from a request body."""
+    if content_type == "text/plain":
+        data = {"steps": raw.decode("utf-8")}
+    else:
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            raise ValueError("body is not valid JSON")
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+
+    if isinstance(data.get("steps"), str):
+        chart, diagnostics = parse_flowchart(data["steps"])
+        fc = Flowchart.from_dict(chart)
+    else:
+        chart = data.get("flowchart", data)
+        if not isinstance(chart, dict) or not isinstance(chart.get("nodes"), list):
+            raise ValueError('send "steps" text or a {"nodes", "edges"} chart')
+        try:
+            fc, diagnostics = Flowchart.from_dict(chart), []
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"malformed chart: {e!r}")
+    return fc, diagnostics, content_hash(fc)
+
+
+class FlowchartAPI:
+    def __init__(self, jobs=None, cpu_workers=API_CPU_WORKERS, body_cache=None):
+        self.jobs = jobs or JobQueue()
+        self.cpu = ThreadPoolExecutor(cpu_workers, thread_name_prefix="flowchart-api")
+        self.bodies = body_cache or BodyCache()
+        self._inflight = {}     # key -> task, so a burst for one chart parses and renders it once
+        self._charts = OrderedDict()    # body digest -> parsed chart; only touched on the event loop
+
+    # -- plumbing -------------------------------------------------------------
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.cpu, fn, *args)
+
+    async def _respond(self, request, endpoint, etag, content_type, make_body, cache_control="no-cache"):
+        """
+        304 when the client already has `etag`; otherwise the (possibly gzipped)
+        body, from the body cache or from `make_body()` run on the thread pool.
+        """
+        headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("If-None-Match"), etag):
+            API_NOT_MODIFIED.inc(endpoint=endpoint)
+            return web.Response(status=304, headers=headers)
+
+        entry = self.bodies.get(etag)
+        if entry is None:
+            entry = await self._shared(("body", etag), lambda: self._build(etag, make_body))
+        body, compressed = entry
+        if compressed is not None and _accepts_gzip(request):
+            headers["Content-Encoding"] = "gzip"
+            headers["ETag"] = etag[:-1] + '-gz"'
+            body = compressed
+        return web.Response(body=body, content_type=content_type, charset="utf-8", headers=headers)
+
+    async def _shared(self, key, make):
+        """Await make() once per key, however many requests ask for it at the same time."""
+        task = self._inflight.get(key)
+        if task is None:
+            async def run():
+                try:
+                    return await make()
+                finally:
+                    del self._inflight[key]
+
+            task = self._inflight[key] = asyncio.ensure_future(run())
+        # one waiter going away must not cancel the work for the others
+        return await asyncio.shield(task)
+
+    async def _build(self, etag, make_body):
+        entry = await self._run(lambda: encode(make_body()))
+        self.bodies.put(etag, *entry)
+        return entry
+
+    async def _read_chart(self, request):
+        """(Flowchart, diagnostics, content hash) from a posted step list or {"nodes", "edges"}."""
+        raw = await request.read()
+        # clients re-posting the same body skip parsing and hashing; it's a digest away
+        key = hashlib.sha256(request.content_type.encode("utf-8") + b"\0" + raw).digest()
+        loaded = self._charts.get(key)
+        if loaded is not None:
+            self._charts.move_to_end(key)
+            return loaded
+        try:
+            # parsing and hashing are linear in the chart; keep big ones off the event loop
+            loaded = await self._shared(("chart", key), lambda: self._run(_load_chart, raw, request.content_type))
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=json.dumps({"error": str(e)}), content_type="application/json")
+        self._charts[key] = loaded
+        while len(self._charts) > CHART_MEMO_ENTRIES:
+            self._charts.popitem(last=False)
+        return loaded
+
+    @staticmethod
+    async def _read_prompt(request):
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        if not isinstance(data, dict) or not str(data.get("prompt") or "").strip():
+            raise web.HTTPBadRequest(text='{"error": "send {\\"prompt\\": \\"...\\"}"}', content_type="application/json")
+        return data["prompt"], data.get("profile")
+
+    async def _submit(self, prompt, profile):
+        # a prompt that is already cached doesn't wait for a generation worker
+        try:
+            cached = await self._run(cached_flowchart, prompt, profile)
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=json.dumps({"error": str(e)}), content_type="application/json")
+        if cached is not None:
+            return cached, None
+        try:
+            return None, self.jobs.submit(prompt, profile)
+        except QueueFull as e:
+            raise web.HTTPServiceUnavailable(text=json.dumps({"error": str(e)}), content_type="application/json",
+                                             headers={"Retry-After": "5"})
+
+    # -- endpoints ------------------------------------------------------------
+
+    async def generate(self, request):
+        prompt, profile = await self._read_prompt(request)
+        result, job_id = await self._submit(prompt, profile)
+        if result is None:
+            job = self.jobs.get(job_id)
+            deadline = time.monotonic() + API_GENERATE_TIMEOUT
+            finished = False
+            try:
+                while job.status not in FINISHED:
+                    if time.monotonic() > deadline:
+                        return _json_error(504, f"generation took longer than {API_GENERATE_TIMEOUT:g}s")
+                    if request.transport is None or request.transport.is_closing():
+                        return _json_error(499, "client closed the request")
+                    await asyncio.sleep(JOB_POLL_INTERVAL)
+                finished = True
+            finally:
+                if not finished:
+                    # timed out, disconnected or cancelled: don't keep a worker busy for nobody
+                    self.jobs.cancel(job_id)
+            if job.status == FAILED:
+                return _json_error(502, job.error)
+            if job.result is None:
+                return _json_error(503, "generation was cancelled")
+            result = job.result
+
+        chart_hash = content_hash(result)
+        return await self._respond(request, "generate", make_etag(chart_hash, "json"), "application/json",
+                                   lambda: _dumps({"hash": chart_hash, "flowchart": result}))
+
+    async def generate_stream(self, request):
+        prompt, profile = await self._read_prompt(request)
+        result, job_id = await self._submit(prompt, profile)
+
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",      # keep proxies from holding events back
+        })
+        await response.prepare(request)
+
+        async def send(event, data):
+            await response.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        finished = False
+        try:
+            if result is None:
+                job = self.jobs.get(job_id)
+                await send("queued", {"job": job_id, "ahead": self.jobs.position(job_id)})
+                sent_nodes = sent_edges = 0
+                seen = 0
+                while True:
+                    status, partial, updates = job.status, job.partial, job.updates
+                    if updates != seen and partial is not None:
+                        # partial charts only grow, so each event carries just the new part
+                        seen = updates
+                        await send("step", {"nodes": partial["nodes"][sent_nodes:],
+                                            "edges": partial["edges"][sent_edges:]})
+                        sent_nodes, sent_edges = len(partial["nodes"]), len(partial["edges"])
+                    if status in FINISHED:
+                        break
+                    await asyncio.sleep(JOB_POLL_INTERVAL if status != QUEUED else JOB_POLL_INTERVAL * 4)
+                if job.status == FAILED or job.result is None:
+                    finished = True
+                    await send("error", {"error": job.error or "generation was cancelled"})
+                    return response
+                result = job.result
+
+            finished = True
+            await send("done", {"hash": content_hash(result), "flowchart": result})
+            await response.write_eof()
+        except ConnectionResetError:
+            pass
+        finally:
+            if job_id is not None and not finished:
+                # the client went away; nobody else is reading this job
+                self.jobs.cancel(job_id)
+        return response
+
+    async def layout(self, request):
+        fc, diagnostics, chart_hash = await self._read_chart(request)
+
+        def make_body():
+            with metrics.span("layout"):
+                positions = layered_layout(fc)
+            with metrics.span("route"):
+                routes = route_edges(fc, positions)
+            edges = []
+            for index, edge in enumerate(fc.edges):
+                route = routes.get(index)
+                edges.append({**edge.to_dict(), "points": [list(p) for p in route.points] if route else None})
+            return _dumps({"hash": chart_hash, "positions": positions, "edges": edges, "diagnostics": diagnostics})
+
+        # the diagnostics come from the posted text, not the chart: two step
+        # lists can parse to the same chart with different warnings
+        notes = hashlib.sha1(_dumps(diagnostics)).hexdigest() if diagnostics else None
+        return await self._respond(request, "layout", make_etag(chart_hash, "layout", notes),
+                                   "application/json", make_body)
+
+    async def render(self, request):
+        fc, _, chart_hash = await self._read_chart(request)
+        background = request.query.get("background") or None
+
+        def make_body():
+            with metrics.span("layout"):
+                positions = layered_layout(fc)
+            with metrics.span("render"):
+                return "".join(iter_svg(fc, positions, background)).encode("utf-8")
+
+        return await self._respond(request, "render", make_etag(chart_hash, "svg", background),
+                                   "image/svg+xml", make_body)
+
+    async def chart(self, request):
+        if library is None:
+            return _json_error(404, "the flowchart library is turned off")
+        name = request.match_info["hash"]
+        as_svg = name.endswith(".svg")
+        chart_hash = name[:-4] if as_svg else name
+        stored = await self._run(library.get, chart_hash)
+        if stored is None or (as_svg and not stored["svg"]):
+            return _json_error(404, f"no chart {chart_hash}")
+
+        # content-addressed, so a given URL never changes
+        immutable = "public, max-age=31536000, immutable"
+        if as_svg:
+            return await self._respond(request, "chart", make_etag(chart_hash, "svg"), "image/svg+xml",
+                                       lambda: stored["svg"].encode("utf-8"), immutable)
+        return await self._respond(request, "chart", make_etag(chart_hash, "stored"), "application/json",
+                                   lambda: _dumps(stored), immutable)
+
+    async def metrics(self, request):
+        return web.Response(text=metrics.render_prometheus(), content_type="text/plain", charset="utf-8",
+                            headers={"Cache-Control": "no-cache"})
+
+    async def health(self, request):
+        return web.json_response({"ok": True, "jobs": self.jobs.stats()})
+
+
+@web.middleware
+async def _observe(request, handler):
+    route = request.match_info.route.resource
+    endpoint = route.canonical if route is not None else "unmatched"
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        API_REQUESTS.inc(endpoint=endpoint, status=str(status))
+        API_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+
+
+def make_app(api=None):
+    api = api or FlowchartAPI()
+    app = web.Application(middlewares=[_observe], client_max_size=API_MAX_BODY)
+    app["api"] = api
+    app.add_routes([
+        web.post("/generate", api.generate),
+        web.post("/generate/stream", api.generate_stream),
+        web.post("/layout", api.layout),
+        web.post("/render", api.render),
+        web.get("/charts/{hash}", api.chart),
+        web.get("/metrics", api.metrics),
+        web.get("/health", api.health),
+    ])
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flowchart HTTP API")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args()
+    web.run_app(make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
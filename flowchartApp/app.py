@@ -1,9 +1,5 @@
 import streamlit as st
 import streamlit.components.v1 as components
-import copy
-
-from ai_services import generate_flowchart_with_ai
-
 
 
 st.set_page_config(
@@ -27,352 +23,141 @@ st.title("Joe's Prompt2Flow")
 st.caption("From problem to process in minutes")
 
 
-import streamlit as st
-import streamlit.components.v1 as components
-import copy
-import textwrap
+import metrics
+import model_warmup
+from ai_services import OLLAMA_MODEL, flowchart_cache, inflight, library, prompt_index
+from clustering import LOD_BUDGET, LOD_THRESHOLD, cluster_tree
+from flowchart_model import content_hash
+from flowchart_render import VIEWER_THRESHOLD, render_chart_html, render_flowchart, render_flowchart_viewer, render_svg
+from incremental import IncrementalSession
+from job_queue import DONE, FAILED, FINISHED, QUEUED, RUNNING, JobQueue, QueueFull
 
-from ai_services import generate_flowchart_with_ai
 
+# how often the page checks a running job for new steps
+POLL_INTERVAL = 0.3
 
 
-def wrap_text(text, width=20):
-    return textwrap.wrap(text, width=width)
+RENDERERS = ["Auto", "SVG", "Canvas viewer"]
 
-def calculate_node_height(text, width=20, line_height=18, min_height=40):
-    lines = wrap_text(text, width)
-    return min_height + (len(lines) * line_height)
 
-def calculate_layout(nodes, edges):
-    """
-    Tree-like layout with dynamic vertical spacing to prevent overlaps.
-    """
-    positions = {}
-    
-  
-    node_map = {n["id"]: n for n in nodes}
-    
-  
-    for node in nodes:
-        positions[node["id"]] = {"x": 500, "y": 0}
-
-
-    adj = {n["id"]: [] for n in nodes}
-    for edge in edges:
-        if edge["from"] in adj:
-            adj[edge["from"]].append(edge)
-
-  
-    
-    start_node = next((n for n in nodes if n["type"] == "start"), nodes[0])
-    
-
-    queue = [(start_node["id"], 500, 50)] 
-    visited = set()
-    
-    min_gap_y = 60 
-    
-    while queue:
-        curr_id, cx, cy_start = queue.pop(0)
-        
-        if curr_id in visited:
-            continue
-        visited.add(curr_id)
-        
-      
-        curr_node = node_map[curr_id]
-        h = calculate_node_height(curr_node["text"])
-        
-
-        center_y = cy_start + h/2
-        positions[curr_id] = {"x": cx, "y": center_y, "height": h}
-        
-        children_edges = adj.get(curr_id, [])
-        if not children_edges:
-            continue
-            
-       
-        next_y_start = cy_start + h + min_gap_y
-        
-        if len(children_edges) == 1:
-            next_id = children_edges[0]["to"]
-            queue.append((next_id, cx, next_y_start))
-        
-        else:
-           
-            count = len(children_edges)
-            span = 300 
-            
-            for i, edge in enumerate(children_edges):
-                child_id = edge["to"]
-                lbl = (edge.get("label") or "").lower()
-                
-                if "yes" in lbl: nx = cx - 180
-                elif "no" in lbl: nx = cx + 180
-                else:
-                    
-                    offset = -180 if i == 0 else 180
-                    nx = cx + offset
-                
-                queue.append((child_id, nx, next_y_start))
-
-   
-    max_y = max((p["y"] + p["height"]/2 for p in positions.values() if "height" in p), default=0)
-    for node in nodes:
-         if node["id"] not in visited:
-             h = calculate_node_height(node["text"])
-             positions[node["id"]] = {"x": 500, "y": max_y + 100, "height": h}
-             max_y += h + 100
-             
-    return positions
-
-def render_flowchart(flowchart):
-    fc = copy.deepcopy(flowchart)
-    nodes = fc["nodes"]
-    edges = fc["edges"]
-    
-    positions = calculate_layout(nodes, edges)
-    
- 
-    max_y = max((p["y"] for p in positions.values()), default=800) + 150
-    min_x = min((p["x"] for p in positions.values()), default=0) - 100
-    max_x = max((p["x"] for p in positions.values()), default=1000) + 100
-    svg_width = max(1000, max_x - min_x)
-    
-   
-    x_offset = abs(min(0, min_x)) 
-    svg_width += x_offset
-
-    svg = f"""
-    <div style="width: 100%; overflow-x: auto; overflow-y: hidden; text-align: center; background: #0e1117; border-radius: 10px; padding: 20px;">
-    <svg width="{svg_width}" height="{max_y}" style="font-family: 'Segoe UI', sans-serif;">
-      <defs>
-        <marker id="arrow" markerWidth="12" markerHeight="12"
-          refX="10" refY="3" orient="auto" markerUnits="strokeWidth">
-          <path d="M0,0 L0,6 L9,3 z" fill="#a0a0a0"/>
-        </marker>
-        <filter id="glow" x="-20%" y="-20%" width="140%" height="140%">
-          <feGaussianBlur stdDeviation="2" result="blur"/>
-          <feComposite in="SourceGraphic" in2="blur" operator="over"/>
-        </filter>
-        <linearGradient id="nodeGrad" x1="0%" y1="0%" x2="100%" y2="100%">
-          <stop offset="0%" style="stop-color:#2b313e;stop-opacity:1" />
-          <stop offset="100%" style="stop-color:#1e2330;stop-opacity:1" />
-        </linearGradient>
-      </defs>
-    """
+def use_viewer(flowchart):
+    renderer = st.session_state.get("renderer", "Auto")
+    return renderer == "Canvas viewer" or (renderer == "Auto" and len(flowchart["nodes"]) > VIEWER_THRESHOLD)
 
-    
-    for edge in edges:
-        if edge["from"] not in positions or edge["to"] not in positions:
-            continue
-
-        p1 = positions[edge["from"]]
-        p2 = positions[edge["to"]]
-        
-        x1, y1 = p1["x"] + x_offset, p1["y"]
-        x2, y2 = p2["x"] + x_offset, p2["y"]
-
-
-        color = "#a0a0a0"
-        if "Yes" in str(edge.get("label")): color = "#4caf50" 
-        if "No" in str(edge.get("label")): color = "#ff5252" 
-
-        svg += f"""
-        <line x1="{x1}" y1="{y1+35}"
-              x2="{x2}" y2="{y2-35}"
-              stroke="{color}" stroke-width="2" marker-end="url(#arrow)"/>
-        """
-        
-       
-        if edge.get("label"):
-            mx, my = (x1+x2)/2, (y1+y2)/2
-            svg += f"""
-            <rect x="{mx-15}" y="{my-10}" width="30" height="20" fill="#0e1117" rx="4"/>
-            <text x="{mx}" y="{my+4}" fill="{color}" text-anchor="middle" font-size="11" font-weight="bold">
-                {edge["label"]}
-            </text>
-            """
-
-    
-    for node in nodes:
-        pid = node["id"]
-        pos = positions[pid]
-        x, y = pos["x"] + x_offset, pos["y"]
-        text_lines = wrap_text(node["text"], width=20)
-        node_type = node["type"]
-        
-        
-        line_height = 18
-        box_height = 40 + (len(text_lines) * line_height)
-        box_width = 180
-        
-        
-        stroke_color = "#4fd1c5" 
-        if node_type == "start": stroke_color = "#f6e05e"
-        if node_type == "end": stroke_color = "#f6e05e"
-        if node_type == "decision": stroke_color = "#ff79c6"
-
-        
-        if node_type in ("start", "end"):
-            svg += f"""
-            <rect x="{x-80}" y="{y-box_height/2}" rx="25" ry="25"
-              width="160" height="{box_height}"
-              stroke="{stroke_color}" stroke-width="2" fill="url(#nodeGrad)" filter="url(#glow)"/>
-            """
-        elif node_type == "decision":
-             svg += f"""
-            <path d="M{x},{y-box_height/2 - 10} L{x+100},{y} L{x},{y+box_height/2 + 10} L{x-100},{y} Z"
-              stroke="{stroke_color}" stroke-width="2" fill="url(#nodeGrad)" />
-            """
-        else:
-            svg += f"""
-            <rect x="{x-box_width/2}" y="{y-box_height/2}" rx="6"
-              width="{box_width}" height="{box_height}"
-              stroke="{stroke_color}" stroke-width="2" fill="url(#nodeGrad)"/>
-            """
-
-       
-        start_text_y = y - ((len(text_lines)-1) * line_height) / 2 + 5
-        for i, line in enumerate(text_lines):
-            svg += f"""
-            <text x="{x}" y="{start_text_y + (i*line_height)}"
-              fill="white" text-anchor="middle" font-size="14" font-weight="500">{line}</text>
-            """
-
-    svg += "</svg></div>"
-
-    
-    unique_id = f"flowchart_{id(flowchart)}"
-    
-    html_content = f"""
-    <div id="container_{unique_id}" style="
-        position: relative; 
-        width: 100%; 
-        border-radius: 10px; 
-        overflow: hidden; 
-        background: #0e1117; 
-        border: 1px solid #2b313e;">
-        
-        <!-- Toolbar -->
-        <div style="
-            position: absolute; 
-            top: 10px; 
-            right: 10px; 
-            display: flex; 
-            gap: 10px; 
-            z-index: 100;">
-            
-            <button onclick="downloadSVG_{unique_id}()" title="Download SVG" style="
-                background: #1f2937; color: white; border: 1px solid #374151; 
-                padding: 5px 10px; border-radius: 5px; cursor: pointer; font-size: 12px;">
-                SVG ⬇️
-            </button>
-            <button onclick="downloadPNG_{unique_id}()" title="Download PNG" style="
-                background: #1f2937; color: white; border: 1px solid #374151; 
-                padding: 5px 10px; border-radius: 5px; cursor: pointer; font-size: 12px;">
-                PNG ⬇️
-            </button>
-            <button onclick="openNewTab_{unique_id}()" title="Open in New Tab (Fullscreen)" style="
-                background: #1f2937; color: white; border: 1px solid #374151; 
-                padding: 5px 10px; border-radius: 5px; cursor: pointer; font-size: 12px;">
-                Open ↗️
-            </button>
-        </div>
-
-        <!-- Scrollable SVG Content -->
-        <div id="scroll_area_{unique_id}" style="
-            overflow: auto; 
-            max-height: 500px; 
-            padding: 20px; 
-            text-align: center;
-            border-top: 1px solid #2b313e;"> 
-            {svg.replace('<svg ', '<svg xmlns="http://www.w3.org/2000/svg" ')}
-        </div>
-        
-    </div>
 
-    <!-- Hidden Canvas for PNG conversion -->
-    <canvas id="canvas_{unique_id}" style="display:none;"></canvas>
-
-    <script>
-        function downloadSVG_{unique_id}() {{
-            try {{
-                const svgElement = document.querySelector("#container_{unique_id} svg");
-                if (!svgElement) {{ alert("SVG not found"); return; }}
-                
-                const svgData = svgElement.outerHTML;
-                const blob = new Blob([svgData], {{type: "image/svg+xml;charset=utf-8"}});
-                const url = URL.createObjectURL(blob);
-                const link = document.createElement("a");
-                link.href = url;
-                link.download = "flowchart.svg";
-                document.body.appendChild(link);
-                link.click();
-                document.body.removeChild(link);
-            }} catch (e) {{
-                alert("Error downloading SVG: " + e.message);
-            }}
-        }}
-
-        function downloadPNG_{unique_id}() {{
-            try {{
-                const svgElement = document.querySelector("#container_{unique_id} svg");
-                if (!svgElement) {{ alert("SVG not found"); return; }}
-
-                const canvas = document.getElementById("canvas_{unique_id}");
-                const ctx = canvas.getContext("2d");
-                
-                // Get data
-                const svgData = new XMLSerializer().serializeToString(svgElement);
-                const img = new Image();
-                
-                // Add explicit size to ensure high res
-                const width = parseInt(svgElement.getAttribute("width")) || 1000;
-                const height = parseInt(svgElement.getAttribute("height")) || 800;
-                canvas.width = width;
-                canvas.height = height;
-
-                img.onload = function() {{
-                    ctx.fillStyle = "#0e1117"; // Dark background
-                    ctx.fillRect(0, 0, width, height);
-                    ctx.drawImage(img, 0, 0);
-                    const pngFile = canvas.toDataURL("image/png");
-                    
-                    const link = document.createElement("a");
-                    link.download = "flowchart.png";
-                    link.href = pngFile;
-                    link.click();
-                }};
-                
-                img.onerror = function() {{
-                   alert("Error converting SVG to Image.");
-                }};
-                
-                img.src = "data:image/svg+xml;base64," + btoa(unescape(encodeURIComponent(svgData)));
-            }} catch (e) {{
-                alert("Error downloading PNG: " + e.message);
-            }}
-        }}
-
-        function openNewTab_{unique_id}() {{
-            try {{
-                const svgElement = document.querySelector("#container_{unique_id} svg");
-                if (!svgElement) {{ alert("SVG not found"); return; }}
-                
-                const svgData = new XMLSerializer().serializeToString(svgElement);
-                const blob = new Blob([svgData], {{type: "image/svg+xml;charset=utf-8"}});
-                const url = URL.createObjectURL(blob);
-                window.open(url, '_blank');
-            }} catch (e) {{
-                alert("Error opening new tab: " + e.message);
-            }}
-        }}
-    </script>
-    """
-    
-    return html_content
+def incremental_session():
+    # keeps layout blocks / SVG elements between redraws and prompt edits
+    return st.session_state.setdefault("incremental", IncrementalSession())
+
+
+def partial_html(flowchart):
+    # partial charts change every poll, so they skip the render cache
+    if use_viewer(flowchart):
+        return render_flowchart_viewer(flowchart, session=incremental_session())
+    return render_flowchart(flowchart, incremental_session())
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def chart_svg(chart_hash, _flowchart):
+    # only runs when Download is clicked; the library already has an SVG of every saved chart
+    stored = library.get(chart_hash) if library is not None else None
+    svg = stored["svg"] if stored is not None and stored["svg"] else render_svg(_flowchart)
+    return svg.encode("utf-8")
+
+
+@st.cache_resource
+def _metrics_server():
+    # /metrics for Prometheus when FLOWCHART_METRICS_PORT is set; once per process
+    return metrics.start_metrics_server()
+
 
+_metrics_server()
+
+
+@st.cache_resource
+def _model_keeper():
+    # loads the model in the background and keeps it resident in busy windows
+    return model_warmup.start_keeper(OLLAMA_MODEL)
+
+
+keeper = _model_keeper()
+
+
+@st.cache_resource
+def _job_queue():
+    # one worker pool per process: the single cap on concurrent generations
+    return JobQueue()
+
+
+jobs = _job_queue()
+
+# the renderer radio isn't drawn while a job runs; re-assigning keeps its value meanwhile
+if "renderer" in st.session_state:
+    st.session_state["renderer"] = st.session_state["renderer"]
+
+
+def with_view_stages(trace, view_trace):
+    """A generation's trace plus the stages of laying out and drawing its chart."""
+    merged = {"stages_s": {}, "ollama": {}, "total_s": 0.0, **trace}
+    stages = dict(merged["stages_s"])
+    for stage, seconds in view_trace["stages_s"].items():
+        stages[stage] = stages.get(stage, 0.0) + seconds
+    merged["stages_s"] = stages
+    merged["total_s"] += view_trace["total_s"]
+    return merged
+
+
+def show_timings(trace):
+    st.markdown("**Last request**")
+    st.caption(f"Total {trace['total_s'] * 1000:.0f} ms (cache: {trace.get('cache', '-')})")
+    edit = trace.get("edit")
+    if edit:
+        st.caption(
+            f"vs previous chart: {edit['unchanged']} unchanged, {edit['changed']} changed, "
+            f"{edit['added']} added, {edit['removed']} removed, {edit['moved']} moved"
+        )
+    for stage, seconds in trace["stages_s"].items():
+        st.caption(f"{stage}: {seconds * 1000:.1f} ms")
+    ollama = trace["ollama"]
+    if ollama:
+        st.caption(
+            f"Ollama load {ollama.get('load_s', 0):.2f}s, prompt eval {ollama.get('prompt_eval_s', 0):.2f}s, "
+            f"eval {ollama.get('eval_s', 0):.2f}s, {ollama.get('tokens_per_s', 0):.1f} tok/s"
+        )
+
+
+def show_warmup(status):
+    startup = status["startup"]
+    if startup is None:
+        st.caption(f"Loading {OLLAMA_MODEL}...")
+        return
+    for host in startup:
+        if host["ok"]:
+            st.caption(f"{host['model']} warm-up: load {host['load_s']:.2f}s")
+        else:
+            st.caption(f"{host['model']} warm-up failed: {host.get('error', '')[:80]}")
+
+
+with st.sidebar:
+    show_warmup(keeper.status())
+    stats = flowchart_cache.stats()
+    st.caption(
+        f"Flowchart cache: {stats['hits']} hits / {stats['misses']} misses "
+        f"({stats['hit_rate']:.0%} hit rate)"
+    )
+    similar = prompt_index.stats()
+    if similar["hits"]:
+        st.caption(f"Reworded prompts reused: {similar['hits']} of {similar['lookups']}")
+    queued = jobs.stats()
+    if queued["queued"] or queued["running"]:
+        st.caption(f"Generating: {queued['running']} running, {queued['queued']} waiting")
+    shared = inflight.stats()
+    if shared["coalesced"]:
+        st.caption(f"Shared generations: {shared['coalesced']} of {shared['calls']} requests "
+                   f"({shared['coalescing_rate']:.0%})")
+    timing_enabled = st.checkbox("Show timing panel")
+    # filled at the end of the run, once the chart has been drawn
+    timing_panel = st.empty()
 
 
 prompt = st.text_area(
@@ -384,15 +169,155 @@ if st.button("Generate Flowchart"):
     if not prompt.strip():
         st.warning("Please enter a problem statement")
     else:
+        # a new prompt replaces whatever this session was still waiting on
+        if "job_id" in st.session_state:
+            jobs.cancel(st.session_state["job_id"])
+        st.session_state.pop("chart", None)
         try:
-            with st.spinner("Generating flowchart..."):
-                flowchart = generate_flowchart_with_ai(prompt)
+            st.session_state["job_id"] = jobs.submit(prompt)
+        except QueueFull as e:
+            st.warning(str(e))
+
+
+if library is not None:
+    with st.expander("Library"):
+        query = st.text_input("Search past flowcharts", placeholder="e.g. bubble sort, prime, leap year")
+        for entry in library.search(query, limit=10):
+            text, button = st.columns([5, 1])
+            text.markdown(f"**{entry['prompt']}** · {entry['node_count']} steps")
+            if entry["snippet"]:
+                text.caption(entry["snippet"])
+            if button.button("Open", key=f"open_{entry['hash']}"):
+                # shows the stored chart instead of this session's last generation
+                stored = library.get(entry["hash"])
+                if stored is not None:
+                    st.session_state.pop("job_id", None)
+                    st.session_state["chart"] = {"hash": stored["hash"], "flowchart": stored["flowchart"],
+                                                 "title": f"From the library: {entry['prompt']}"}
+
+
+def detail_view(chart):
+    """Big charts open with groups of steps collapsed; only the expanded part is laid out and drawn."""
+    tree = cluster_tree(chart["flowchart"], chart["hash"])
+    state_key = f"lod_{chart['hash']}"
+    expanded = st.session_state.get(state_key)
+    if expanded is None:
+        expanded = st.session_state[state_key] = tree.auto_expand(LOD_BUDGET)
+
+    shown = tree.visible(expanded)
+    opened = [c.id for c in shown if c.id in expanded]
+    picker_key = f"lod_pick_{chart['hash']}"
+
+    def toggle():
+        # groups inside a closed one keep their state for when it is opened again
+        picked = set(st.session_state[picker_key])
+        st.session_state[state_key] = (expanded - set(opened)) | picked
+
+    # the options change with every toggle, so the selection is set from our own state each run
+    st.session_state[picker_key] = opened
+    st.multiselect(
+        "Expanded groups", [c.id for c in shown], key=picker_key, on_change=toggle,
+        format_func=lambda cluster_id: tree.clusters[cluster_id].label,
+        help="Dashed boxes are collapsed groups of steps. Add one here to open it; remove it to fold it back.",
+    )
+
+    view = tree.view(expanded).to_dict()
+    st.caption(f"Showing {len(view['nodes'])} boxes for {len(chart['flowchart']['nodes'])} steps")
+    return view
+
+
+@st.fragment
+def chart_view():
+    # reruns on its own when these widgets change; the rest of the page is left alone
+    chart = st.session_state["chart"]
+    if chart.get("title"):
+        st.caption(chart["title"])
+    st.radio("Renderer", RENDERERS, key="renderer", horizontal=True,
+             help=f"Auto uses the canvas viewer above {VIEWER_THRESHOLD} steps")
+    flowchart, chart_hash = chart["flowchart"], chart["hash"]
+    if len(flowchart["nodes"]) > LOD_THRESHOLD and not st.checkbox("Show every step"):
+        flowchart, chart_hash = detail_view(chart), None
+    # same hash and settings -> same string: no layout/SVG work, and the browser keeps the iframe
+    with metrics.start_trace(view="chart") as view_trace:
+        html = render_chart_html(flowchart, viewer=use_viewer(flowchart),
+                                 session=incremental_session(), chart_hash=chart_hash)
+    # the panel shows this redraw's stages next to the generation's (on the next full run
+    # when only this fragment reran)
+    generated = st.session_state.get("job_trace")
+    base = generated[1] if generated and generated[0] == chart["hash"] else {}
+    st.session_state["last_trace"] = with_view_stages(base, view_trace.as_dict())
+    components.html(html, height=750)
+    st.download_button("Download SVG", lambda: chart_svg(chart["hash"], chart["flowchart"]),
+                       file_name="flowchart.svg", mime="image/svg+xml")
+
+
+@st.fragment(run_every=POLL_INTERVAL)
+def job_progress(job_id):
+    # polls only this part of the page while the job is queued or running
+    job = jobs.get(job_id)
+    if job is None or job.status in FINISHED:
+        st.rerun()
+
+    if job.cancel_requested.is_set():
+        # a running job stops at its next step
+        st.info("Cancelling...")
+        return
+    if job.status == QUEUED:
+        ahead = jobs.position(job_id)
+        st.info(f"Waiting for a free worker ({ahead} ahead)" if ahead else "Waiting for a free worker...")
+    else:
+        steps = len(job.partial["nodes"]) if job.partial else 0
+        st.info(f"Generating flowchart... {steps} steps so far")
+    if st.button("Cancel"):
+        jobs.cancel(job_id)
+        st.rerun()
+
+    if job.partial is not None:
+        # only rebuild the chart when a new step arrived since the last poll
+        cached = st.session_state.get("partial_html")
+        if cached is None or cached[:2] != (job_id, job.updates):
+            cached = st.session_state["partial_html"] = (job_id, job.updates, partial_html(job.partial))
+        components.html(cached[2], height=750)
+
+
+def finish_job(job):
+    # runs once per job: the chart moves into session state and survives every later rerun
+    st.session_state["committed_job"] = job.id
+    st.session_state.pop("partial_html", None)
+    st.session_state["chart"] = {"hash": content_hash(job.result), "flowchart": job.result}
+    session = incremental_session()
+    with metrics.start_trace(view="commit") as commit_trace:
+        session.commit(job.result)
+    trace = with_view_stages(job.trace or {}, commit_trace.as_dict())
+    trace["edit"] = session.summary()
+    st.session_state["job_trace"] = (st.session_state["chart"]["hash"], trace)
+    st.session_state["last_trace"] = trace
+
+
+job_id = st.session_state.get("job_id")
+job = jobs.get(job_id) if job_id else None
+if job_id and job is None:
+    st.session_state.pop("job_id")
+    if "chart" not in st.session_state:
+        st.warning("That flowchart has expired; please generate it again")
+elif job is not None:
+    if job.status in (QUEUED, RUNNING):
+        job_progress(job_id)
+    elif job.status == DONE:
+        if st.session_state.get("committed_job") != job.id:
+            finish_job(job)
+    elif job.status == FAILED:
+        st.error("Error generating flowchart")
+        st.code(job.error)
+    else:
+        st.caption("Generation cancelled")
 
-            components.html(render_flowchart(flowchart), height=750)
+if "chart" in st.session_state and (job is None or job.status not in (QUEUED, RUNNING)):
+    chart_view()
 
-        except Exception as e:
-            st.error("Error generating flowchart")
-            st.code(str(e))
+if timing_enabled and "last_trace" in st.session_state:
+    with timing_panel.container():
+        show_timings(st.session_state["last_trace"])
 
 
 st.markdown(
@@ -0,0 +1,171 @@
+"""
+Headless batch generation.
+
+    python flowchartApp/batch.py prompts.txt --out charts/ --concurrency 4 [--png]
+
+The input is either plain text (one problem statement per line, blank lines
+and lines starting with '#' are skipped) or JSONL with a "prompt" field and
+an optional "id". Every prompt produces <name>.json (flowchart) and
+<name>.svg, plus <name>.png with --png (needs cairosvg). Charts also go to the
+flowchart library unless --no-library is given.
+Prompts whose outputs already exist are skipped, so an interrupted run can
+simply be started again.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import ai_services
+from ai_services import generate_flowchart_with_ai, flowchart_cache
+from flowchart_render import render_svg
+
+EXPORT_BACKGROUND = "#0e1117"
+
+
+def read_prompts(path):
+    items = []
+    is_jsonl = path.endswith(".jsonl")
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if is_jsonl:
+                obj = json.loads(line)
+                items.append({"prompt": obj["prompt"], "id": obj.get("id")})
+            else:
+                items.append({"prompt": line, "id": None})
+    return items
+
+
+def output_name(item):
+    if item["id"]:
+        return re.sub(r"[^A-Za-z0-9_.-]+", "_", str(item["id"]))
+    slug = re.sub(r"[^a-z0-9]+", "-", item["prompt"].lower()).strip("-")[:40]
+    digest = hashlib.sha1(item["prompt"].encode("utf-8")).hexdigest()[:8]
+    return f"{slug}-{digest}"
+
+
+def _write_atomic(path, data):
+    mode = "wb" if isinstance(data, bytes) else "w"
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, mode) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def svg_to_png(svg):
+    try:
+        import cairosvg
+    except ImportError:
+        raise RuntimeError("PNG export needs cairosvg (pip install cairosvg)")
+    return cairosvg.svg2png(bytestring=svg.encode("utf-8"))
+
+
+def is_done(out_dir, name, want_png):
+    # the .json file is written last, so its presence marks a finished item
+    suffixes = [".json", ".svg"] + ([".png"] if want_png else [])
+    return all(os.path.exists(os.path.join(out_dir, name + s)) for s in suffixes)
+
+
+def process_item(item, out_dir, want_png, save=True):
+    name = output_name(item)
+    base = os.path.join(out_dir, name)
+
+    flowchart = generate_flowchart_with_ai(item["prompt"], save=save)
+    svg = render_svg(flowchart, background=EXPORT_BACKGROUND)
+
+    _write_atomic(base + ".svg", svg)
+    if want_png:
+        _write_atomic(base + ".png", svg_to_png(svg))
+    _write_atomic(base + ".json", json.dumps(
+        {"prompt": item["prompt"], **flowchart}, indent=2
+    ))
+    return name, len(flowchart["nodes"])
+
+
+def run_batch(items, out_dir, concurrency=4, want_png=False, resume=True, save=True, log=print):
+    os.makedirs(out_dir, exist_ok=True)
+    if want_png:
+        svg_to_png("<svg xmlns='http://www.w3.org/2000/svg' width='1' height='1'/>")
+
+    pending = []
+    skipped = 0
+    for item in items:
+        if resume and is_done(out_dir, output_name(item), want_png):
+            skipped += 1
+        else:
+            pending.append(item)
+
+    summary = {"total": len(items), "skipped": skipped, "generated": 0,
+               "failed": 0, "nodes": 0}
+    failures_path = os.path.join(out_dir, "failures.jsonl")
+    failures_lock = threading.Lock()
+
+    start = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    try:
+        futures = {executor.submit(process_item, item, out_dir, want_png, save): item for item in pending}
+        for done_count, future in enumerate(as_completed(futures), 1):
+            item = futures[future]
+            try:
+                name, node_count = future.result()
+            except Exception as e:
+                summary["failed"] += 1
+                with failures_lock, open(failures_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"prompt": item["prompt"], "error": str(e)}) + "\n")
+                log(f"[{done_count}/{len(pending)}] FAILED {item['prompt'][:60]!r}: {e}")
+                continue
+            summary["generated"] += 1
+            summary["nodes"] += node_count
+            log(f"[{done_count}/{len(pending)}] {name} ({node_count} nodes)")
+    except KeyboardInterrupt:
+        log("Interrupted - finished charts are kept, rerun to resume")
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown(wait=True)
+    if save and ai_services.library is not None:
+        # the library writes from a daemon thread; get the charts on disk before the process exits
+        ai_services.library.flush()
+
+    elapsed = time.perf_counter() - start
+    summary["elapsed_s"] = round(elapsed, 3)
+    summary["charts_per_s"] = round(summary["generated"] / elapsed, 3) if elapsed > 0 else 0.0
+    summary["cache"] = flowchart_cache.stats()
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate flowcharts for a file of problem statements")
+    parser.add_argument("input", help="text file (one prompt per line) or .jsonl with a 'prompt' field")
+    parser.add_argument("--out", default="flowcharts", help="output directory")
+    parser.add_argument("--concurrency", type=int, default=4, help="max generations in flight")
+    parser.add_argument("--png", action="store_true", help="also rasterize PNGs (needs cairosvg)")
+    parser.add_argument("--no-resume", action="store_true", help="regenerate prompts that already have output")
+    parser.add_argument("--no-library", action="store_true", help="don't add the charts to the flowchart library")
+    args = parser.parse_args(argv)
+
+    items = read_prompts(args.input)
+    summary = run_batch(items, args.out, args.concurrency, args.png, resume=not args.no_resume,
+                        save=not args.no_library)
+
+    print()
+    print(f"Prompts:    {summary['total']}")
+    print(f"Generated:  {summary['generated']}")
+    print(f"Skipped:    {summary['skipped']} (already done)")
+    print(f"Failed:     {summary['failed']}")
+    print(f"Elapsed:    {summary['elapsed_s']:.1f}s")
+    print(f"Throughput: {summary['charts_per_s']:.2f} charts/s")
+    print(f"Cache:      {summary['cache']['hits']} hits / {summary['cache']['misses']} misses")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
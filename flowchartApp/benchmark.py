@@ -0,0 +1,239 @@
+"""
+Pipeline benchmarks: step parsing, layout, edge routing and SVG rendering, plus an
+end-to-end mode against the bundled fake Ollama server. Needs no GPU or
+network access.
+
+    python flowchartApp/benchmark.py --sizes 10,100,1000,10000,100000 --out bench.json
+    python flowchartApp/benchmark.py --e2e --token-latency 0.005 --requests 40 --concurrency 8
+
+Results are written as JSON so runs can be compared between versions.
+"""
+
+import argparse
+import json
+import math
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import text_metrics
+from ai_services import generate_flowchart_stream, generate_flowchart_with_ai
+from fake_ollama import start_fake_server, synthetic_steps
+from flowchart_layout import layered_layout
+from flowchart_model import Flowchart
+from ollama_client import OllamaClient, get_client, set_client
+from step_parser import build_flowchart, parse_steps
+from edge_routing import route_edges
+from svg_writer import iter_svg
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+
+
+def _clear_text_caches():
+    text_metrics.text_width.cache_clear()
+    text_metrics.wrap_lines.cache_clear()
+    text_metrics.measure_node.cache_clear()
+
+
+def _stages(raw_text):
+    """The pipeline stages as zero-arg callables, each fed by the previous one."""
+    state = {}
+
+    def parse():
+        state["fc"] = Flowchart.coerce(build_flowchart(parse_steps(raw_text)))
+
+    def layout():
+        state["positions"] = layered_layout(state["fc"])
+
+    def route():
+        state["routes"] = route_edges(state["fc"], state["positions"])
+
+    def render():
+        state["svg_bytes"] = sum(len(chunk) for chunk in iter_svg(state["fc"], state["positions"],
+                                                                  routes=state["routes"]))
+
+    return [("parse", parse), ("layout", layout), ("route", route), ("render", render)], state
+
+
+def bench_size(n, repeat=3, seed=0):
+    raw_text = synthetic_steps(n, seed=seed)
+    lines = raw_text.count("\n") + 1
+    timings = {"parse": [], "layout": [], "route": [], "render": []}
+
+    for _ in range(repeat):
+        _clear_text_caches()
+        stages, state = _stages(raw_text)
+        for name, fn in stages:
+            start = time.perf_counter()
+            fn()
+            timings[name].append(time.perf_counter() - start)
+
+    # separate pass for memory, tracemalloc slows everything down
+    _clear_text_caches()
+    stages, state = _stages(raw_text)
+    peak = {}
+    tracemalloc.start()
+    for name, fn in stages:
+        tracemalloc.reset_peak()
+        fn()
+        peak[name] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = {"size": n, "lines": lines, "nodes": len(state["fc"]),
+              "edges": len(state["fc"].edges), "svg_bytes": state["svg_bytes"], "stages": {}}
+    for name, samples in timings.items():
+        best = min(samples)
+        result["stages"][name] = {
+            "best_s": best,
+            "median_s": statistics.median(samples),
+            "lines_per_s": lines / best if best > 0 else None,
+            "peak_bytes": peak[name],
+        }
+    return result
+
+
+def scaling_exponents(results):
+    """
+    Slope of log(time) vs log(size) between consecutive sizes, per stage.
+    ~1.0 is linear; ~2.0 is quadratic.
+    """
+    curves = {}
+    for stage in ("parse", "layout", "route", "render"):
+        points = []
+        for a, b in zip(results, results[1:]):
+            ta, tb = a["stages"][stage]["best_s"], b["stages"][stage]["best_s"]
+            if ta > 0 and tb > 0 and b["lines"] > a["lines"]:
+                slope = math.log(tb / ta) / math.log(b["lines"] / a["lines"])
+                points.append({"from": a["size"], "to": b["size"], "exponent": round(slope, 3)})
+        curves[stage] = points
+    return curves
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def bench_e2e(requests=20, concurrency=4, token_latency=0.005, steps=30, load_latency=0.0):
+    """
+    Full generate path (HTTP client, streaming parse, caching and library disabled)
+    against a local fake server. Measures end-to-end latency and time to the
+    first parsed step.
+    """
+    server = start_fake_server(token_latency=token_latency, steps=steps, load_latency=load_latency)
+    previous_client = get_client()
+    client = OllamaClient(host=server.url)
+    set_client(client)
+
+    def one(i):
+        prompt = f"benchmark problem {i}"
+        start = time.perf_counter()
+        first_step = None
+        for partial in generate_flowchart_stream(prompt, use_cache=False, save=False):
+            if first_step is None and partial["nodes"]:
+                first_step = time.perf_counter() - start
+        return time.perf_counter() - start, first_step
+
+    def one_blocking(i):
+        start = time.perf_counter()
+        generate_flowchart_with_ai(f"benchmark problem {i}", use_cache=False, save=False)
+        return time.perf_counter() - start
+
+    try:
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            streamed = list(pool.map(one, range(requests)))
+        wall = time.perf_counter() - wall_start
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            blocking = list(pool.map(one_blocking, range(requests)))
+    finally:
+        set_client(previous_client)
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+    latencies = [total for total, _ in streamed]
+    first = [f for _, f in streamed if f is not None]
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "token_latency_s": token_latency,
+        "steps": steps,
+        "wall_s": wall,
+        "requests_per_s": requests / wall if wall > 0 else None,
+        "stream_latency_p50_s": _percentile(latencies, 50),
+        "stream_latency_p95_s": _percentile(latencies, 95),
+        "first_step_p50_s": _percentile(first, 50) if first else None,
+        "first_step_p95_s": _percentile(first, 95) if first else None,
+        "blocking_latency_p50_s": _percentile(blocking, 50),
+        "blocking_latency_p95_s": _percentile(blocking, 95),
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark parse / layout / route / render")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma separated step counts")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--e2e", action="store_true", help="also run the end-to-end fake server benchmark")
+    parser.add_argument("--requests", type=int, default=20, help="e2e: number of generations")
+    parser.add_argument("--concurrency", type=int, default=4, help="e2e: generations in flight")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="e2e: seconds per token")
+    parser.add_argument("--steps", type=int, default=30, help="e2e: lines per completion")
+    parser.add_argument("--out", default="bench_results.json")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = []
+    for n in sizes:
+        r = bench_size(n, args.repeat, args.seed)
+        results.append(r)
+        s = r["stages"]
+        print(f"{n:>7} lines  parse {s['parse']['best_s'] * 1000:9.1f}ms  "
+              f"layout {s['layout']['best_s'] * 1000:9.1f}ms  "
+              f"route {s['route']['best_s'] * 1000:9.1f}ms  "
+              f"render {s['render']['best_s'] * 1000:9.1f}ms  "
+              f"peak {max(v['peak_bytes'] for v in s.values()) / 1e6:7.1f}MB")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": _git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "sizes": results,
+        "scaling": scaling_exponents(results),
+    }
+
+    if args.e2e:
+        e2e = bench_e2e(args.requests, args.concurrency, args.token_latency, args.steps)
+        report["e2e"] = e2e
+        print(f"e2e: {e2e['requests_per_s']:.2f} req/s, p95 {e2e['stream_latency_p95_s'] * 1000:.0f}ms, "
+              f"first step p50 {(e2e['first_step_p50_s'] or 0) * 1000:.0f}ms "
+              f"(blocking p50 {e2e['blocking_latency_p50_s'] * 1000:.0f}ms)")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Level of detail for large charts: collapsible clusters.
+
+A chart with thousands of steps is unreadable as one drawing, and laying
+out and drawing all of it costs time and memory in proportion to the whole
+chart. Users look at one region at a time, so the chart is split into a tree
+of clusters:
+
+- block: a decision together with everything inside its branches, up to
+  (not including) its merge point
+- run: a straight sequence of at least MIN_RUN process steps
+- section: MAX_GROUP consecutive runs, blocks or steps, for sequences too
+  long to show one item at a time (sections nest, so a 10k-step chart
+  collapses to a handful of boxes)
+
+Each collapsed cluster is drawn as a single summary box. Only the visible
+chart (expanded clusters plus summary boxes) goes through layout, routing
+and SVG. Laid out with an IncrementalSession's memo, the blocks outside a
+cluster that was expanded or collapsed are reused rather than laid out
+again, so a toggle costs about the size of what is on screen.
+
+    tree = cluster_tree(flowchart)
+    expanded = tree.auto_expand(LOD_BUDGET)
+    view = tree.view(expanded)               # Flowchart with summary nodes
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import metrics
+from flowchart_layout import block_tree
+from flowchart_model import Edge, Flowchart, Node, content_hash
+
+# charts with more steps than this open collapsed
+LOD_THRESHOLD = int(os.getenv("FLOWCHART_LOD_THRESHOLD", 150))
+# about how many boxes auto_expand opens up to
+LOD_BUDGET = int(os.getenv("FLOWCHART_LOD_BUDGET", 120))
+MIN_RUN = 4
+MAX_GROUP = 12
+LABEL_CHARS = 28
+CLUSTER_CACHE_ENTRIES = 16
+
+CLUSTER_CACHE = metrics.counter("flowchart_cluster_cache_total", "Cluster tree lookups", ("result",))
+
+BLOCK, RUN, SECTION = "block", "run", "section"
+
+
+def _short(text):
+    return text if len(text) <= LABEL_CHARS else text[:LABEL_CHARS - 1].rstrip() + "…"
+
+
+class Cluster:
+    __slots__ = ("id", "kind", "members", "children", "parent", "label")
+
+    def __init__(self, kind, members, label):
+        self.id = f"{kind}:{members[0]}-{members[-1]}"
+        self.kind = kind
+        self.members = members      # every step id inside, nested clusters included
+        self.children = []          # clusters directly inside
+        self.parent = None
+        self.label = label
+
+    def __repr__(self):
+        return f"Cluster({self.id!r}, {len(self.members)} steps)"
+
+    def expanded_size(self):
+        """Boxes shown when this cluster is open and its children are not."""
+        return len(self.members) - sum(len(c.members) for c in self.children) + len(self.children)
+
+
+class ClusterTree:
+    def __init__(self, flowchart):
+        self.flowchart = Flowchart.coerce(flowchart)
+        self.clusters = {}
+        self.top = []
+        self._build()
+
+    # -- building -------------------------------------------------------------
+
+    def _build(self):
+        fc = self.flowchart
+        if not fc.nodes:
+            return
+        rpo, _, idom, branches, continuations = block_tree(fc)
+        types = {n.id: n.type for n in fc.nodes}
+
+        # preorder of the dominator tree, branches before merge points, so a
+        # decision's block is one contiguous slice
+        order, index = [], {}
+        children = {node_id: branches[node_id] + continuations[node_id] for node_id in rpo}
+        stack = [node_id for node_id in reversed(rpo) if idom[node_id] not in types]
+        while stack:
+            node_id = stack.pop()
+            index[node_id] = len(order)
+            order.append(node_id)
+            stack.extend(reversed(children[node_id]))
+        subtree_end = {}
+        for node_id in reversed(order):
+            kids = children[node_id]
+            subtree_end[node_id] = subtree_end[kids[-1]] if kids else index[node_id] + 1
+
+        # innermost decision whose branches a step sits in
+        enclosing = {}
+        for node_id in rpo:
+            parent = idom[node_id]
+            if parent not in types:
+                enclosing[node_id] = None
+            elif types[parent] == "decision" and node_id in branches[parent]:
+                enclosing[node_id] = parent
+            else:
+                enclosing[node_id] = enclosing[parent]
+
+        def is_unit(node_id):
+            return types[node_id] in ("process", "decision")
+
+        def next_unit(node_id):
+            # the step a unit leads to on the same level
+            if types[node_id] == "decision":
+                after = continuations[node_id]
+                nxt = after[0] if len(after) == 1 else None
+            else:
+                nxt = branches[node_id][0] if len(branches[node_id]) == 1 and not continuations[node_id] else None
+            return nxt if nxt is not None and is_unit(nxt) else None
+
+        blocks = {}
+        for node_id in order:
+            if types[node_id] != "decision":
+                continue
+            after = continuations[node_id]
+            end = index[after[0]] if after else subtree_end[node_id]
+            members = order[index[node_id]:end]
+            if len(members) > 1:
+                text = fc.node(node_id).text
+                blocks[node_id] = Cluster(BLOCK, members, f"{_short(text)} ({len(members)} steps)")
+
+        followed = {next_unit(u) for u in order if is_unit(u)}
+        for head in order:
+            if not is_unit(head) or head in followed:
+                continue
+            chain = [head]
+            while True:
+                nxt = next_unit(chain[-1])
+                if nxt is None:
+                    break
+                chain.append(nxt)
+            parent = blocks.get(enclosing[head])
+            for item in self._group_chain(chain, blocks):
+                if isinstance(item, Cluster):
+                    self._adopt(parent, item)
+        self._index(self.top)
+
+    def _group_chain(self, chain, blocks):
+        """Items of one chain: steps, runs and blocks, then sections if still too many."""
+        fc = self.flowchart
+        items, run = [], []
+
+        def flush():
+            if len(run) >= MIN_RUN:
+                label = f"{_short(fc.node(run[0]).text)} … {_short(fc.node(run[-1]).text)} ({len(run)} steps)"
+                cluster = Cluster(RUN, list(run), label)
+                for child in self._sections(list(run), RUN):
+                    if isinstance(child, Cluster):
+                        child.parent = cluster
+                        cluster.children.append(child)
+                items.append(cluster)
+            else:
+                items.extend(run)
+            run.clear()
+
+        for node_id in chain:
+            if node_id in blocks:
+                flush()
+                items.append(blocks[node_id])
+            elif fc.node(node_id).type == "decision":
+                flush()
+                items.append(node_id)
+            else:
+                run.append(node_id)
+        flush()
+        return self._sections(items, SECTION)
+
+    def _sections(self, items, kind):
+        # fold MAX_GROUP items at a time until the level fits in MAX_GROUP
+        while len(items) > MAX_GROUP:
+            grouped = []
+            for i in range(0, len(items), MAX_GROUP):
+                chunk = items[i:i + MAX_GROUP]
+                if len(chunk) == 1:
+                    grouped.extend(chunk)
+                    continue
+                members = []
+                for item in chunk:
+                    members.extend(item.members if isinstance(item, Cluster) else [item])
+                cluster = Cluster(kind, members,
+                                  f"Steps {members[0]}–{members[-1]} ({len(members)} steps)")
+                for item in chunk:
+                    if isinstance(item, Cluster):
+                        item.parent = cluster
+                        cluster.children.append(item)
+                grouped.append(cluster)
+            items = grouped
+        return items
+
+    def _adopt(self, parent, cluster):
+        cluster.parent = parent
+        if parent is None:
+            self.top.append(cluster)
+        else:
+            parent.children.append(cluster)
+
+    def _index(self, clusters):
+        stack = list(clusters)
+        while stack:
+            cluster = stack.pop()
+            self.clusters[cluster.id] = cluster
+            stack.extend(cluster.children)
+        # document order, so summaries and options read top to bottom
+        position = {n.id: i for i, n in enumerate(self.flowchart.nodes)}
+        self.top.sort(key=lambda c: position[c.members[0]])
+        for cluster in self.clusters.values():
+            cluster.children.sort(key=lambda c: position[c.members[0]])
+
+    # -- views ----------------------------------------------------------------
+
+    def _owners(self, expanded):
+        """{step id: summary id} for every step hidden in a collapsed cluster."""
+        owner = {}
+        stack = list(self.top)
+        while stack:
+            cluster = stack.pop()
+            if cluster.id in expanded:
+                stack.extend(cluster.children)
+            else:
+                for node_id in cluster.members:
+                    owner[node_id] = cluster.id
+        return owner
+
+    def visible(self, expanded):
+        """Clusters on screen, open or collapsed, in document order."""
+        shown = []
+        stack = list(reversed(self.top))
+        while stack:
+            cluster = stack.pop()
+            shown.append(cluster)
+            if cluster.id in expanded:
+                stack.extend(reversed(cluster.children))
+        return shown
+
+    def view(self, expanded=()):
+        """
+        The chart as drawn: steps inside collapsed clusters are replaced by
+        one "cluster" node each. Edges between hidden steps are dropped;
+        edges crossing a cluster's edge attach to its summary node.
+        """
+        with metrics.span("cluster"):
+            fc = self.flowchart
+            owner = self._owners(set(expanded))
+            view = Flowchart()
+            for node in fc.nodes:
+                summary = owner.get(node.id)
+                if summary is None:
+                    view.add_node(node)
+                elif summary not in view:
+                    view.add_node(Node(summary, "cluster", self.clusters[summary].label))
+
+            seen = set()
+            for edge in fc.edges:
+                source = owner.get(edge.source, edge.source)
+                target = owner.get(edge.target, edge.target)
+                if source == target:
+                    continue
+                # a branch label only means something next to its decision
+                label = edge.label if source == edge.source else None
+                key = (source, target, label)
+                if key not in seen:
+                    seen.add(key)
+                    view.add_edge(Edge(source, target, label) if key != (edge.source, edge.target, edge.label)
+                                  else edge)
+        return view
+
+    def auto_expand(self, budget=LOD_BUDGET):
+        """
+        Clusters to open so about `budget` boxes are shown, outermost and
+        earliest first.
+        """
+        shown = len(self.flowchart) - sum(len(c.members) for c in self.top) + len(self.top)
+        expanded = set()
+        queue = list(self.top)
+        i = 0
+        while i < len(queue):
+            cluster = queue[i]
+            i += 1
+            cost = cluster.expanded_size() - 1
+            if shown + cost > budget:
+                continue
+            expanded.add(cluster.id)
+            shown += cost
+            queue.extend(cluster.children)
+        return expanded
+
+
+_trees = OrderedDict()
+_trees_lock = threading.Lock()
+
+
+def cluster_tree(flowchart, chart_hash=None):
+    """ClusterTree for a chart, kept per content hash so toggles don't rebuild it."""
+    chart_hash = chart_hash or content_hash(flowchart)
+    with _trees_lock:
+        tree = _trees.get(chart_hash)
+        if tree is not None:
+            _trees.move_to_end(chart_hash)
+    if tree is not None:
+        CLUSTER_CACHE.inc(result="hit")
+        return tree
+
+    CLUSTER_CACHE.inc(result="miss")
+    tree = ClusterTree(flowchart)
+    with _trees_lock:
+        _trees[chart_hash] = tree
+        while len(_trees) > CLUSTER_CACHE_ENTRIES:
+            _trees.popitem(last=False)
+    return tree
@@ -0,0 +1,30 @@
+import pytest
+
+import ai_services
+from fake_ollama import start_fake_server
+from flowchart_cache import FlowchartCache
+from flowchart_library import FlowchartLibrary
+from ollama_client import OllamaClient, get_client, set_client
+
+
+@pytest.fixture
+def fake_ollama():
+    """A local fake Ollama server, installed as the process-wide client."""
+    server = start_fake_server()
+    previous = get_client()
+    client = OllamaClient(host=server.url)
+    set_client(client)
+    yield server
+    set_client(previous)
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def isolated_storage(tmp_path, monkeypatch):
+    """Cache and library in tmp_path instead of the app's own files."""
+    monkeypatch.setattr(ai_services, "flowchart_cache", FlowchartCache(directory=str(tmp_path / "cache")))
+    library = FlowchartLibrary(str(tmp_path / "library.db"), batch_delay=0.05)
+    monkeypatch.setattr(ai_services, "library", library)
+    return library
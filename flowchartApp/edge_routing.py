@@ -0,0 +1,271 @@
+"""
+Orthogonal edge routing.
+
+Runs between layout and SVG output. Each edge becomes a polyline of
+horizontal and vertical segments that stays clear of the node boxes it
+doesn't connect:
+
+- Forward edges leave from the bottom of the source and enter the top of
+  the target. A decision's side branches leave from its left/right corner.
+  The horizontal run goes in the channel just above the target, so every
+  edge into a merge point arrives along one shared line (a bundle). If
+  that channel is blocked, the channel just below the source is tried.
+  If both are blocked, the edge detours through a free vertical lane.
+- Back edges (loops) leave from the side of the source and climb a lane
+  outside every box they pass. They then enter the top of the target
+  through the same channel its incoming edge uses. Lanes are kept apart,
+  so nested loops don't draw over each other.
+- Labels go near the start of their edge, at the first spot that
+  overlaps neither a box nor an earlier label.
+
+Obstacle checks go through a uniform grid of node boxes, so each query
+only looks at the boxes near a segment. Routing stays roughly linear in
+the chart size instead of testing every edge against every node.
+"""
+
+from collections import defaultdict
+
+from text_metrics import text_width
+
+CELL = 160
+CHANNEL = 30          # half of the layout's GAP_Y: the free band between rows
+CLEARANCE = 6         # gap kept between a route and any box it passes
+LANE_GAP = 18         # between a loop lane and the boxes or lanes beside it
+LABEL_HEIGHT = 20
+LABEL_MIN_WIDTH = 30
+MAX_LANE_STEPS = 64
+
+
+class Route:
+    __slots__ = ("points", "label")
+
+    def __init__(self, points, label=None):
+        self.points = points    # ((x, y), ...) in layout coordinates
+        self.label = label      # (x, y, width, height) of the label box center/size, or None
+
+    def __repr__(self):
+        return f"Route({self.points!r}, {self.label!r})"
+
+
+class SpatialGrid:
+    """Uniform grid over (x0, y0, x1, y1) boxes; a query only visits the cells it covers."""
+
+    def __init__(self, cell=CELL):
+        self.cell = cell
+        self._cells = defaultdict(list)
+        self._entries = []
+
+    def _cover(self, box):
+        c = self.cell
+        for gx in range(int(box[0] // c), int(box[2] // c) + 1):
+            for gy in range(int(box[1] // c), int(box[3] // c) + 1):
+                yield gx, gy
+
+    def insert(self, item, box):
+        index = len(self._entries)
+        self._entries.append((item, box))
+        for key in self._cover(box):
+            self._cells[key].append(index)
+
+    def query(self, box):
+        """(item, box) for every stored box overlapping `box`."""
+        seen = set()
+        found = []
+        cells = self._cells
+        for key in self._cover(box):
+            for index in cells.get(key, ()):
+                if index in seen:
+                    continue
+                seen.add(index)
+                item, b = self._entries[index]
+                if b[0] < box[2] and box[0] < b[2] and b[1] < box[3] and box[1] < b[3]:
+                    found.append((item, b))
+        return found
+
+
+def _node_box(pos):
+    half_w, half_h = pos["width"] / 2, pos["height"] / 2
+    return pos["x"] - half_w, pos["y"] - half_h, pos["x"] + half_w, pos["y"] + half_h
+
+
+def _segment_box(a, b, pad):
+    return min(a[0], b[0]) - pad, min(a[1], b[1]) - pad, max(a[0], b[0]) + pad, max(a[1], b[1]) + pad
+
+
+def _simplify(points):
+    """Drop repeated points and the middle of straight runs."""
+    out = []
+    for p in points:
+        if out and abs(out[-1][0] - p[0]) < 0.01 and abs(out[-1][1] - p[1]) < 0.01:
+            continue
+        if len(out) >= 2:
+            a, b = out[-2], out[-1]
+            if (abs(a[0] - b[0]) < 0.01 and abs(b[0] - p[0]) < 0.01) or \
+               (abs(a[1] - b[1]) < 0.01 and abs(b[1] - p[1]) < 0.01):
+                out[-1] = p
+                continue
+        out.append(p)
+    return tuple(out)
+
+
+def _length(points):
+    return sum(abs(a[0] - b[0]) + abs(a[1] - b[1]) for a, b in zip(points, points[1:]))
+
+
+class _Router:
+    def __init__(self, fc, positions):
+        self.nodes = SpatialGrid()
+        for node in fc.nodes:
+            pos = positions.get(node.id)
+            if pos is not None:
+                self.nodes.insert(node.id, _node_box(pos))
+        self.lanes = SpatialGrid()
+        self.labels = SpatialGrid()
+
+    def hits(self, points, ignore):
+        count = 0
+        for a, b in zip(points, points[1:]):
+            for item, _ in self.nodes.query(_segment_box(a, b, CLEARANCE)):
+                if item not in ignore:
+                    count += 1
+        return count
+
+    def free_lane(self, x, y0, y1, direction, ignore):
+        """First x from `x` outward (direction +1/-1) where a vertical run y0..y1 is clear."""
+        y0, y1 = min(y0, y1), max(y0, y1)
+        for _ in range(MAX_LANE_STEPS):
+            box = (x - LANE_GAP / 2, y0, x + LANE_GAP / 2, y1)
+            edges = [b for item, b in self.nodes.query(box) if item not in ignore]
+            edges += [b for _, b in self.lanes.query(box)]
+            if not edges:
+                return x
+            if direction > 0:
+                x = max(b[2] for b in edges) + LANE_GAP
+            else:
+                x = min(b[0] for b in edges) - LANE_GAP
+        return x
+
+    def best(self, candidates, ignore):
+        best = None
+        for points in candidates:
+            points = _simplify(points)
+            score = (self.hits(points, ignore), _length(points))
+            if score[0] == 0:
+                return points
+            if best is None or score < best[0]:
+                best = (score, points)
+        # nothing is clear (very dense chart): least crossings, then shortest
+        return best[1]
+
+    def first_clear(self, candidates, ignore):
+        for points in candidates:
+            points = _simplify(points)
+            if not self.hits(points, ignore):
+                return points
+        return None
+
+    def forward(self, s, t, source_type, ignore):
+        sx, sy, sw, sh = s["x"], s["y"], s["width"], s["height"]
+        tx, ty, th = t["x"], t["y"], t["height"]
+        start, end = (sx, sy + sh / 2), (tx, ty - th / 2)
+        below_source = start[1] + CHANNEL
+        above_target = max(end[1] - CHANNEL, (start[1] + end[1]) / 2)
+
+        candidates = []
+        if source_type == "decision" and abs(tx - sx) > sw / 4:
+            # side branch: out of the corner, across, then down
+            corner = (sx + (sw / 2 if tx > sx else -sw / 2), sy)
+            candidates.append((corner, (tx, sy), end))
+        if abs(tx - sx) < 0.5:
+            candidates.append((start, end))
+        candidates.append((start, (sx, above_target), (tx, above_target), end))
+        candidates.append((start, (sx, below_source), (tx, below_source), end))
+
+        points = self.first_clear(candidates, ignore)
+        if points is not None:
+            return points
+        # detour: along the source channel to a free lane, down, back along the target channel
+        detours = []
+        for direction in (1, -1):
+            lane = self.free_lane(tx, below_source, above_target, direction, ignore)
+            detours.append((start, (sx, below_source), (lane, below_source),
+                            (lane, above_target), (tx, above_target), end))
+        return self.best(candidates + detours, ignore)
+
+    def backward(self, s, t, ignore):
+        # loop back up: out of the side and up a lane clear of everything in between,
+        # then into the top of the target, joining the line that already enters it there
+        if s is t:
+            x, y = s["x"] + s["width"] / 2, s["y"]
+            dy = s["height"] / 4
+            return (x, y + dy), (x + 2 * LANE_GAP, y + dy), (x + 2 * LANE_GAP, y - dy), (x, y - dy)
+        t_top = t["y"] - t["height"] / 2
+        above_target = t_top - CHANNEL
+        candidates = []
+        for side in (1, -1):
+            exit_x = s["x"] + side * s["width"] / 2
+            entry_x = t["x"] + side * t["width"] / 2
+            start_lane = (max if side > 0 else min)(exit_x, entry_x) + side * LANE_GAP
+            lane = self.free_lane(start_lane, above_target, s["y"], side, ignore)
+            candidates.append(((exit_x, s["y"]), (lane, s["y"]), (lane, above_target),
+                               (t["x"], above_target), (t["x"], t_top)))
+        for side in (1, -1):
+            # fallback: straight into the target's side
+            exit_x = s["x"] + side * s["width"] / 2
+            entry_x = t["x"] + side * t["width"] / 2
+            lane = candidates[0 if side > 0 else 1][1][0]
+            candidates.append(((exit_x, s["y"]), (lane, s["y"]), (lane, t["y"]), (entry_x, t["y"])))
+        points = self.best(candidates, ignore)
+
+        lane = points[1][0] if len(points) > 2 else points[0][0]
+        ys = [y for x, y in points if x == lane] or [s["y"], t["y"]]
+        self.lanes.insert(None, (lane - LANE_GAP / 2, min(ys), lane + LANE_GAP / 2, max(ys)))
+        return points
+
+    def place_label(self, text, points):
+        width = max(LABEL_MIN_WIDTH, text_width(text, size=11, bold=True) + 10)
+        half_w, half_h = width / 2, LABEL_HEIGHT / 2
+        candidates = []
+        # close to where the edge leaves its source first, then the middle of each segment
+        a, b = points[0], points[1]
+        if abs(a[0] - b[0]) < 0.01:
+            step = half_h + 6
+            direction = 1 if b[1] > a[1] else -1
+            candidates.append((a[0], a[1] + direction * step))
+        else:
+            step = half_w + 6
+            direction = 1 if b[0] > a[0] else -1
+            candidates.append((a[0] + direction * step, a[1]))
+        candidates += [((p[0] + q[0]) / 2, (p[1] + q[1]) / 2) for p, q in zip(points, points[1:])]
+
+        for x, y in candidates:
+            box = (x - half_w, y - half_h, x + half_w, y + half_h)
+            if not self.nodes.query(box) and not self.labels.query(box):
+                break
+        else:
+            x, y = candidates[0]
+            box = (x - half_w, y - half_h, x + half_w, y + half_h)
+        self.labels.insert(None, box)
+        return x, y, width, LABEL_HEIGHT
+
+
+def route_edges(flowchart, positions):
+    """
+    {edge index in flowchart.edges: Route} for every edge whose ends are
+    laid out. Points are in layout coordinates, the same as `positions`.
+    """
+    fc = flowchart
+    router = _Router(fc, positions)
+    routes = {}
+    for index, edge in enumerate(fc.edges):
+        s, t = positions.get(edge.source), positions.get(edge.target)
+        if s is None or t is None:
+            continue
+        ignore = (edge.source, edge.target)
+        if t["y"] - t["height"] / 2 > s["y"] + s["height"] / 2:
+            points = router.forward(s, t, fc.node(edge.source).type, ignore)
+        else:
+            points = router.backward(s, t, ignore)
+        label = router.place_label(str(edge.label), points) if edge.label else None
+        routes[index] = Route(points, label)
+    return routes
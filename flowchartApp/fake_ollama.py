@@ -0,0 +1,251 @@
+"""
+Minimal stand-in for an Ollama server, for benchmarks and offline testing.
+
+    python flowchartApp/fake_ollama.py --port 11434 --token-latency 0.01 --steps 12
+    python flowchartApp/fake_ollama.py --corpus ollama_corpus.jsonl.gz --speed 5
+
+Speaks /api/tags, /api/embed and /api/generate (streaming NDJSON and
+non-streaming JSON).
+With --corpus, prompts found in a recorded corpus (see replay_backend.py)
+are answered with the recorded completion and chunk timing, scaled by
+--speed. Any other prompt, or every prompt without --corpus, gets a
+synthetic numbered step list, sent a few characters per "token" with a
+configurable delay between tokens.
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_MODEL = "phi3"
+CHARS_PER_TOKEN = 4
+EMBED_DIM = 64
+
+
+def synthetic_steps(n, seed=0, decision_rate=0.2, max_depth=3):
+    """
+    A numbered step list of about `n` lines in the format the prompt asks for,
+    with (nested) Decision / (Yes) / (No) blocks.
+    """
+    rnd = random.Random(seed)
+    lines = ["Start"]
+
+    def process_text():
+        return f"Set value_{len(lines)} to value_{rnd.randrange(len(lines))} + {rnd.randrange(100)}"
+
+    def decision_text():
+        return f"Decision: Is value_{len(lines)} greater than {rnd.randrange(100)}?"
+
+    def branch(label, depth):
+        if depth < max_depth and rnd.random() < decision_rate / 2:
+            lines.append(f"({label}) {decision_text()}")
+            branch("Yes", depth + 1)
+            branch("No", depth + 1)
+        else:
+            lines.append(f"({label}) Print \"{label.lower()} {len(lines)}\"")
+
+    while len(lines) < n - 1:
+        if rnd.random() < decision_rate:
+            lines.append(decision_text())
+            branch("Yes", 1)
+            branch("No", 1)
+        else:
+            lines.append(process_text())
+
+    lines.append("End")
+    return "\n".join(f"{i}. {text}" for i, text in enumerate(lines, 1))
+
+
+def split_tokens(text, chars_per_token=CHARS_PER_TOKEN):
+    return [text[i:i + chars_per_token] for i in range(0, len(text), chars_per_token)]
+
+
+def fake_embedding(text, dim=EMBED_DIM):
+    """Hashed bag of words: same words -> same vector, nothing semantic about it."""
+    vector = [0.0] * dim
+    for word in text.lower().split():
+        vector[zlib.crc32(word.encode("utf-8")) % dim] += 1.0
+    return vector
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/api/tags":
+            models = [{"name": f"{name}:latest", "model": f"{name}:latest"} for name in self.server.model_names()]
+            self._send_json(200, {"models": models})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        if path not in ("/api/generate", "/api/embed"):
+            self._send_json(404, {"error": "not found"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+
+        if path == "/api/embed":
+            inputs = payload.get("input", "")
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            self._send_json(200, {"model": payload.get("model"), "embeddings": [fake_embedding(t) for t in inputs]})
+            return
+
+        chunks = self.server.chunks_for(payload.get("model", self.server.model), payload.get("prompt", ""))
+        self.stream_completion(payload, chunks)
+
+    def stream_completion(self, payload, chunks):
+        """`chunks` is a list of (seconds to wait before it, text)."""
+        server = self.server
+        model = payload.get("model", server.model)
+        started = time.perf_counter()
+        if server.load_latency:
+            time.sleep(server.load_latency)
+        loaded = time.perf_counter()
+
+        def stats():
+            done_at = time.perf_counter()
+            return {
+                "model": model,
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": int((done_at - started) * 1e9),
+                "load_duration": int((loaded - started) * 1e9),
+                "prompt_eval_count": len(payload.get("prompt", "")) // CHARS_PER_TOKEN,
+                "prompt_eval_duration": 0,
+                "eval_count": len(chunks),
+                "eval_duration": int((done_at - loaded) * 1e9),
+            }
+
+        if payload.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for delay, token in chunks:
+                    if delay:
+                        time.sleep(delay)
+                    self._write_chunk((json.dumps({"model": model, "response": token, "done": False}) + "\n").encode("utf-8"))
+                final = stats()
+                final["response"] = ""
+                self._write_chunk((json.dumps(final) + "\n").encode("utf-8"))
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # client hung up (e.g. early termination); nothing left to do
+                self.close_connection = True
+        else:
+            time.sleep(sum(delay for delay, _ in chunks))
+            final = stats()
+            final["response"] = "".join(token for _, token in chunks)
+            self._send_json(200, final)
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, token_latency=0.0, steps=12, load_latency=0.0, model=DEFAULT_MODEL,
+                 corpus=None, speed=1.0):
+        super().__init__(address, FakeOllamaHandler)
+        self.token_latency = token_latency
+        self.steps = steps
+        self.load_latency = load_latency
+        self.model = model
+        self.corpus = corpus
+        self.speed = speed
+
+    def handle_error(self, request, client_address):
+        # clients dropping keep-alive connections is normal, not worth a traceback
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+    def completion_for(self, prompt):
+        # same prompt -> same chart, different prompts -> different charts
+        return synthetic_steps(self.steps, seed=zlib.crc32(prompt.encode("utf-8")))
+
+    def chunks_for(self, model, prompt):
+        record = self.corpus.get(model, prompt) if self.corpus is not None else None
+        if record is not None:
+            scale = 0 if self.speed <= 0 else 1 / (1000 * self.speed)
+            return [(delay_ms * scale, text) for delay_ms, text in record["chunks"]]
+        return [(self.token_latency, token) for token in split_tokens(self.completion_for(prompt))]
+
+    def model_names(self):
+        names = {self.model}
+        if self.corpus is not None:
+            names.update(self.corpus.models())
+        return sorted(names)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_fake_server(host="127.0.0.1", port=0, **kwargs):
+    """Start a server on a background thread; port 0 picks a free port."""
+    server = FakeOllamaServer((host, port), **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds between streamed tokens")
+    parser.add_argument("--load-latency", type=float, default=0.0, help="simulated model load per request")
+    parser.add_argument("--steps", type=int, default=12, help="lines per synthetic completion")
+    parser.add_argument("--corpus", help="recorded corpus to replay (gzip JSONL from record mode)")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed-up for recorded timing, 0 = instant")
+    args = parser.parse_args(argv)
+
+    corpus = None
+    if args.corpus:
+        from replay_backend import Corpus
+        corpus = Corpus(args.corpus)
+        print(f"Loaded {len(corpus)} recordings from {args.corpus}")
+
+    server = FakeOllamaServer((args.host, args.port), token_latency=args.token_latency,
+                              steps=args.steps, load_latency=args.load_latency,
+                              corpus=corpus, speed=args.speed)
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
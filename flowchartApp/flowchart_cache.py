@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+CACHE_DIR = os.getenv(
+    "FLOWCHART_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".flowchart_cache"),
+)
+CACHE_TTL = float(os.getenv("FLOWCHART_CACHE_TTL", 7 * 24 * 3600))
+CACHE_MAX_MEMORY = int(os.getenv("FLOWCHART_CACHE_MAX_MEMORY", 256))
+CACHE_MAX_DISK = int(os.getenv("FLOWCHART_CACHE_MAX_DISK", 5000))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    text = re.sub(r"\s+", " ", prompt.strip().lower())
+    return text.rstrip(" .?!")
+
+
+def make_cache_key(prompt: str, model: str, template_version) -> str:
+    raw = json.dumps([normalize_prompt(prompt), model, str(template_version)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class FlowchartCache:
+    """
+    Two tier cache for generated flowcharts.
+    - memory: bounded LRU of serialized results
+    - disk: one JSON file per key, survives Streamlit restarts
+    Entries older than `ttl` seconds are treated as misses (ttl <= 0 disables expiry).
+    """
+
+    def __init__(self, directory=CACHE_DIR, ttl=CACHE_TTL,
+                 max_memory=CACHE_MAX_MEMORY, max_disk=CACHE_MAX_DISK):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_count = None
+
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expired(self, created):
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, payload = entry
+                if not self._expired(created):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return json.loads(payload)
+                del self._memory[key]
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            created, payload = entry
+            self._remember(key, created, payload)
+            self.hits += 1
+            self.disk_hits += 1
+        return json.loads(payload)
+
+    def put(self, key, value):
+        created = time.time()
+        payload = json.dumps(value, separators=(",", ":"))
+        with self._lock:
+            self._remember(key, created, payload)
+        self._write_disk(key, created, payload)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._disk_count = 0
+        if not os.path.isdir(self.directory):
+            return
+        for path in self._disk_files():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_count or 0,
+            }
+
+    def _remember(self, key, created, payload):
+        self._memory[key] = (created, payload)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        created = record.get("created", 0)
+        if self._expired(created):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return created, json.dumps(record["value"], separators=(",", ":"))
+
+    def _write_disk(self, key, created, payload):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            is_new = not os.path.exists(path)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write('{"created":%r,"value":%s}' % (created, payload))
+            os.replace(tmp_path, path)
+        except OSError:
+            # disk tier is best effort; the memory tier still holds the entry
+            return
+
+        with self._lock:
+            if self._disk_count is None:
+                self._disk_count = sum(1 for _ in self._disk_files())
+            elif is_new:
+                self._disk_count += 1
+            over_limit = self._disk_count > self.max_disk
+        if over_limit:
+            self._prune_disk()
+
+    def _disk_files(self):
+        for bucket in os.scandir(self.directory):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.endswith(".json"):
+                    yield entry.path
+
+    def _prune_disk(self):
+        """Drop expired files, then the oldest ones, down to 90% of max_disk."""
+        files = []
+        for path in self._disk_files():
+            try:
+                files.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        files.sort()
+
+        target = int(self.max_disk * 0.9)
+        removed = 0
+        now = time.time()
+        for mtime, path in files:
+            expired = self.ttl > 0 and now - mtime > self.ttl
+            if not expired and len(files) - removed <= target:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                continue
+
+        with self._lock:
+            self._disk_count = len(files) - removed
+            self.evictions += removed
@@ -0,0 +1,325 @@
+"""
+Shared, searchable library of every generated flowchart.
+
+Each chart is stored once in SQLite under the SHA-256 of its canonical JSON
+(sorted keys, no whitespace). The same chart reached from several prompts
+has one row in `charts` plus one row per prompt in `generations`. That row
+records the prompt, model, profile and how long the generation took. An
+FTS5 index over prompts and node texts makes the library searchable:
+
+    library.save(flowchart, prompt, model)       # queued, returns the hash
+    library.search("bubble sort")                # [{hash, prompt, snippet, ...}]
+    library.get(chart_hash)                      # flowchart + svg, no LLM call
+
+Writes go through one writer thread and are committed in batches, so a
+burst of generations costs one transaction rather than one fsync each.
+Concurrent Streamlit sessions, and several app processes sharing one file,
+are handled by WAL mode (readers never block the writer) plus a busy timeout.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+import metrics
+from flowchart_model import Flowchart, canonical_json
+from flowchart_render import render_svg
+
+LIBRARY_PATH = os.getenv(
+    "FLOWCHART_LIBRARY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "flowchart_library.db"),
+)
+# how long the writer waits to gather more saves into one transaction
+WRITE_BATCH_DELAY = float(os.getenv("FLOWCHART_LIBRARY_BATCH_DELAY", 0.5))
+WRITE_BATCH_MAX = 200
+BUSY_TIMEOUT_MS = 5000
+
+LIBRARY_WRITES = metrics.counter("flowchart_library_writes_total", "Charts saved to the library", ("kind",))
+LIBRARY_BATCH_SECONDS = metrics.histogram("flowchart_library_batch_seconds", "Time to commit one batch of saves")
+LIBRARY_SEARCH_SECONDS = metrics.histogram("flowchart_library_search_seconds", "Library search latency")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS charts (
+    hash TEXT PRIMARY KEY,
+    flowchart TEXT NOT NULL,
+    svg TEXT,
+    node_count INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_saved REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL REFERENCES charts(hash),
+    prompt TEXT NOT NULL,
+    model TEXT,
+    profile TEXT,
+    generate_s REAL,
+    created REAL NOT NULL,
+    UNIQUE (hash, prompt, model, profile)
+);
+CREATE INDEX IF NOT EXISTS generations_created ON generations(created);
+CREATE VIRTUAL TABLE IF NOT EXISTS chart_search USING fts5(
+    prompt, nodes, tokenize = 'porter unicode61'
+);
+"""
+
+logger = logging.getLogger("flowchart.library")
+
+TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_query(text):
+    """User text -> FTS5 query: every word must match, the last one as a prefix."""
+    terms = TERM_RE.findall(text.lower())
+    if not terms:
+        return None
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"       # search-as-you-type
+    return " ".join(quoted)
+
+
+class FlowchartLibrary:
+    def __init__(self, path=LIBRARY_PATH, batch_delay=WRITE_BATCH_DELAY):
+        self.path = path
+        self.batch_delay = batch_delay
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._writer = None
+        self._lock = threading.Lock()
+        self._schema_ready = False
+        self.saved = 0
+        self.batches = 0
+        self.errors = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _conn(self):
+        # one connection per thread; sqlite3 connections aren't safe to share
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self._ensure_schema()
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _ensure_schema(self):
+        with self._lock:
+            if self._schema_ready:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.executescript(SCHEMA)
+            finally:
+                conn.close()
+            self._schema_ready = True
+
+    # -- writes ---------------------------------------------------------------
+
+    def save(self, flowchart, prompt, model=None, profile=None, generate_s=None, svg=None):
+        """
+        Queue a chart for the library and return its content hash. The SVG
+        is rendered on the writer thread when not given.
+        """
+        fc = Flowchart.coerce(flowchart)
+        payload = canonical_json(fc)
+        chart_hash = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        self._queue.put({
+            "hash": chart_hash,
+            "flowchart": payload,
+            "chart": fc,
+            "svg": svg,
+            "prompt": prompt.strip(),
+            "model": model,
+            "profile": profile,
+            "generate_s": generate_s,
+            "created": time.time(),
+        })
+        self._start_writer()
+        return chart_hash
+
+    def flush(self, timeout=None):
+        """Block until every queued save is committed (or timeout)."""
+        if self._writer is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _start_writer(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="flowchart-library", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_delay
+            while len(batch) < WRITE_BATCH_MAX:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or isinstance(batch[-1], threading.Event):
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            records = [item for item in batch if not isinstance(item, threading.Event)]
+            if records:
+                try:
+                    self._write_batch(records)
+                except Exception as e:
+                    # the library is best effort; generation results are still cached,
+                    # and the writer thread has to outlive one bad batch
+                    self.errors += 1
+                    logger.warning("flowchart library write failed: %s", e)
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _render_new(self, conn, records):
+        """
+        SVGs for the charts not stored yet, rendered before the write
+        transaction opens so other writers aren't kept waiting on it.
+        Charts are never deleted, so one seen here is still there when the
+        batch is written.
+        """
+        hashes = list({record["hash"] for record in records})
+        stored = {row[0] for row in conn.execute(
+            f"SELECT hash FROM charts WHERE hash IN ({','.join('?' * len(hashes))})", hashes)}
+        svgs = {}
+        for record in records:
+            if record["hash"] in stored:
+                continue
+            if record["svg"] is None:
+                record["svg"] = svgs.get(record["hash"]) or render_svg(record["chart"])
+            svgs[record["hash"]] = record["svg"]
+
+    def _write_batch(self, records):
+        started = time.perf_counter()
+        conn = self._conn()
+        self._render_new(conn, records)
+        with conn:
+            for record in records:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO charts (hash, flowchart, svg, node_count, created, last_saved) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (record["hash"], record["flowchart"], record["svg"], len(record["chart"]),
+                     record["created"], record["created"]),
+                )
+                if cursor.rowcount:
+                    LIBRARY_WRITES.inc(kind="chart")
+                else:
+                    conn.execute("UPDATE charts SET last_saved = ? WHERE hash = ?", (record["created"], record["hash"]))
+
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO generations (hash, prompt, model, profile, generate_s, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (record["hash"], record["prompt"], record["model"], record["profile"],
+                     record["generate_s"], record["created"]),
+                )
+                if cursor.rowcount:
+                    # search rows share the generation's rowid
+                    nodes = " ".join(n.text for n in record["chart"].nodes)
+                    conn.execute("INSERT INTO chart_search (rowid, prompt, nodes) VALUES (?, ?, ?)",
+                                 (cursor.lastrowid, record["prompt"], nodes))
+                    LIBRARY_WRITES.inc(kind="generation")
+        self.saved += len(records)
+        self.batches += 1
+        LIBRARY_BATCH_SECONDS.observe(time.perf_counter() - started)
+
+    # -- reads ----------------------------------------------------------------
+
+    def search(self, text, limit=20):
+        """Best matches for `text` over prompts and step texts, one row per chart."""
+        query = fts_query(text)
+        if query is None:
+            return self.recent(limit)
+        started = time.perf_counter()
+        rows = self._conn().execute(
+            """
+            SELECT g.hash, g.prompt, g.model, g.profile, g.created, c.node_count,
+                   snippet(chart_search, -1, '[', ']', '…', 8) AS snippet,
+                   bm25(chart_search, 2.0, 1.0) AS rank
+            FROM chart_search
+            JOIN generations g ON g.id = chart_search.rowid
+            JOIN charts c ON c.hash = g.hash
+            WHERE chart_search MATCH ?
+            ORDER BY rank
+            LIMIT ?
+            """,
+            (query, limit * 3),
+        ).fetchall()
+        LIBRARY_SEARCH_SECONDS.observe(time.perf_counter() - started)
+        return self._unique(rows, limit)
+
+    def recent(self, limit=20):
+        rows = self._conn().execute(
+            """
+            SELECT g.hash, g.prompt, g.model, g.profile, g.created, c.node_count, NULL AS snippet
+            FROM generations g JOIN charts c ON c.hash = g.hash
+            ORDER BY g.created DESC
+            LIMIT ?
+            """,
+            (limit * 3,),
+        ).fetchall()
+        return self._unique(rows, limit)
+
+    @staticmethod
+    def _unique(rows, limit):
+        # several prompts can lead to one chart; list it once, under its best match
+        results, seen = [], set()
+        for row in rows:
+            if row["hash"] in seen:
+                continue
+            seen.add(row["hash"])
+            results.append({key: row[key] for key in
+                            ("hash", "prompt", "model", "profile", "created", "node_count", "snippet")})
+            if len(results) == limit:
+                break
+        return results
+
+    def get(self, chart_hash):
+        """{"hash", "flowchart", "svg", "prompts", ...} for a stored chart, or None."""
+        conn = self._conn()
+        row = conn.execute("SELECT * FROM charts WHERE hash = ?", (chart_hash,)).fetchone()
+        if row is None:
+            return None
+        prompts = conn.execute(
+            "SELECT prompt, model, profile, generate_s, created FROM generations WHERE hash = ? ORDER BY created",
+            (chart_hash,),
+        ).fetchall()
+        return {
+            "hash": row["hash"],
+            "flowchart": json.loads(row["flowchart"]),
+            "svg": row["svg"],
+            "node_count": row["node_count"],
+            "created": row["created"],
+            "prompts": [dict(p) for p in prompts],
+        }
+
+    def stats(self):
+        conn = self._conn()
+        charts = conn.execute("SELECT COUNT(*) FROM charts").fetchone()[0]
+        generations = conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+        return {
+            "charts": charts,
+            "generations": generations,
+            "pending": self._queue.qsize(),
+            "batches": self.batches,
+            "errors": self.errors,
+        }
@@ -0,0 +1,188 @@
+import hashlib
+import json
+
+
+class Node:
+    """A flowchart step. Immutable once created so snapshots can share it."""
+
+    __slots__ = ("id", "type", "text", "branch")
+
+    def __init__(self, id, type, text, branch=None):
+        object.__setattr__(self, "id", str(id))
+        object.__setattr__(self, "type", type)
+        object.__setattr__(self, "text", text)
+        object.__setattr__(self, "branch", branch)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Node is immutable")
+
+    def __repr__(self):
+        return f"Node({self.id!r}, {self.type!r}, {self.text!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, Node) and self.to_dict() == other.to_dict()
+
+    def __hash__(self):
+        return hash((self.id, self.type, self.text, self.branch))
+
+    def to_dict(self):
+        return {"id": self.id, "type": self.type, "text": self.text, "branch": self.branch}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["id"], d.get("type", "process"), d.get("text", ""), d.get("branch"))
+
+
+class Edge:
+    """Directed connection between two node ids, optionally labelled (Yes/No/Else)."""
+
+    __slots__ = ("source", "target", "label")
+
+    def __init__(self, source, target, label=None):
+        object.__setattr__(self, "source", str(source))
+        object.__setattr__(self, "target", str(target))
+        object.__setattr__(self, "label", label)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Edge is immutable")
+
+    def __repr__(self):
+        return f"Edge({self.source!r} -> {self.target!r}, {self.label!r})"
+
+    def __eq__(self, other):
+        return (isinstance(other, Edge) and self.source == other.source
+                and self.target == other.target and self.label == other.label)
+
+    def __hash__(self):
+        return hash((self.source, self.target, self.label))
+
+    def to_dict(self):
+        return {"from": self.source, "to": self.target, "label": self.label}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["from"], d["to"], d.get("label"))
+
+
+class Flowchart:
+    """
+    Nodes + edges with indexes kept up to date on insert:
+    - id -> node
+    - id -> outgoing / incoming edges
+    Lookups are O(1). `snapshot()` gives a read-only copy that shares the
+    (immutable) Node/Edge objects instead of deep-copying them.
+    """
+
+    __slots__ = ("_nodes", "_order", "_edges", "_out", "_in", "_frozen")
+
+    def __init__(self):
+        self._nodes = {}
+        self._order = []
+        self._edges = []
+        self._out = {}
+        self._in = {}
+        self._frozen = False
+
+    def _check_mutable(self):
+        if self._frozen:
+            raise TypeError("Flowchart snapshot is read-only")
+
+    def add_node(self, node):
+        self._check_mutable()
+        if node.id in self._nodes:
+            raise ValueError(f"duplicate node id {node.id!r}")
+        self._nodes[node.id] = node
+        self._order.append(node)
+        self._out[node.id] = []
+        self._in[node.id] = []
+        return node
+
+    def add_edge(self, edge):
+        """
+        Edges may point at ids that are not (yet) nodes; the adjacency lists
+        are created on demand so nothing is lost on a round trip.
+        """
+        self._check_mutable()
+        self._edges.append(edge)
+        self._out.setdefault(edge.source, []).append(edge)
+        self._in.setdefault(edge.target, []).append(edge)
+        return edge
+
+    @property
+    def nodes(self):
+        return self._order
+
+    @property
+    def edges(self):
+        return self._edges
+
+    def node(self, node_id):
+        return self._nodes.get(node_id)
+
+    def __contains__(self, node_id):
+        return node_id in self._nodes
+
+    def __len__(self):
+        return len(self._order)
+
+    def out_edges(self, node_id):
+        return self._out.get(node_id, ())
+
+    def in_edges(self, node_id):
+        return self._in.get(node_id, ())
+
+    def successors(self, node_id):
+        return [e.target for e in self.out_edges(node_id)]
+
+    def predecessors(self, node_id):
+        return [e.source for e in self.in_edges(node_id)]
+
+    def start_node(self):
+        return next((n for n in self._order if n.type == "start"),
+                    self._order[0] if self._order else None)
+
+    def snapshot(self):
+        """Read-only copy; O(n) pointer copies, no node/edge duplication."""
+        if self._frozen:
+            return self
+        snap = Flowchart()
+        snap._nodes = dict(self._nodes)
+        snap._order = list(self._order)
+        snap._edges = list(self._edges)
+        snap._out = {k: list(v) for k, v in self._out.items()}
+        snap._in = {k: list(v) for k, v in self._in.items()}
+        snap._frozen = True
+        return snap
+
+    def to_dict(self):
+        return {
+            "nodes": [n.to_dict() for n in self._order],
+            "edges": [e.to_dict() for e in self._edges],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        fc = cls()
+        for d in data.get("nodes", []):
+            # a repeated id raises: edges can't tell which of the two nodes they meant
+            fc.add_node(Node.from_dict(d))
+        for d in data.get("edges", []):
+            fc.add_edge(Edge.from_dict(d))
+        return fc
+
+    @classmethod
+    def coerce(cls, obj):
+        """Accept a Flowchart or the JSON-shaped {"nodes", "edges"} dict."""
+        if isinstance(obj, cls):
+            return obj
+        return cls.from_dict(obj)
+
+
+def canonical_json(flowchart):
+    """Sorted keys, no whitespace: equal charts always serialize to the same bytes."""
+    fc = Flowchart.coerce(flowchart)
+    return json.dumps(fc.to_dict(), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def content_hash(flowchart):
+    return hashlib.sha256(canonical_json(flowchart).encode("utf-8")).hexdigest()
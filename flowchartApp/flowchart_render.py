@@ -0,0 +1,324 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import metrics
+from flowchart_layout import layered_layout
+from flowchart_model import Flowchart, content_hash
+from edge_routing import route_edges
+from svg_writer import edge_class, iter_svg, write_svg
+from text_metrics import measure_node
+
+VIEWER_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "flowchart_viewer.js")
+# charts above this many steps go to the canvas viewer in "auto" mode
+VIEWER_THRESHOLD = int(os.getenv("FLOWCHART_VIEWER_THRESHOLD", 300))
+
+# finished chart HTML kept per (content hash, renderer, height), shared by all sessions
+RENDER_CACHE_ENTRIES = int(os.getenv("FLOWCHART_RENDER_CACHE_ENTRIES", 64))
+
+RENDER_CACHE = metrics.counter("flowchart_render_cache_total", "Chart HTML lookups", ("result",))
+
+_NODE_TYPE_CODES = {"process": 0, "start": 1, "end": 1, "decision": 2, "cluster": 3}
+_EDGE_CLASS_CODES = {"": 0, "y": 1, "n": 2}
+
+
+def _as_flowchart(nodes, edges=None):
+    if edges is None:
+        return Flowchart.coerce(nodes)
+    return Flowchart.from_dict({"nodes": nodes, "edges": edges})
+
+
+def calculate_layout(nodes, edges=None):
+    """
+    Positions for every node: {id: {"x", "y", "width", "height"}}, x/y are centers.
+    Accepts a Flowchart, a {"nodes", "edges"} dict, or the two lists.
+    """
+    return layered_layout(_as_flowchart(nodes, edges))
+
+def render_svg(flowchart, background=None, sink=None, session=None):
+    """
+    Standalone SVG document for a flowchart.
+    `background` paints a full-size rect, useful when the SVG is viewed
+    outside the dark app container (batch export, PNG rasterizing).
+    With `sink` (anything with .write) the SVG is streamed into it and
+    nothing is returned.
+    With an IncrementalSession as `session`, layout blocks and SVG elements
+    unchanged since its previous render are reused.
+    """
+    fc = Flowchart.coerce(flowchart)
+    with metrics.span("layout"):
+        positions = session.layout(fc) if session is not None else calculate_layout(fc)
+
+    with metrics.span("route"):
+        routes = route_edges(fc, positions)
+
+    fragments = session.fragments if session is not None else None
+    with metrics.span("render"):
+        if sink is not None:
+            write_svg(fc, positions, sink, background, fragments=fragments, routes=routes)
+            return None
+        return "".join(iter_svg(fc, positions, background, fragments, routes))
+
+
+def render_svg_to_file(flowchart, path, background=None):
+    with open(path, "w", encoding="utf-8") as f:
+        render_svg(flowchart, background, sink=f)
+
+
+def render_flowchart(flowchart, session=None, chart_hash=None):
+    svg = render_svg(flowchart, session=session)
+    svg = f"""
+    <div style="width: 100%; overflow-x: auto; overflow-y: hidden; text-align: center; background: #0e1117; border-radius: 10px; padding: 20px;">
+    {svg}</div>"""
+
+    # same chart -> same ids -> byte-identical HTML, which the browser doesn't reload
+    unique_id = f"flowchart_{(chart_hash or content_hash(flowchart))[:16]}"
+    
+    html_content = f"""
+    <div id="container_{unique_id}" style="
+        position: relative; 
+        width: 100%; 
+        border-radius: 10px; 
+        overflow: hidden; 
+        background: #0e1117; 
+        border: 1px solid #2b313e;">
+        
+        <!-- Toolbar -->
+        <div style="
+            position: absolute; 
+            top: 10px; 
+            right: 10px; 
+            display: flex; 
+            gap: 10px; 
+            z-index: 100;">
+            
+            <button onclick="downloadSVG_{unique_id}()" title="Download SVG" style="
+                background: #1f2937; color: white; border: 1px solid #374151; 
+                padding: 5px 10px; border-radius: 5px; cursor: pointer; font-size: 12px;">
+                SVG ⬇️
+            </button>
+            <button onclick="downloadPNG_{unique_id}()" title="Download PNG" style="
+                background: #1f2937; color: white; border: 1px solid #374151; 
+                padding: 5px 10px; border-radius: 5px; cursor: pointer; font-size: 12px;">
+                PNG ⬇️
+            </button>
+            <button onclick="openNewTab_{unique_id}()" title="Open in New Tab (Fullscreen)" style="
+                background: #1f2937; color: white; border: 1px solid #374151; 
+                padding: 5px 10px; border-radius: 5px; cursor: pointer; font-size: 12px;">
+                Open ↗️
+            </button>
+        </div>
+
+        <!-- Scrollable SVG Content -->
+        <div id="scroll_area_{unique_id}" style="
+            overflow: auto; 
+            max-height: 500px; 
+            padding: 20px; 
+            text-align: center;
+            border-top: 1px solid #2b313e;"> 
+            {svg}
+        </div>
+        
+    </div>
+
+    <!-- Hidden Canvas for PNG conversion -->
+    <canvas id="canvas_{unique_id}" style="display:none;"></canvas>
+
+    <script>
+        function downloadSVG_{unique_id}() {{
+            try {{
+                const svgElement = document.querySelector("#container_{unique_id} svg");
+                if (!svgElement) {{ alert("SVG not found"); return; }}
+                
+                const svgData = svgElement.outerHTML;
+                const blob = new Blob([svgData], {{type: "image/svg+xml;charset=utf-8"}});
+                const url = URL.createObjectURL(blob);
+                const link = document.createElement("a");
+                link.href = url;
+                link.download = "flowchart.svg";
+                document.body.appendChild(link);
+                link.click();
+                document.body.removeChild(link);
+            }} catch (e) {{
+                alert("Error downloading SVG: " + e.message);
+            }}
+        }}
+
+        function downloadPNG_{unique_id}() {{
+            try {{
+                const svgElement = document.querySelector("#container_{unique_id} svg");
+                if (!svgElement) {{ alert("SVG not found"); return; }}
+
+                const canvas = document.getElementById("canvas_{unique_id}");
+                const ctx = canvas.getContext("2d");
+                
+                // Get data
+                const svgData = new XMLSerializer().serializeToString(svgElement);
+                const img = new Image();
+                
+                // Add explicit size to ensure high res
+                const width = parseInt(svgElement.getAttribute("width")) || 1000;
+                const height = parseInt(svgElement.getAttribute("height")) || 800;
+                canvas.width = width;
+                canvas.height = height;
+
+                img.onload = function() {{
+                    ctx.fillStyle = "#0e1117"; // Dark background
+                    ctx.fillRect(0, 0, width, height);
+                    ctx.drawImage(img, 0, 0);
+                    const pngFile = canvas.toDataURL("image/png");
+                    
+                    const link = document.createElement("a");
+                    link.download = "flowchart.png";
+                    link.href = pngFile;
+                    link.click();
+                }};
+                
+                img.onerror = function() {{
+                   alert("Error converting SVG to Image.");
+                }};
+                
+                img.src = "data:image/svg+xml;base64," + btoa(unescape(encodeURIComponent(svgData)));
+            }} catch (e) {{
+                alert("Error downloading PNG: " + e.message);
+            }}
+        }}
+
+        function openNewTab_{unique_id}() {{
+            try {{
+                const svgElement = document.querySelector("#container_{unique_id} svg");
+                if (!svgElement) {{ alert("SVG not found"); return; }}
+                
+                const svgData = new XMLSerializer().serializeToString(svgElement);
+                const blob = new Blob([svgData], {{type: "image/svg+xml;charset=utf-8"}});
+                const url = URL.createObjectURL(blob);
+                window.open(url, '_blank');
+            }} catch (e) {{
+                alert("Error opening new tab: " + e.message);
+            }}
+        }}
+    </script>
+    """
+    
+    return html_content
+
+
+@lru_cache(maxsize=1)
+def _viewer_script():
+    with open(VIEWER_JS, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def viewer_payload(flowchart, positions, routes=None):
+    """
+    Compact JSON for flowchart_viewer.js: flat number arrays plus pre-wrapped text.
+    `routes` (from route_edges) gives the edges their routed bends and label
+    spots; edges without one are drawn straight.
+    """
+    fc = Flowchart.coerce(flowchart)
+    routes = routes or {}
+    index = {}
+    nodes, texts = [], []
+    min_x = min_y = float("inf")
+    max_x = max_y = float("-inf")
+    for node in fc.nodes:
+        pos = positions[node.id]
+        x, y, w, h = round(pos["x"]), round(pos["y"]), round(pos["width"]), round(pos["height"])
+        index[node.id] = len(texts)
+        nodes += [x, y, w, h, _NODE_TYPE_CODES.get(node.type, 0)]
+        texts.append("\n".join(measure_node(node.text, node.type).lines))
+        min_x, min_y = min(min_x, x - w / 2), min(min_y, y - h / 2)
+        max_x, max_y = max(max_x, x + w / 2), max(max_y, y + h / 2)
+
+    labels = {}
+    edges = []
+    offsets, points, label_spots = [0], [], []
+    for edge_index, edge in enumerate(fc.edges):
+        if edge.source not in index or edge.target not in index:
+            continue
+        label = labels.setdefault(str(edge.label), len(labels)) if edge.label else -1
+        edges += [index[edge.source], index[edge.target], _EDGE_CLASS_CODES[edge_class(edge.label)], label]
+        route = routes.get(edge_index)
+        if route is not None:
+            for x, y in route.points:
+                points += [round(x), round(y)]
+                # back edges run around the chart, outside the node boxes
+                min_x, min_y = min(min_x, x), min(min_y, y)
+                max_x, max_y = max(max_x, x), max(max_y, y)
+        offsets.append(len(points) // 2)
+        spot = route.label if route is not None and route.label else None
+        label_spots += [round(spot[0]), round(spot[1]), round(spot[2])] if spot else [0, 0, 0]
+
+    data = {"b": [min_x, min_y, max_x, max_y] if texts else [0, 0, 1, 1],
+            "n": nodes, "t": texts, "e": edges, "l": list(labels),
+            "r": offsets, "p": points, "q": label_spots}
+    # safe inside <script>: no "</" can close the tag early
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).replace("</", "<\\/")
+
+
+def render_flowchart_viewer(flowchart, height=750, session=None):
+    """
+    HTML for components.html: the chart as JSON plus the canvas viewer.
+    The payload grows with the chart, but the page stays one <canvas>
+    whatever the size, unlike render_flowchart's inline SVG.
+    """
+    fc = Flowchart.coerce(flowchart)
+    with metrics.span("layout"):
+        positions = session.layout(fc) if session is not None else calculate_layout(fc)
+    with metrics.span("route"):
+        routes = route_edges(fc, positions)
+    with metrics.span("render"):
+        payload = viewer_payload(fc, positions, routes)
+
+    button = ("background: #1f2937; color: white; border: 1px solid #374151; "
+              "padding: 5px 10px; border-radius: 5px; cursor: pointer; font-size: 12px;")
+    return f"""
+    <div id="viewer" style="position: relative; width: 100%; height: {height - 20}px; border-radius: 10px;
+        overflow: hidden; background: #0e1117; border: 1px solid #2b313e;">
+        <div style="position: absolute; top: 10px; right: 10px; display: flex; gap: 10px; z-index: 100;">
+            <button data-role="zoom-out" title="Zoom out" style="{button}">−</button>
+            <button data-role="zoom-in" title="Zoom in" style="{button}">+</button>
+            <button data-role="fit" title="Fit to view (or double-click)" style="{button}">Fit</button>
+            <button data-role="png" title="Download PNG (large charts are split into tiles)" style="{button}">PNG ⬇️</button>
+        </div>
+        <div data-role="status" style="position: absolute; left: 10px; bottom: 8px; color: #8b949e;
+            font: 12px 'Segoe UI', sans-serif; z-index: 100;"></div>
+        <canvas style="width: 100%; height: 100%; display: block; cursor: grab; touch-action: none;"></canvas>
+    </div>
+    <script>{_viewer_script()}</script>
+    <script>FlowchartViewer(document.getElementById("viewer"), {payload});</script>
+    """
+
+
+_rendered = OrderedDict()
+_rendered_lock = threading.Lock()
+
+
+def render_chart_html(flowchart, viewer=False, height=750, session=None, chart_hash=None):
+    """
+    render_flowchart / render_flowchart_viewer, memoized by the chart's
+    content hash plus render settings. A rerun showing the same chart gets
+    the identical string back without layout or SVG work.
+    """
+    chart_hash = chart_hash or content_hash(flowchart)
+    key = (chart_hash, "viewer" if viewer else "svg", height)
+    with _rendered_lock:
+        html = _rendered.get(key)
+        if html is not None:
+            _rendered.move_to_end(key)
+    if html is not None:
+        RENDER_CACHE.inc(result="hit")
+        return html
+
+    RENDER_CACHE.inc(result="miss")
+    if viewer:
+        html = render_flowchart_viewer(flowchart, height, session)
+    else:
+        html = render_flowchart(flowchart, session, chart_hash)
+    with _rendered_lock:
+        _rendered[key] = html
+        while len(_rendered) > RENDER_CACHE_ENTRIES:
+            _rendered.popitem(last=False)
+    return html
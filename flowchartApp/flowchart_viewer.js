@@ -0,0 +1,390 @@
+// Canvas viewer for large flowcharts (see render_flowchart_viewer in flowchart_render.py).
+//
+// The chart arrives as compact JSON with positions already laid out, and is
+// drawn on one <canvas>. The DOM stays the same size however big the chart
+// gets. Each frame draws only what intersects the viewport (uniform grid
+// lookup), and text, arrows and labels are skipped once they'd be too small
+// to read. PNG export renders the chart in tiles of at most MAX_TILE px a side.
+//
+// data = {
+//   b: [minX, minY, maxX, maxY],          chart bounds
+//   n: [cx, cy, w, h, type, ...],         5 numbers per node, type 0 process / 1 start,end / 2 decision / 3 cluster
+//   t: ["line 1\nline 2", ...],           pre-wrapped node text, one per node
+//   e: [src, dst, cls, label, ...],       4 numbers per edge, cls 0 plain / 1 yes / 2 no, label -1 = none
+//   l: ["Yes", "No", ...]                 edge label table
+//   r: [0, k1, k2, ...],                  per edge, offset of its first point in p (edges + 1 numbers)
+//   p: [x, y, ...],                       routed edge points, flat; an edge without points is drawn straight
+//   q: [x, y, w, ...]                     3 numbers per edge, label center and width (w 0: none placed)
+// }
+
+(function () {
+  "use strict";
+
+  var NODE_STROKE = ["#4fd1c5", "#f6e05e", "#ff79c6", "#8b949e"];
+  var EDGE_COLOR = ["#a0a0a0", "#4caf50", "#ff5252"];
+  var NODE_FILL = "#252a36";
+  var BACKGROUND = "#0e1117";
+  var FONT = "'Segoe UI', sans-serif";
+  var FONT_SIZE = 14;
+  var LINE_HEIGHT = 18;
+  var TEXT_MIN_PX = 6;          // hide node text below this on-screen font size
+  var DETAIL_MIN_SCALE = 0.3;   // below this: plain boxes, no arrows or edge labels
+  var CELL = 400;               // grid cell, chart units
+  var LONG_EDGE_CELLS = 64;     // edges spanning more cells than this are always tested
+  var MIN_SCALE = 0.01;
+  var MAX_SCALE = 4;
+  var MAX_TILE = 4096;
+  var MAX_TILES = 16;           // bigger exports are scaled down to fit in this many tiles
+
+  function buildGrid(data) {
+    var cells = new Map();
+    var occupied = [];          // [row, col, list] per non-empty cell, for zoomed-out views
+    var longEdges = [];
+    var minX = data.b[0], minY = data.b[1];
+
+    function add(r, c, value) {
+      var key = r + "," + c, list = cells.get(key);
+      if (!list) { list = []; cells.set(key, list); occupied.push([r, c, list]); }
+      list.push(value);
+    }
+
+    function forRect(x0, y0, x1, y1, fn) {
+      var c0 = Math.floor((x0 - minX) / CELL), c1 = Math.floor((x1 - minX) / CELL);
+      var r0 = Math.floor((y0 - minY) / CELL), r1 = Math.floor((y1 - minY) / CELL);
+      for (var r = r0; r <= r1; r++) {
+        for (var c = c0; c <= c1; c++) fn(r, c);
+      }
+      return (c1 - c0 + 1) * (r1 - r0 + 1);
+    }
+
+    var n = data.n;
+    for (var i = 0; i < n.length; i += 5) {
+      var node = i / 5;
+      forRect(n[i] - n[i + 2] / 2, n[i + 1] - n[i + 3] / 2, n[i] + n[i + 2] / 2, n[i + 1] + n[i + 3] / 2,
+        function (r, c) { add(r, c, node); });
+    }
+
+    var e = data.e;
+    var boxes = [];
+    for (var j = 0; j < e.length; j += 4) {
+      var box = edgeBox(data, j / 4);
+      boxes.push(box);
+      var span = (Math.floor((box[2] - minX) / CELL) - Math.floor((box[0] - minX) / CELL) + 1) *
+                 (Math.floor((box[3] - minY) / CELL) - Math.floor((box[1] - minY) / CELL) + 1);
+      var edge = -(j / 4) - 1;   // edges stored as negative ids next to nodes
+      if (span > LONG_EDGE_CELLS) longEdges.push(j / 4);
+      else forRect(box[0], box[1], box[2], box[3], function (r, c) { add(r, c, edge); });
+    }
+
+    return { cells: cells, occupied: occupied, longEdges: longEdges, boxes: boxes, minX: minX, minY: minY };
+  }
+
+  // [x0, y0, x1, y1, ...]: the routed points, or source bottom to target top
+  function edgePoints(data, edge) {
+    var r = data.r;
+    if (r && r[edge + 1] - r[edge] >= 2) return data.p.slice(r[edge] * 2, r[edge + 1] * 2);
+    var n = data.n, e = data.e;
+    var s = e[edge * 4] * 5, t = e[edge * 4 + 1] * 5;
+    return [n[s], n[s + 1] + n[s + 3] / 2, n[t], n[t + 1] - n[t + 3] / 2];
+  }
+
+  function edgeBox(data, edge) {
+    var p = edgePoints(data, edge);
+    var box = [Infinity, Infinity, -Infinity, -Infinity];
+    for (var i = 0; i < p.length; i += 2) {
+      box[0] = Math.min(box[0], p[i]); box[1] = Math.min(box[1], p[i + 1]);
+      box[2] = Math.max(box[2], p[i]); box[3] = Math.max(box[3], p[i + 1]);
+    }
+    return [box[0] - 20, box[1] - 12, box[2] + 20, box[3] + 12];
+  }
+
+  // nodes and edges intersecting the chart-space rectangle
+  function query(data, grid, x0, y0, x1, y1, stamp) {
+    var nodes = [], edges = [];
+    var c0 = Math.floor((x0 - grid.minX) / CELL), c1 = Math.floor((x1 - grid.minX) / CELL);
+    var r0 = Math.floor((y0 - grid.minY) / CELL), r1 = Math.floor((y1 - grid.minY) / CELL);
+    stamp.frame++;
+
+    function collect(list) {
+      for (var k = 0; k < list.length; k++) {
+        var id = list[k];
+        if (id >= 0) {
+          if (stamp.nodes[id] !== stamp.frame) { stamp.nodes[id] = stamp.frame; nodes.push(id); }
+        } else {
+          var edge = -id - 1;
+          if (stamp.edges[edge] !== stamp.frame) { stamp.edges[edge] = stamp.frame; edges.push(edge); }
+        }
+      }
+    }
+
+    if ((r1 - r0 + 1) * (c1 - c0 + 1) > grid.occupied.length) {
+      // zoomed far out: walking the non-empty cells beats probing mostly empty ones
+      for (var i = 0; i < grid.occupied.length; i++) {
+        var cell = grid.occupied[i];
+        if (cell[0] >= r0 && cell[0] <= r1 && cell[1] >= c0 && cell[1] <= c1) collect(cell[2]);
+      }
+    } else {
+      for (var r = r0; r <= r1; r++) {
+        for (var c = c0; c <= c1; c++) {
+          var list = grid.cells.get(r + "," + c);
+          if (list) collect(list);
+        }
+      }
+    }
+    for (var j = 0; j < grid.longEdges.length; j++) {
+      var le = grid.longEdges[j], box = grid.boxes[le];
+      if (box[2] >= x0 && box[0] <= x1 && box[3] >= y0 && box[1] <= y1) edges.push(le);
+    }
+    return { nodes: nodes, edges: edges };
+  }
+
+  function roundRect(ctx, x, y, w, h, r) {
+    r = Math.min(r, h / 2, w / 2);
+    ctx.beginPath();
+    ctx.moveTo(x + r, y);
+    ctx.arcTo(x + w, y, x + w, y + h, r);
+    ctx.arcTo(x + w, y + h, x, y + h, r);
+    ctx.arcTo(x, y + h, x, y, r);
+    ctx.arcTo(x, y, x + w, y, r);
+    ctx.closePath();
+  }
+
+  // draw the visible part of the chart; view = {scale, tx, ty, width, height} in canvas px
+  function draw(ctx, data, grid, stamp, view) {
+    var scale = view.scale;
+    var x0 = -view.tx / scale, y0 = -view.ty / scale;
+    var x1 = x0 + view.width / scale, y1 = y0 + view.height / scale;
+    var visible = query(data, grid, x0, y0, x1, y1, stamp);
+    var detail = scale >= DETAIL_MIN_SCALE;
+    var showText = FONT_SIZE * scale >= TEXT_MIN_PX;
+    var n = data.n, e = data.e;
+
+    ctx.setTransform(1, 0, 0, 1, 0, 0);
+    ctx.fillStyle = BACKGROUND;
+    ctx.fillRect(0, 0, view.width, view.height);
+    ctx.setTransform(scale, 0, 0, scale, view.tx, view.ty);
+
+    ctx.lineWidth = Math.max(2, 1 / scale);
+    for (var i = 0; i < visible.edges.length; i++) {
+      var edge = visible.edges[i], p = edgePoints(data, edge), cls = e[edge * 4 + 2];
+      var last = p.length - 2;
+      ctx.strokeStyle = ctx.fillStyle = EDGE_COLOR[cls];
+      ctx.beginPath();
+      ctx.moveTo(p[0], p[1]);
+      for (var pt = 2; pt < p.length; pt += 2) ctx.lineTo(p[pt], p[pt + 1]);
+      ctx.stroke();
+      if (detail) {
+        var angle = Math.atan2(p[last + 1] - p[last - 1], p[last] - p[last - 2]);
+        ctx.beginPath();
+        ctx.moveTo(p[last], p[last + 1]);
+        ctx.lineTo(p[last] - 10 * Math.cos(angle - 0.35), p[last + 1] - 10 * Math.sin(angle - 0.35));
+        ctx.lineTo(p[last] - 10 * Math.cos(angle + 0.35), p[last + 1] - 10 * Math.sin(angle + 0.35));
+        ctx.closePath();
+        ctx.fill();
+        var label = e[edge * 4 + 3];
+        if (label >= 0 && showText) {
+          // where the router placed it, else the middle of the middle segment
+          var q = edge * 3, mid = Math.floor((p.length / 2 - 1) / 2) * 2;
+          var placed = data.q && data.q[q + 2] > 0;
+          var mx = placed ? data.q[q] : (p[mid] + p[mid + 2]) / 2;
+          var my = placed ? data.q[q + 1] : (p[mid + 1] + p[mid + 3]) / 2;
+          var lw = placed ? data.q[q + 2] : 30;
+          ctx.fillStyle = BACKGROUND;
+          ctx.fillRect(mx - lw / 2, my - 10, lw, 20);
+          ctx.fillStyle = EDGE_COLOR[cls];
+          ctx.font = "bold 11px " + FONT;
+          ctx.textAlign = "center";
+          ctx.fillText(data.l[label], mx, my + 4);
+        }
+      }
+    }
+
+    ctx.lineWidth = Math.max(2, 1 / scale);
+    for (var j = 0; j < visible.nodes.length; j++) {
+      var k = visible.nodes[j] * 5;
+      var cx = n[k], cy = n[k + 1], w = n[k + 2], h = n[k + 3], type = n[k + 4];
+      ctx.fillStyle = NODE_FILL;
+      ctx.strokeStyle = NODE_STROKE[type];
+      if (!detail) {
+        ctx.fillRect(cx - w / 2, cy - h / 2, w, h);
+        ctx.strokeRect(cx - w / 2, cy - h / 2, w, h);
+        continue;
+      }
+      if (type === 2) {
+        ctx.beginPath();
+        ctx.moveTo(cx, cy - h / 2);
+        ctx.lineTo(cx + w / 2, cy);
+        ctx.lineTo(cx, cy + h / 2);
+        ctx.lineTo(cx - w / 2, cy);
+        ctx.closePath();
+      } else {
+        roundRect(ctx, cx - w / 2, cy - h / 2, w, h, type === 1 ? 25 : 6);
+      }
+      ctx.fill();
+      // collapsed clusters get a dashed outline, like the SVG
+      ctx.setLineDash(type === 3 ? [6, 4] : []);
+      ctx.stroke();
+      ctx.setLineDash([]);
+
+      if (showText) {
+        var lines = data.t[k / 5].split("\n");
+        var top = cy - ((lines.length - 1) * LINE_HEIGHT) / 2 + 5;
+        ctx.fillStyle = "white";
+        ctx.font = "500 " + FONT_SIZE + "px " + FONT;
+        ctx.textAlign = "center";
+        for (var line = 0; line < lines.length; line++) {
+          ctx.fillText(lines[line], cx, top + line * LINE_HEIGHT);
+        }
+      }
+    }
+    return visible;
+  }
+
+  function download(name, blob) {
+    var url = URL.createObjectURL(blob);
+    var link = document.createElement("a");
+    link.href = url;
+    link.download = name;
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
+    setTimeout(function () { URL.revokeObjectURL(url); }, 1000);
+  }
+
+  function FlowchartViewer(root, data) {
+    var canvas = root.querySelector("canvas");
+    var status = root.querySelector("[data-role=status]");
+    var ctx = canvas.getContext("2d");
+    var grid = buildGrid(data);
+    var nodeCount = data.n.length / 5;
+    var stamp = { frame: 0, nodes: new Uint32Array(nodeCount), edges: new Uint32Array(data.e.length / 4) };
+    var view = { scale: 1, tx: 0, ty: 0, width: 0, height: 0 };
+    var pending = false;
+    var chartW = data.b[2] - data.b[0], chartH = data.b[3] - data.b[1];
+
+    function resize() {
+      var ratio = window.devicePixelRatio || 1;
+      var rect = canvas.getBoundingClientRect();
+      canvas.width = Math.max(1, Math.round(rect.width * ratio));
+      canvas.height = Math.max(1, Math.round(rect.height * ratio));
+      view.width = canvas.width;
+      view.height = canvas.height;
+      redraw();
+    }
+
+    function redraw() {
+      if (pending) return;
+      pending = true;
+      requestAnimationFrame(function () {
+        pending = false;
+        var visible = draw(ctx, data, grid, stamp, view);
+        status.textContent = nodeCount + " steps · " + visible.nodes.length + " drawn · " +
+          Math.round(view.scale / (window.devicePixelRatio || 1) * 100) + "%";
+      });
+    }
+
+    function fitScale() {
+      return Math.min(view.width / chartW, view.height / chartH) * 0.95;
+    }
+
+    function setScale(scale, px, py) {
+      // huge charts may zoom out past MIN_SCALE, but never further than fit
+      scale = Math.min(MAX_SCALE, Math.max(Math.min(MIN_SCALE, fitScale()), scale));
+      // keep the chart point under (px, py) in place
+      view.tx = px - (px - view.tx) * scale / view.scale;
+      view.ty = py - (py - view.ty) * scale / view.scale;
+      view.scale = scale;
+      redraw();
+    }
+
+    function fit() {
+      view.scale = Math.min(MAX_SCALE, fitScale());
+      view.tx = (view.width - chartW * view.scale) / 2 - data.b[0] * view.scale;
+      view.ty = (view.height - chartH * view.scale) / 2 - data.b[1] * view.scale;
+      redraw();
+    }
+
+    function initialView() {
+      // readable size, top of the chart in view: tall charts start at Start, not as a speck
+      var ratio = window.devicePixelRatio || 1;
+      view.scale = Math.min(ratio, view.width / chartW * 0.95);
+      view.tx = (view.width - chartW * view.scale) / 2 - data.b[0] * view.scale;
+      view.ty = 10 * ratio - data.b[1] * view.scale;
+      redraw();
+    }
+
+    canvas.addEventListener("wheel", function (event) {
+      event.preventDefault();
+      var ratio = window.devicePixelRatio || 1;
+      setScale(view.scale * Math.exp(-event.deltaY * 0.0015), event.offsetX * ratio, event.offsetY * ratio);
+    }, { passive: false });
+
+    var drag = null;
+    canvas.addEventListener("pointerdown", function (event) {
+      drag = { x: event.clientX, y: event.clientY, tx: view.tx, ty: view.ty };
+      canvas.setPointerCapture(event.pointerId);
+    });
+    canvas.addEventListener("pointermove", function (event) {
+      if (!drag) return;
+      var ratio = window.devicePixelRatio || 1;
+      view.tx = drag.tx + (event.clientX - drag.x) * ratio;
+      view.ty = drag.ty + (event.clientY - drag.y) * ratio;
+      redraw();
+    });
+    canvas.addEventListener("pointerup", function () { drag = null; });
+    canvas.addEventListener("dblclick", fit);
+
+    function exportPNG(scale) {
+      var width, height, cols, rows;
+      // shrink until the export fits in MAX_TILES tiles
+      for (;; scale *= 0.9) {
+        width = Math.ceil(chartW * scale) + 40;
+        height = Math.ceil(chartH * scale) + 40;
+        cols = Math.ceil(width / MAX_TILE);
+        rows = Math.ceil(height / MAX_TILE);
+        if (cols * rows <= MAX_TILES) break;
+      }
+      var tile = document.createElement("canvas");
+      var tileCtx = tile.getContext("2d");
+      var jobs = [];
+      for (var r = 0; r < rows; r++) {
+        for (var c = 0; c < cols; c++) jobs.push([r, c]);
+      }
+      // one tile at a time: only one tile-sized canvas is alive, and browsers accept the downloads
+      (function next() {
+        var job = jobs.shift();
+        if (!job) return;
+        var r = job[0], c = job[1];
+        tile.width = Math.min(MAX_TILE, width - c * MAX_TILE);
+        tile.height = Math.min(MAX_TILE, height - r * MAX_TILE);
+        draw(tileCtx, data, grid, stamp, {
+          scale: scale,
+          tx: 20 - data.b[0] * scale - c * MAX_TILE,
+          ty: 20 - data.b[1] * scale - r * MAX_TILE,
+          width: tile.width,
+          height: tile.height
+        });
+        var name = rows * cols === 1 ? "flowchart.png" : "flowchart_r" + (r + 1) + "_c" + (c + 1) + ".png";
+        tile.toBlob(function (blob) {
+          download(name, blob);
+          setTimeout(next, 250);
+        }, "image/png");
+      })();
+    }
+
+    root.querySelector("[data-role=fit]").addEventListener("click", fit);
+    root.querySelector("[data-role=zoom-in]").addEventListener("click", function () {
+      setScale(view.scale * 1.25, view.width / 2, view.height / 2);
+    });
+    root.querySelector("[data-role=zoom-out]").addEventListener("click", function () {
+      setScale(view.scale / 1.25, view.width / 2, view.height / 2);
+    });
+    root.querySelector("[data-role=png]").addEventListener("click", function () { exportPNG(1); });
+
+    window.addEventListener("resize", resize);
+    resize();
+    initialView();
+  }
+
+  window.FlowchartViewer = FlowchartViewer;
+})();
@@ -0,0 +1,92 @@
+"""
+Incremental re-layout and re-render for a session editing one prompt.
+
+Users refine a prompt a word at a time, and most of the chart comes back
+unchanged. An IncrementalSession lives in Streamlit session state and keeps:
+- the layout memo: only blocks whose contents changed are measured again
+  (see flowchart_layout)
+- an SVG FragmentCache: only nodes and edges that changed or moved are
+  formatted again
+- the last finished chart, so each new one can be diffed against it
+
+The layout is deterministic, so unchanged subtrees keep their relative
+positions. Only blocks downstream of an edit move.
+
+Renderers take the session itself (flowchart_render.render_svg and the
+functions built on it), which is the one path to its FragmentCache.
+"""
+
+from difflib import SequenceMatcher
+
+from flowchart_layout import layered_layout
+from flowchart_model import Flowchart
+from svg_writer import FragmentCache
+
+
+def _signature(node):
+    return node.type, node.text, node.branch
+
+
+def diff_flowcharts(old, new, old_positions=None, new_positions=None):
+    """
+    Line up two charts step by step and say what changed. Steps are
+    matched by content rather than id, because inserting one step
+    renumbers every step after it.
+    Returns {"unchanged", "changed", "added", "removed", "moved"}; each is a
+    list of new-chart ids, except "removed", which holds old-chart ids.
+    """
+    old = Flowchart.coerce(old) if old is not None else Flowchart()
+    new = Flowchart.coerce(new)
+    old_nodes, new_nodes = old.nodes, new.nodes
+    matcher = SequenceMatcher(None, [_signature(n) for n in old_nodes],
+                              [_signature(n) for n in new_nodes], autojunk=False)
+
+    result = {"unchanged": [], "changed": [], "added": [], "removed": [], "moved": []}
+    pairs = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            pairs.extend(zip(old_nodes[i1:i2], new_nodes[j1:j2]))
+            result["unchanged"].extend(n.id for n in new_nodes[j1:j2])
+            continue
+        # a one-for-one replacement is an edited step; the rest are inserts/deletes
+        paired = min(i2 - i1, j2 - j1) if tag == "replace" else 0
+        result["changed"].extend(n.id for n in new_nodes[j1:j1 + paired])
+        pairs.extend(zip(old_nodes[i1:i1 + paired], new_nodes[j1:j1 + paired]))
+        result["added"].extend(n.id for n in new_nodes[j1 + paired:j2])
+        result["removed"].extend(n.id for n in old_nodes[i1 + paired:i2])
+
+    if old_positions and new_positions:
+        for old_node, new_node in pairs:
+            a, b = old_positions.get(old_node.id), new_positions.get(new_node.id)
+            if a and b and (a["x"], a["y"]) != (b["x"], b["y"]):
+                result["moved"].append(new_node.id)
+    return result
+
+
+class IncrementalSession:
+    def __init__(self):
+        self.layout_memo = {}
+        self.fragments = FragmentCache()
+        self.flowchart = None
+        self.positions = None
+        self.last_diff = None
+
+    def layout(self, flowchart):
+        return layered_layout(Flowchart.coerce(flowchart), memo=self.layout_memo)
+
+    def commit(self, flowchart, positions=None):
+        """Record a finished chart; returns its diff against the previous one."""
+        fc = Flowchart.coerce(flowchart)
+        if positions is None:
+            positions = self.layout(fc)
+        self.last_diff = diff_flowcharts(self.flowchart, fc, self.positions, positions)
+        self.flowchart, self.positions = fc, positions
+        return self.last_diff
+
+    def summary(self):
+        if self.last_diff is None:
+            return {}
+        summary = {k: len(v) for k, v in self.last_diff.items()}
+        summary["svg_reused"] = self.fragments.reused
+        summary["svg_rendered"] = self.fragments.rendered
+        return summary
@@ -0,0 +1,242 @@
+"""
+Process-wide queue for flowchart generations.
+
+Streamlit reruns the whole script on every widget interaction. A generation
+running inline under `if st.button(...)` blocks the script thread and is
+lost on the next rerun. Instead, the app submits a job and keeps only its
+id in session state:
+
+    job_id = jobs.submit(prompt)
+    job = jobs.get(job_id)      # status, latest partial chart, result / error
+    jobs.cancel(job_id)
+
+A fixed pool of FLOWCHART_JOB_WORKERS threads runs the jobs. That pool is
+the one place that bounds how many generations hit the backend at once,
+whatever the number of sessions. Finished jobs are kept for
+FLOWCHART_JOB_RETENTION seconds so a rerun, or a reconnecting browser,
+can still pick up the result.
+
+Cancelling a queued job drops it. A running job's generation is read on a
+helper thread, so cancelling it ends the job and frees its worker at once,
+even while the backend is silent. The helper closes the generation stream
+at its next step, or when the backend read times out. Closing the stream
+closes the HTTP response so Ollama stops generating (single-flight keeps it
+going if another caller is sharing the same generation).
+"""
+
+import contextvars
+import os
+import queue
+import threading
+import time
+import uuid
+
+import metrics
+from ai_services import generate_flowchart_stream
+
+JOB_WORKERS = int(os.getenv("FLOWCHART_JOB_WORKERS", 2))
+JOB_QUEUE_MAX = int(os.getenv("FLOWCHART_JOB_QUEUE_MAX", 50))
+JOB_RETENTION = float(os.getenv("FLOWCHART_JOB_RETENTION", 600))
+# how often a worker waiting on a silent backend checks for a cancel
+CANCEL_CHECK_INTERVAL = 0.1
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+JOBS = metrics.counter("flowchart_jobs_total", "Generation jobs by final status", ("status",))
+JOBS_QUEUED = metrics.gauge("flowchart_jobs_queued", "Jobs waiting for a worker")
+JOBS_RUNNING = metrics.gauge("flowchart_jobs_running", "Jobs being generated")
+JOB_WAIT_SECONDS = metrics.histogram("flowchart_job_wait_seconds", "Time jobs spent queued")
+
+
+class QueueFull(RuntimeError):
+    """Too many jobs are waiting already."""
+
+
+class Job:
+    def __init__(self, prompt, profile=None):
+        self.id = uuid.uuid4().hex
+        self.prompt = prompt
+        self.profile = profile
+        self.status = QUEUED
+        self.partial = None     # latest (possibly unfinished) flowchart
+        self.result = None
+        self.error = None
+        self.trace = None
+        self.updates = 0        # bumped on every new partial, for cheap change checks
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_requested = threading.Event()
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "steps": len(self.partial["nodes"]) if self.partial else 0,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+        }
+
+
+def _pump(stream, out, cancel):
+    """Read a generation stream into `out`; runs on its own thread, see _run."""
+    try:
+        for flowchart in stream:
+            if cancel.is_set():
+                return
+            out.put(("step", flowchart))
+        out.put(("end", None))
+    except Exception as e:
+        out.put(("error", e))
+    finally:
+        # closing the generator closes the Ollama response behind it
+        stream.close()
+
+
+class JobQueue:
+    def __init__(self, workers=JOB_WORKERS, max_queued=JOB_QUEUE_MAX, retention=JOB_RETENTION,
+                 generate=generate_flowchart_stream):
+        self.retention = retention
+        self.max_queued = max_queued
+        self._generate = generate
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"flowchart-job-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, prompt, profile=None):
+        """Queue a generation and return its job id."""
+        self._expire()
+        job = Job(prompt, profile)
+        with self._lock:
+            waiting = sum(1 for j in self._jobs.values() if j.status == QUEUED)
+            if waiting >= self.max_queued:
+                raise QueueFull(f"{waiting} generations are already waiting; try again shortly")
+            self._jobs[job.id] = job
+            self._update_gauges()
+        self._queue.put(job)
+        return job.id
+
+    def get(self, job_id):
+        """The Job, or None if the id is unknown or has expired."""
+        self._expire()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def position(self, job_id):
+        """How many queued jobs are ahead of this one (0 when running or finished)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return 0
+            return sum(1 for j in self._jobs.values() if j.status == QUEUED and j.created < job.created)
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return False
+            job.cancel_requested.set()
+            if job.status == QUEUED:
+                # the worker skips it when it comes up
+                self._finish(job, CANCELLED)
+                self._update_gauges()
+        return True
+
+    def _finish(self, job, status, error=None):
+        # caller holds self._lock
+        job.status = status
+        job.error = error
+        job.finished = time.time()
+        JOBS.inc(status=status)
+
+    def _expire(self):
+        cutoff = time.time() - self.retention
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished < cutoff]:
+                del self._jobs[job_id]
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                job = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job):
+        with self._lock:
+            if job.status != QUEUED:
+                return
+            job.status = RUNNING
+            job.started = time.time()
+            self._update_gauges()
+        JOB_WAIT_SECONDS.observe(job.started - job.created)
+
+        status, error = DONE, None
+        try:
+            with metrics.start_trace(job=job.id) as trace:
+                stream = self._generate(job.prompt, profile=job.profile)
+                # the stream can block for as long as the backend is silent; read it on
+                # a helper thread (sharing this trace) so a cancel is seen right away
+                updates = queue.Queue()
+                reader = threading.Thread(target=contextvars.copy_context().run,
+                                          args=(_pump, stream, updates, job.cancel_requested),
+                                          name=f"flowchart-job-{job.id[:8]}-reader", daemon=True)
+                reader.start()
+                while True:
+                    try:
+                        kind, value = updates.get(timeout=CANCEL_CHECK_INTERVAL)
+                    except queue.Empty:
+                        kind = None
+                    if job.cancel_requested.is_set():
+                        status = CANCELLED
+                        break
+                    if kind == "error":
+                        raise value
+                    if kind == "end":
+                        break
+                    if kind == "step":
+                        job.partial = value
+                        job.updates += 1
+            job.trace = trace.as_dict()
+        except Exception as e:
+            status, error = FAILED, str(e)
+
+        with self._lock:
+            if status == DONE and job.partial is None:
+                status, error = FAILED, "Generation produced no flowchart"
+            job.result = job.partial if status == DONE else None
+            self._finish(job, status, error)
+            self._update_gauges()
+
+    def _update_gauges(self):
+        # caller holds self._lock
+        statuses = [j.status for j in self._jobs.values()]
+        JOBS_QUEUED.set(statuses.count(QUEUED))
+        JOBS_RUNNING.set(statuses.count(RUNNING))
+
+    def stats(self):
+        with self._lock:
+            statuses = [j.status for j in self._jobs.values()]
+        return {
+            "workers": len(self._threads),
+            "queued": statuses.count(QUEUED),
+            "running": statuses.count(RUNNING),
+            "retained": len(statuses),
+        }
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,364 @@
+"""
+Per-request timing and process-wide histograms.
+
+    with start_trace(prompt=prompt) as trace:
+        with span("layout"):
+            ...
+    trace.as_dict()          # this request's stages + Ollama timings
+    render_prometheus()      # all histograms/counters, Prometheus text format
+
+Each finished trace is also logged as one JSON line on the
+"flowchart.metrics" logger. Nothing is configured for it by default (so at
+Python's default WARNING level the lines go nowhere); set
+FLOWCHART_METRICS_LOG to "stderr" or a file path to have them written as
+bare JSON lines, one per request, next to the /metrics endpoint
+(FLOWCHART_METRICS_PORT, see start_metrics_server).
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("flowchart.metrics")
+
+# "stderr" (or "-") or a file to append trace lines to; unset: left to the app's logging setup
+METRICS_LOG = os.getenv("FLOWCHART_METRICS_LOG", "")
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250, 500)
+COUNT_BUCKETS = (10, 50, 100, 250, 500, 1000, 2000, 4000, 8000)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = [f'{n}="{v}"' for n, v in zip(labelnames, key)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def collect(self):
+        lines = super().collect()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def quantile(self, q, **labels):
+        """Bucket-interpolated quantile estimate, like histogram_quantile()."""
+        series = self._series.get(_label_key(self.labelnames, labels))
+        if not series or not series["count"]:
+            return None
+        target = q * series["count"]
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, series["counts"]):
+            if cumulative + count >= target and count:
+                return lower + (bound - lower) * (target - cumulative) / count
+            cumulative += count
+            lower = bound
+        return self.buckets[-1]
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    le = _format_labels(self.labelnames, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                inf = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{inf} {series['count']}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {series['sum']}")
+                lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render_prometheus(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help, labelnames=()):
+    return REGISTRY.register(Counter(name, help, labelnames))
+
+
+def gauge(name, help, labelnames=()):
+    return REGISTRY.register(Gauge(name, help, labelnames))
+
+
+def histogram(name, help, buckets=LATENCY_BUCKETS, labelnames=()):
+    return REGISTRY.register(Histogram(name, help, buckets, labelnames))
+
+
+def render_prometheus():
+    return REGISTRY.render_prometheus()
+
+
+REQUEST_SECONDS = histogram("flowchart_request_seconds", "End-to-end request time", labelnames=("outcome",))
+STAGE_SECONDS = histogram("flowchart_stage_seconds", "Wall time per pipeline stage", labelnames=("stage",))
+OLLAMA_SECONDS = histogram("ollama_duration_seconds", "Durations reported by Ollama", labelnames=("phase",))
+OLLAMA_TOKENS_PER_SECOND = histogram("ollama_eval_tokens_per_second", "Generation speed", RATE_BUCKETS)
+OLLAMA_TOKENS = counter("ollama_tokens_total", "Tokens processed by Ollama", ("kind",))
+OLLAMA_EVAL_COUNT = histogram("ollama_eval_count", "Generated tokens per request", COUNT_BUCKETS)
+OLLAMA_COLD_STARTS = counter("ollama_cold_starts_total", "Requests that had to wait for a model load")
+
+# a resident model reports a few ms of load; anything above this was a real load
+COLD_START_SECONDS = 0.5
+
+# Ollama reports nanoseconds
+_OLLAMA_PHASES = {
+    "total_duration": "total",
+    "load_duration": "load",
+    "prompt_eval_duration": "prompt_eval",
+    "eval_duration": "eval",
+}
+
+
+class RequestTrace:
+    def __init__(self, **attrs):
+        self.attrs = dict(attrs)
+        self.stages = {}
+        self.ollama = {}
+        self.started = time.perf_counter()
+        self.duration = None
+
+    def add_stage(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def as_dict(self):
+        return {
+            **self.attrs,
+            "total_s": self.duration if self.duration is not None else time.perf_counter() - self.started,
+            "stages_s": dict(self.stages),
+            "ollama": dict(self.ollama),
+        }
+
+
+_current_trace = contextvars.ContextVar("flowchart_trace", default=None)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(**attrs):
+    """Collect stage timings for one request; nested calls reuse the outer trace."""
+    outer = _current_trace.get()
+    if outer is not None:
+        for key, value in attrs.items():
+            outer.attrs.setdefault(key, value)
+        yield outer
+        return
+
+    trace = RequestTrace(**attrs)
+    token = _current_trace.set(trace)
+    outcome = "ok"
+    try:
+        yield trace
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        _current_trace.reset(token)
+        trace.duration = time.perf_counter() - trace.started
+        REQUEST_SECONDS.observe(trace.duration, outcome=outcome)
+        record = trace.as_dict()
+        record["outcome"] = outcome
+        logger.info(json.dumps(record, default=str))
+
+
+def annotate(**attrs):
+    """Attach attributes (cache outcome, model, ...) to the current trace, if any."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attrs.update(attrs)
+
+
+def add_stage_time(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_stage(stage, seconds)
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage_time(stage, time.perf_counter() - start)
+
+
+def record_ollama_stats(response):
+    """Pick the timing/token fields out of Ollama's final response object."""
+    stats = {}
+    for field, phase in _OLLAMA_PHASES.items():
+        if response.get(field) is not None:
+            seconds = response[field] / 1e9
+            stats[phase + "_s"] = seconds
+            OLLAMA_SECONDS.observe(seconds, phase=phase)
+            if phase == "load" and seconds > COLD_START_SECONDS:
+                stats["cold_start"] = True
+                OLLAMA_COLD_STARTS.inc()
+
+    for field, kind in (("prompt_eval_count", "prompt"), ("eval_count", "generated")):
+        if response.get(field) is not None:
+            stats[field] = response[field]
+            OLLAMA_TOKENS.inc(response[field], kind=kind)
+
+    if response.get("eval_count") is not None:
+        OLLAMA_EVAL_COUNT.observe(response["eval_count"])
+    if response.get("eval_count") and response.get("eval_duration"):
+        rate = response["eval_count"] / (response["eval_duration"] / 1e9)
+        stats["tokens_per_s"] = rate
+        OLLAMA_TOKENS_PER_SECOND.observe(rate)
+
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.ollama.update(stats)
+    return stats
+
+
+_trace_log_handler = None
+_trace_log_lock = threading.Lock()
+
+
+def enable_trace_log(target=METRICS_LOG):
+    """
+    Write every finished trace as a bare JSON line to stderr ("stderr" or
+    "-") or appended to a file. Once per process; returns the handler, or
+    None when `target` is empty.
+    """
+    global _trace_log_handler
+    if not target:
+        return None
+    with _trace_log_lock:
+        if _trace_log_handler is None:
+            if target in ("stderr", "-"):
+                handler = logging.StreamHandler()
+            else:
+                handler = logging.FileHandler(target, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            # bare JSON lines only, not a second copy through the root logger's format
+            logger.propagate = False
+            _trace_log_handler = handler
+        return _trace_log_handler
+
+
+enable_trace_log()
+
+
+def start_metrics_server(port=None, host="0.0.0.0"):
+    """
+    Serve /metrics in Prometheus text format on a background thread.
+    Port defaults to FLOWCHART_METRICS_PORT; returns None when unset.
+    Per-request traces are a separate opt-in: FLOWCHART_METRICS_LOG, see
+    enable_trace_log.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    port = port or os.getenv("FLOWCHART_METRICS_PORT")
+    if not port:
+        return None
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,148 @@
+"""
+Keep the model loaded so the first request after a quiet spell doesn't pay
+for loading phi3.
+
+    keeper = start_keeper("phi3")   # once per process (st.cache_resource)
+    keeper.status()
+
+At startup the keeper checks /api/tags and then sends an empty-prompt
+generate, which makes Ollama load the model and keep it for OLLAMA_KEEP_ALIVE.
+During FLOWCHART_BUSY_WINDOWS it repeats this every KEEPER_INTERVAL seconds,
+so the model never idles out in class hours. Windows look like
+
+    FLOWCHART_BUSY_WINDOWS="mon-fri 08:00-18:00; sat 09:00-12:00"
+
+(local time; a window without days applies every day). Each warm-up's
+load duration is recorded. A load near zero means the model was already
+resident.
+"""
+
+import datetime
+import os
+import threading
+import time
+
+import metrics
+from ollama_client import KEEP_ALIVE, OllamaError, get_client
+
+BUSY_WINDOWS = os.getenv("FLOWCHART_BUSY_WINDOWS", "")
+KEEPER_INTERVAL = float(os.getenv("FLOWCHART_KEEPER_INTERVAL", 240))
+
+DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+WARMUP_LOAD_SECONDS = metrics.histogram("ollama_warmup_load_seconds", "Model load time seen by warm-up calls")
+MODEL_WARM = metrics.gauge("ollama_model_warm", "1 if the last warm-up succeeded", ("host",))
+
+
+def _parse_days(text):
+    days = set()
+    for part in text.lower().split(","):
+        part = part.strip()
+        if "-" in part:
+            first, last = (DAYS.index(p.strip()[:3]) for p in part.split("-"))
+            days.update(DAYS[i % 7] for i in range(first, first + (last - first) % 7 + 1))
+        elif part:
+            days.add(DAYS[DAYS.index(part[:3])])
+    return days
+
+
+def _parse_time(text):
+    hours, minutes = text.strip().split(":")
+    return datetime.time(int(hours), int(minutes))
+
+
+def parse_windows(spec):
+    """'mon-fri 08:00-18:00; 19:00-21:00' -> [(days or None, start, end)]"""
+    windows = []
+    for entry in spec.split(";"):
+        entry = entry.strip()
+        if not entry:
+            continue
+        *days, hours = entry.split()
+        start, end = hours.split("-")
+        windows.append((_parse_days(" ".join(days)) if days else None, _parse_time(start), _parse_time(end)))
+    return windows
+
+
+def in_busy_window(windows, now=None):
+    now = now or datetime.datetime.now()
+    day = DAYS[now.weekday()]
+    t = now.time()
+    for days, start, end in windows:
+        if days is not None and day not in days:
+            continue
+        if start <= end and start <= t < end:
+            return True
+        if start > end and (t >= start or t < end):     # crosses midnight
+            return True
+    return False
+
+
+def _targets(client, model):
+    # a pool warms every host, each with its own model
+    endpoints = getattr(client, "endpoints", None)
+    if endpoints:
+        return [(e.url, e.client, e.model or model) for e in endpoints]
+    return [(getattr(client, "host", "default"), client, model)]
+
+
+def _has_model(tags, model):
+    names = {m.get("name") for m in tags.get("models", [])} | {m.get("model") for m in tags.get("models", [])}
+    return model in names or f"{model}:latest" in names
+
+
+def warm_up(model, client=None, keep_alive=KEEP_ALIVE):
+    """Load `model` on every host and pin it for keep_alive. Returns one status dict per host."""
+    client = client or get_client()
+    results = []
+    for host, target, host_model in _targets(client, model):
+        result = {"host": host, "model": host_model, "at": time.time(), "ok": False}
+        started = time.perf_counter()
+        try:
+            if not _has_model(target.tags(), host_model):
+                result["error"] = f"{host_model} is not pulled on {host}"
+            else:
+                # empty prompt: Ollama loads the model and answers without generating
+                data = target.generate("", host_model, keep_alive=keep_alive)
+                result["ok"] = True
+                result["load_s"] = data.get("load_duration", 0) / 1e9
+                WARMUP_LOAD_SECONDS.observe(result["load_s"])
+        except (OllamaError, AttributeError, ValueError) as e:
+            result["error"] = str(e)
+        result["total_s"] = time.perf_counter() - started
+        MODEL_WARM.set(1 if result["ok"] else 0, host=host)
+        results.append(result)
+    return results
+
+
+class ModelKeeper:
+    def __init__(self, model, windows=None, interval=KEEPER_INTERVAL, keep_alive=KEEP_ALIVE):
+        self.model = model
+        self.windows = parse_windows(BUSY_WINDOWS) if windows is None else windows
+        self.interval = interval
+        self.keep_alive = keep_alive
+        self.startup = None
+        self.last = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="model-keeper", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        # startup warm-up runs here too, so the first page render doesn't wait on the model load
+        self.startup = self.last = warm_up(self.model, keep_alive=self.keep_alive)
+        while not self._stop.wait(self.interval):
+            if in_busy_window(self.windows):
+                self.last = warm_up(self.model, keep_alive=self.keep_alive)
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        return {"startup": self.startup, "last": self.last, "busy_now": in_busy_window(self.windows)}
+
+
+def start_keeper(model, **kwargs):
+    return ModelKeeper(model, **kwargs).start()
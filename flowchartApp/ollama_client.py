@@ -0,0 +1,271 @@
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
+CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", 120))
+MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", 3))
+POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", 16))
+# how long Ollama keeps the model loaded after each request (Ollama's own default is 5m)
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# live (real Ollama), record or replay - see replay_backend.py
+BACKEND_MODE = os.getenv("FLOWCHART_BACKEND_MODE", "live")
+
+# statuses worth retrying: overloaded / restarting server or a proxy in front of it
+RETRY_STATUSES = {429, 502, 503, 504}
+# a POST may already have reached the model (a second try would start a second
+# generation), so it is only re-sent when the server refused it before doing any work
+POST_RETRY_STATUSES = {503}
+
+
+class OllamaError(Exception):
+    """Base class for backend failures."""
+
+
+class OllamaConnectError(OllamaError):
+    """Could not reach the server (refused, DNS, connect timeout). Safe to retry."""
+
+
+class OllamaTimeout(OllamaError):
+    """Connected, but the model did not answer within the read timeout."""
+
+
+class OllamaHTTPError(OllamaError):
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def merge_ndjson(text: str) -> dict:
+    """
+    Collapse an NDJSON (streamed) body into one response dict.
+    The last chunk carries the timing fields, earlier ones only text.
+    """
+    parts = []
+    final = {}
+    for line in text.strip().split("\n"):
+        if not line.strip():
+            continue
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if "response" in obj:
+            parts.append(obj["response"])
+        final = obj
+
+    if not parts:
+        raise OllamaError(f"Failed to parse Ollama response. Raw text snippet: {text[:200]}")
+
+    final = dict(final)
+    final["response"] = "".join(parts)
+    return final
+
+
+class StreamTally:
+    """
+    Follows a generate stream so a stream closed before Ollama's final
+    object still has stats. Ollama streams one token per chunk, so the
+    chunk count stands in for eval_count, and the wait for the first chunk
+    for load + prompt evaluation.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first = None
+        self.last = None
+        self.tokens = 0
+        self.done = False
+
+    def add(self, obj):
+        now = time.perf_counter()
+        if obj.get("response"):
+            if self.first is None:
+                self.first = now
+            self.last = now
+            self.tokens += 1
+        if obj.get("done"):
+            self.done = True
+
+    def final(self):
+        """A synthetic final object for a stream cut off before "done"."""
+        end = time.perf_counter()
+        first = self.first if self.first is not None else end
+        last = self.last if self.last is not None else end
+        return {
+            "done": True,
+            "done_reason": "cutoff",
+            "total_duration": int((end - self.started) * 1e9),
+            "prompt_eval_duration": int((first - self.started) * 1e9),
+            "eval_count": self.tokens,
+            "eval_duration": int((last - first) * 1e9),
+        }
+
+
+def _never_sent(error):
+    """True when a requests ConnectionError happened before the request reached the server."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    # NewConnectionError (refused, DNS) is a ConnectTimeoutError too
+    return isinstance(reason, ConnectTimeoutError)
+
+
+def _generate_payload(prompt, model, stream, options, keep_alive):
+    payload = {"model": model, "prompt": prompt, "stream": stream}
+    if options:
+        payload["options"] = options
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    return payload
+
+
+class OllamaClient:
+    """
+    Blocking client sharing one keep-alive session (and connection pool)
+    across every generation in the process.
+    """
+
+    def __init__(self, host=OLLAMA_HOST, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, max_retries=MAX_RETRIES, pool_size=POOL_SIZE):
+        self.host = host.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _request(self, method, path, payload=None, stream=False):
+        url = self.host + path
+        last_error = None
+        idempotent = method == "GET"
+        retry_statuses = RETRY_STATUSES if idempotent else POST_RETRY_STATUSES
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(backoff_delay(attempt - 1))
+            try:
+                response = self.session.request(
+                    method, url, json=payload, timeout=self.timeout, stream=stream
+                )
+            except requests.exceptions.ReadTimeout as e:
+                # the server accepted the request; re-sending would queue another generation
+                raise OllamaTimeout(f"No response from {url} within {self.timeout[1]}s") from e
+            except requests.exceptions.ConnectionError as e:
+                if not idempotent and not _never_sent(e):
+                    # dropped after the request went out: the model may be generating it already
+                    raise OllamaConnectError(f"Connection to {url} lost: {e}") from e
+                last_error = OllamaConnectError(f"Cannot connect to {url}: {e}")
+                continue
+
+            if response.status_code in retry_statuses:
+                last_error = OllamaHTTPError(response.status_code, response.text[:200])
+                response.close()
+                continue
+            if response.status_code >= 400:
+                message = response.text[:200]
+                response.close()
+                raise OllamaHTTPError(response.status_code, message)
+            return response
+
+        raise last_error
+
+    def generate(self, prompt: str, model: str, options=None, keep_alive=None) -> dict:
+        payload = _generate_payload(prompt, model, False, options, keep_alive)
+        response = self._request("POST", "/api/generate", payload)
+        try:
+            return response.json()
+        except ValueError:
+            return merge_ndjson(response.text)
+
+    def generate_stream(self, prompt: str, model: str, options=None, keep_alive=None):
+        """Yield each NDJSON chunk dict as it arrives."""
+        payload = _generate_payload(prompt, model, True, options, keep_alive)
+        response = self._request("POST", "/api/generate", payload, stream=True)
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                try:
+                    obj = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if obj.get("error"):
+                    raise OllamaError(obj["error"])
+                yield obj
+                if obj.get("done"):
+                    break
+        except requests.exceptions.ConnectionError as e:
+            # requests reports read timeouts while streaming as ConnectionError
+            if "timed out" in str(e).lower():
+                raise OllamaTimeout(f"Stream stalled for more than {self.timeout[1]}s") from e
+            raise OllamaError(f"Stream interrupted: {e}") from e
+        except requests.exceptions.RequestException as e:
+            raise OllamaError(f"Stream interrupted: {e}") from e
+        finally:
+            response.close()
+
+    def embed(self, text: str, model: str) -> list:
+        """Embedding vector for `text` (/api/embed, or /api/embeddings on older servers)."""
+        try:
+            data = self._request("POST", "/api/embed", {"model": model, "input": text}).json()
+            return data["embeddings"][0]
+        except OllamaHTTPError as e:
+            if e.status != 404:
+                raise
+        data = self._request("POST", "/api/embeddings", {"model": model, "prompt": text}).json()
+        return data["embedding"]
+
+    def tags(self) -> dict:
+        return self._request("GET", "/api/tags").json()
+
+    def close(self):
+        self.session.close()
+
+
+def live_client():
+    """A pool when OLLAMA_HOSTS lists several hosts (see ollama_pool.py), else a single-host client."""
+    if os.getenv("OLLAMA_HOSTS", "").strip():
+        from ollama_pool import OllamaPool
+        return OllamaPool.from_spec()
+    return OllamaClient()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_client() -> OllamaClient:
+    """Process-wide shared client (or record/replay backend, per FLOWCHART_BACKEND_MODE)."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            if BACKEND_MODE == "live":
+                _default_client = live_client()
+            else:
+                from replay_backend import backend_from_env
+                _default_client = backend_from_env(BACKEND_MODE)
+        return _default_client
+
+
+def set_client(client):
+    """Swap the process-wide client (tests, benchmarks, alternative backends)."""
+    global _default_client
+    with _default_client_lock:
+        _default_client = client
+
@@ -0,0 +1,302 @@
+"""
+Spread generations over several Ollama hosts.
+
+    OLLAMA_HOSTS="http://gpu1:11434|phi3|2, http://gpu2:11434|phi3, http://cpu1:11434|phi3:mini|0.5"
+
+Each entry is url[|model[|weight]]. A generation goes to the healthy host
+with the fewest outstanding requests per unit of weight. A background
+thread probes every host's /api/tags (the same check debug_ollama.py does
+by hand). A host that fails a probe, or fails FAILURES_TO_EJECT requests in
+a row, is ejected for EJECT_COOLDOWN seconds. After that it gets traffic
+again, and the next probe or request decides whether it stays. A passing
+probe brings back a host ejected by a probe early, but not one ejected for
+failing requests: /api/tags can answer while /api/generate returns 500s.
+"""
+
+import os
+import random
+import threading
+import time
+
+import metrics
+from ollama_client import OllamaClient, OllamaConnectError, OllamaError, OllamaHTTPError, RETRY_STATUSES
+
+OLLAMA_HOSTS = os.getenv("OLLAMA_HOSTS", "")
+HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", 10))
+HEALTH_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_TIMEOUT", 2))
+EJECT_COOLDOWN = float(os.getenv("OLLAMA_EJECT_COOLDOWN", 30))
+FAILURES_TO_EJECT = int(os.getenv("OLLAMA_FAILURES_TO_EJECT", 3))
+
+POOL_REQUESTS = metrics.counter("ollama_pool_requests_total", "Generations routed per host", ("host", "outcome"))
+POOL_OUTSTANDING = metrics.gauge("ollama_pool_outstanding", "In-flight generations per host", ("host",))
+POOL_HEALTHY = metrics.gauge("ollama_pool_healthy", "1 if the host is taking traffic", ("host",))
+POOL_EJECTIONS = metrics.counter("ollama_pool_ejections_total", "Times a host was ejected", ("host", "reason"))
+POOL_FAILOVERS = metrics.counter("ollama_pool_failovers_total", "Generations retried on another host")
+
+
+def parse_hosts(spec, default_model=None):
+    """'url|model|weight, url' -> [(url, model or default_model, weight)]"""
+    hosts = []
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        parts = [p.strip() for p in entry.split("|")]
+        url = parts[0].rstrip("/")
+        model = parts[1] if len(parts) > 1 and parts[1] else default_model
+        weight = float(parts[2]) if len(parts) > 2 and parts[2] else 1.0
+        if weight <= 0:
+            raise ValueError(f"Weight for {url} must be positive")
+        hosts.append((url, model, weight))
+    return hosts
+
+
+def _serves_model(tags, model):
+    if not model:
+        return True
+    names = {m.get("name", "") for m in tags.get("models", [])} | {m.get("model", "") for m in tags.get("models", [])}
+    # "phi3" matches "phi3:latest"
+    return model in names or f"{model}:latest" in names
+
+
+class Endpoint:
+    def __init__(self, url, model=None, weight=1.0, client=None):
+        self.url = url
+        self.model = model
+        self.weight = weight
+        self.client = client or OllamaClient(host=url, max_retries=0)
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.ejected_for = None     # "probe" or "requests" while ejected
+        self.last_error = None
+
+    def available(self, now):
+        return now >= self.ejected_until
+
+    def load(self):
+        return self.outstanding / self.weight
+
+    def as_dict(self, now=None):
+        now = time.monotonic() if now is None else now
+        return {
+            "url": self.url,
+            "model": self.model,
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "healthy": self.available(now),
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+class OllamaPool:
+    """
+    Same generate / generate_stream / tags API as OllamaClient, so it can be
+    installed with ollama_client.set_client. A per-host model overrides the
+    model the caller asked for.
+    """
+
+    def __init__(self, endpoints, health_interval=HEALTH_INTERVAL, cooldown=EJECT_COOLDOWN,
+                 failures_to_eject=FAILURES_TO_EJECT, start_health_thread=True):
+        if not endpoints:
+            raise ValueError("OllamaPool needs at least one endpoint")
+        self.endpoints = list(endpoints)
+        self.cooldown = cooldown
+        self.failures_to_eject = failures_to_eject
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._probe_clients = {e.url: OllamaClient(host=e.url, read_timeout=HEALTH_TIMEOUT, max_retries=0)
+                               for e in self.endpoints}
+        for e in self.endpoints:
+            POOL_HEALTHY.set(1, host=e.url)
+            POOL_OUTSTANDING.set(0, host=e.url)
+        self._thread = None
+        if start_health_thread and health_interval > 0:
+            self._thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+            self._thread.start()
+
+    @classmethod
+    def from_spec(cls, spec=OLLAMA_HOSTS, default_model=None, **kwargs):
+        return cls([Endpoint(url, model, weight) for url, model, weight in parse_hosts(spec, default_model)], **kwargs)
+
+    # -- routing
+
+    def _acquire(self, exclude=()):
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude and e.available(now)]
+            if not candidates:
+                # everything is ejected: better to try the one closest to coming back than to fail outright
+                candidates = sorted((e for e in self.endpoints if e not in exclude),
+                                    key=lambda e: e.ejected_until)[:1]
+            if not candidates:
+                return None
+            best = min(e.load() for e in candidates)
+            tied = [e for e in candidates if e.load() == best]
+            top = max(e.weight for e in tied)
+            endpoint = random.choice([e for e in tied if e.weight == top])
+            endpoint.outstanding += 1
+            POOL_OUTSTANDING.set(endpoint.outstanding, host=endpoint.url)
+        metrics.annotate(host=endpoint.url)
+        return endpoint
+
+    def _release(self, endpoint, error=None):
+        with self._lock:
+            endpoint.outstanding -= 1
+            POOL_OUTSTANDING.set(endpoint.outstanding, host=endpoint.url)
+            if error is None:
+                endpoint.failures = 0
+                POOL_REQUESTS.inc(host=endpoint.url, outcome="ok")
+                return
+            POOL_REQUESTS.inc(host=endpoint.url, outcome="error")
+            if _host_fault(error):
+                endpoint.failures += 1
+                endpoint.last_error = str(error)
+                if endpoint.failures >= self.failures_to_eject:
+                    self._eject(endpoint, "requests")
+
+    def _eject(self, endpoint, reason):
+        # caller holds the lock
+        if endpoint.available(time.monotonic()):
+            POOL_EJECTIONS.inc(host=endpoint.url, reason=reason)
+            endpoint.ejected_for = reason
+        elif reason == "requests":
+            endpoint.ejected_for = reason
+        endpoint.ejected_until = time.monotonic() + self.cooldown
+        endpoint.failures = 0
+        POOL_HEALTHY.set(0, host=endpoint.url)
+
+    def _attempts(self):
+        tried = []
+        while len(tried) < len(self.endpoints):
+            endpoint = self._acquire(exclude=tried)
+            if endpoint is None:
+                return
+            if tried:
+                POOL_FAILOVERS.inc()
+            tried.append(endpoint)
+            yield endpoint
+
+    # -- client API
+
+    def generate(self, prompt, model, options=None, keep_alive=None):
+        last_error = None
+        for endpoint in self._attempts():
+            try:
+                data = endpoint.client.generate(prompt, endpoint.model or model, options=options, keep_alive=keep_alive)
+            except OllamaError as e:
+                self._release(endpoint, e)
+                if not _host_fault(e):
+                    raise
+                last_error = e
+                continue
+            self._release(endpoint)
+            return data
+        raise last_error or OllamaConnectError("No Ollama hosts configured")
+
+    def generate_stream(self, prompt, model, options=None, keep_alive=None):
+        last_error = None
+        for endpoint in self._attempts():
+            started = False
+            try:
+                for obj in endpoint.client.generate_stream(prompt, endpoint.model or model,
+                                                           options=options, keep_alive=keep_alive):
+                    started = True
+                    yield obj
+            except OllamaError as e:
+                self._release(endpoint, e)
+                # once text has gone out, switching hosts would splice two completions
+                if started or not _host_fault(e):
+                    raise
+                last_error = e
+                continue
+            except GeneratorExit:
+                # consumer stopped reading early - not the host's fault
+                self._release(endpoint)
+                raise
+            except BaseException as e:
+                self._release(endpoint, e)
+                raise
+            self._release(endpoint)
+            return
+        raise last_error or OllamaConnectError("No Ollama hosts configured")
+
+    def embed(self, text, model):
+        # embedding models are small, so route like generations but keep the caller's model
+        last_error = None
+        for endpoint in self._attempts():
+            try:
+                vector = endpoint.client.embed(text, model)
+            except OllamaError as e:
+                self._release(endpoint, e)
+                if not _host_fault(e):
+                    raise
+                last_error = e
+                continue
+            self._release(endpoint)
+            return vector
+        raise last_error or OllamaConnectError("No Ollama hosts configured")
+
+    def tags(self):
+        """Union of the models on every reachable host."""
+        models = {}
+        for endpoint in self.endpoints:
+            try:
+                for m in self._probe_clients[endpoint.url].tags().get("models", []):
+                    models.setdefault(m.get("name"), m)
+            except OllamaError:
+                continue
+        return {"models": list(models.values())}
+
+    # -- health
+
+    def check_health(self):
+        """Probe every host once; returns {url: healthy}."""
+        results = {}
+        for endpoint in self.endpoints:
+            try:
+                tags = self._probe_clients[endpoint.url].tags()
+                ok = _serves_model(tags, endpoint.model)
+                error = None if ok else f"model {endpoint.model} not loaded"
+            except (OllamaError, ValueError) as e:
+                ok, error = False, str(e)
+            with self._lock:
+                if ok:
+                    if endpoint.ejected_for == "probe" or endpoint.available(time.monotonic()):
+                        # failing requests keep a host out for the whole cooldown
+                        endpoint.ejected_until = 0.0
+                        endpoint.ejected_for = None
+                        POOL_HEALTHY.set(1, host=endpoint.url)
+                else:
+                    endpoint.last_error = error
+                    self._eject(endpoint, "probe")
+            results[endpoint.url] = ok
+        return results
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            try:
+                self.check_health()
+            except Exception:
+                # never let the prober die; the next round tries again
+                pass
+
+    def status(self):
+        now = time.monotonic()
+        with self._lock:
+            return [e.as_dict(now) for e in self.endpoints]
+
+    def close(self):
+        self._stop.set()
+        for endpoint in self.endpoints:
+            endpoint.client.close()
+        for client in self._probe_clients.values():
+            client.close()
+
+
+def _host_fault(error):
+    """Errors that say something about the host rather than the request."""
+    if isinstance(error, OllamaConnectError):
+        return True
+    return isinstance(error, OllamaHTTPError) and (error.status in RETRY_STATUSES or error.status >= 500)
@@ -0,0 +1,215 @@
+"""
+Near-duplicate prompt lookup.
+
+"check if n is even", "even or odd number" and "determine parity of a
+number" should all reuse one generated chart. Every cached prompt is
+embedded and stored as a row of a unit-normalized float32 matrix. A lookup
+is then a single matrix-vector product, and the best row wins if its
+cosine similarity clears the threshold.
+
+Two embeddings are kept per prompt:
+- semantic: Ollama's embedding endpoint (FLOWCHART_EMBED_MODEL)
+- lexical: hashed word and character shingles, always available and cheap
+The semantic index is used whenever the embedding call works. The lexical
+one covers hosts without an embedding model and the periods when the
+embedding call is failing.
+
+The index maps prompts to flowchart cache keys rather than holding charts
+itself, so results still expire with the cache. It lives in memory and the
+disk cache doesn't keep prompts, so after a restart it only covers prompts
+generated since.
+"""
+
+import os
+import re
+import threading
+import time
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+from flowchart_cache import normalize_prompt
+from ollama_client import OllamaError, get_client
+
+EMBED_MODEL = os.getenv("FLOWCHART_EMBED_MODEL", "nomic-embed-text")
+SEMANTIC_THRESHOLD = float(os.getenv("FLOWCHART_SIMILARITY_THRESHOLD", 0.92))
+LEXICAL_THRESHOLD = float(os.getenv("FLOWCHART_LEXICAL_THRESHOLD", 0.85))
+INDEX_MAX_ENTRIES = int(os.getenv("FLOWCHART_SIMILARITY_MAX_ENTRIES", 5000))
+# after a failed embedding call, skip the semantic index for this long
+EMBED_RETRY_AFTER = 60.0
+
+LEXICAL_DIM = 1024
+INITIAL_ROWS = 64
+
+STOPWORDS = frozenset(
+    "a an the of to for in on is are be if or and whether given number numbers "
+    "write program flowchart draw make create find check determine".split()
+)
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text):
+    words = []
+    for word in TOKEN_RE.findall(normalize_prompt(text)):
+        if word in STOPWORDS:
+            continue
+        # crude plural folding so "numbers"/"number", "primes"/"prime" line up
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def _bucket(feature, dim):
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h % dim, 1.0 if (h >> 31) & 1 else -1.0
+
+
+def shingle_vector(text, dim=LEXICAL_DIM):
+    """Hashed bag of words, word bigrams and character trigrams, L2-normalized."""
+    words = _tokens(text)
+    features = list(words)
+    features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"#{word}#"
+        features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in features:
+        index, sign = _bucket(feature, dim)
+        vector[index] += sign
+    return _unit(vector)
+
+
+def _unit(vector):
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
+
+class VectorIndex:
+    """
+    Bounded matrix of unit vectors with a parallel list of items. Rows are
+    reused oldest-first once max_entries is reached.
+    """
+
+    def __init__(self, dim, max_entries=INDEX_MAX_ENTRIES):
+        self.dim = dim
+        self.max_entries = max_entries
+        self._matrix = np.zeros((min(INITIAL_ROWS, max_entries), dim), dtype=np.float32)
+        self._items = []
+        self._next = 0
+        self._rows = {}     # item -> row, so re-adding a prompt updates in place
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, vector, item):
+        row = self._rows.get(item)
+        if row is None:
+            if len(self._items) < self.max_entries:
+                row = len(self._items)
+                if row == len(self._matrix):
+                    grown = np.zeros((min(len(self._matrix) * 2, self.max_entries), self.dim), dtype=np.float32)
+                    grown[:row] = self._matrix
+                    self._matrix = grown
+                self._items.append(item)
+            else:
+                row = self._next
+                self._next = (self._next + 1) % self.max_entries
+                del self._rows[self._items[row]]
+                self._items[row] = item
+            self._rows[item] = row
+        self._matrix[row] = vector
+
+    def search(self, vector):
+        """(similarity, item) of the closest row, or (0.0, None) when empty."""
+        n = len(self._items)
+        if not n:
+            return 0.0, None
+        scores = self._matrix[:n] @ vector
+        best = int(np.argmax(scores))
+        return float(scores[best]), self._items[best]
+
+
+@lru_cache(maxsize=1024)
+def _embed(text, model):
+    vector = np.asarray(get_client().embed(text, model), dtype=np.float32)
+    vector.setflags(write=False)
+    return vector
+
+
+class PromptIndex:
+    def __init__(self, embed_model=EMBED_MODEL, threshold=SEMANTIC_THRESHOLD,
+                 lexical_threshold=LEXICAL_THRESHOLD, max_entries=INDEX_MAX_ENTRIES):
+        self.embed_model = embed_model
+        self.threshold = threshold
+        self.lexical_threshold = lexical_threshold
+        self.max_entries = max_entries
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self._embed_down_until = 0.0
+        self.lookups = 0
+        self.hits = 0
+        self.embed_failures = 0
+
+    def _semantic_vector(self, prompt):
+        if not self.embed_model or time.monotonic() < self._embed_down_until:
+            return None
+        try:
+            return _unit(_embed(normalize_prompt(prompt), self.embed_model))
+        except (OllamaError, AttributeError, KeyError, IndexError, ValueError):
+            # no embedding model pulled, old server, replay backend...
+            self.embed_failures += 1
+            self._embed_down_until = time.monotonic() + EMBED_RETRY_AFTER
+            return None
+
+    def _index(self, scope, kind, dim):
+        index = self._indexes.get((scope, kind))
+        if index is None or index.dim != dim:
+            index = self._indexes[(scope, kind)] = VectorIndex(dim, self.max_entries)
+        return index
+
+    def add(self, prompt, key, scope=""):
+        """Remember that `prompt` produced the chart cached under `key`."""
+        lexical = shingle_vector(prompt)
+        semantic = self._semantic_vector(prompt)
+        with self._lock:
+            self._index(scope, "lexical", LEXICAL_DIM).add(lexical, key)
+            if semantic is not None:
+                self._index(scope, "semantic", len(semantic)).add(semantic, key)
+
+    def lookup(self, prompt, scope=""):
+        """(key, similarity, kind) of the best match above threshold, else None."""
+        with self._lock:
+            if not self._indexes.get((scope, "lexical")):
+                # nothing to match against (e.g. just after a restart): skip the embedding call
+                self.lookups += 1
+                return None
+        semantic = self._semantic_vector(prompt)
+        lexical = shingle_vector(prompt)
+        with self._lock:
+            self.lookups += 1
+            candidates = []
+            index = self._indexes.get((scope, "semantic"))
+            if semantic is not None and index is not None and index.dim == len(semantic):
+                candidates.append((*index.search(semantic), "semantic", self.threshold))
+            index = self._indexes.get((scope, "lexical"))
+            if index is not None:
+                candidates.append((*index.search(lexical), "lexical", self.lexical_threshold))
+
+            for score, key, kind, threshold in candidates:
+                if key is not None and score >= threshold:
+                    self.hits += 1
+                    return key, score, kind
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "entries": {f"{scope or '-'}/{kind}": len(index) for (scope, kind), index in self._indexes.items()},
+                "embed_failures": self.embed_failures,
+            }
@@ -0,0 +1,206 @@
+"""
+Record / replay LLM backends for deterministic load testing.
+
+    FLOWCHART_BACKEND_MODE=record FLOWCHART_CORPUS=corpus.jsonl.gz streamlit run flowchartApp/app.py
+    FLOWCHART_BACKEND_MODE=replay FLOWCHART_CORPUS=corpus.jsonl.gz FLOWCHART_REPLAY_SPEED=10 ...
+
+"record" forwards to the real Ollama client and appends each completion,
+chunk timings included, to a gzip JSONL corpus. "replay" serves completions
+from that corpus without a model. FLOWCHART_REPLAY_SPEED controls latency:
+1 means as recorded, 10 means ten times faster, and 0 means instant.
+Both backends have the same generate / generate_stream / tags API as
+OllamaClient, so they can be dropped in via ollama_client.set_client.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+from ollama_client import OllamaError, StreamTally, live_client
+
+CORPUS_PATH = os.getenv("FLOWCHART_CORPUS", "ollama_corpus.jsonl.gz")
+REPLAY_SPEED = float(os.getenv("FLOWCHART_REPLAY_SPEED", 1.0))
+# "error": unknown prompts fail; "any": serve a recorded completion picked by prompt hash
+REPLAY_MISS_POLICY = os.getenv("FLOWCHART_REPLAY_MISS", "error")
+
+TIMING_FIELDS = ("total_duration", "load_duration", "prompt_eval_count",
+                 "prompt_eval_duration", "eval_count", "eval_duration")
+
+
+def corpus_key(model, prompt):
+    return hashlib.sha1(json.dumps([model, prompt]).encode("utf-8")).hexdigest()
+
+
+class Corpus:
+    """
+    Append-only gzip JSONL file of recordings:
+    {"key", "model", "chunks": [[delay_ms, text], ...], "stats": {...}, "done_reason", "recorded_at"}
+    Each append is its own gzip member, so the file stays readable after a crash.
+    """
+
+    def __init__(self, path=CORPUS_PATH):
+        self.path = path
+        self._records = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        records = {}
+        if os.path.exists(self.path):
+            try:
+                with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            record = json.loads(line)
+                            records[record["key"]] = record
+            except (EOFError, OSError, ValueError):
+                # truncated last member from an interrupted write; keep what we got
+                pass
+        return records
+
+    @property
+    def records(self):
+        with self._lock:
+            if self._records is None:
+                self._records = self._load()
+            return self._records
+
+    def get(self, model, prompt):
+        return self.records.get(corpus_key(model, prompt))
+
+    def pick(self, model, prompt):
+        """Deterministic stand-in for prompts that were never recorded."""
+        candidates = sorted(k for k, r in self.records.items() if r["model"] == model) or sorted(self.records)
+        if not candidates:
+            return None
+        index = int(corpus_key(model, prompt), 16) % len(candidates)
+        return self.records[candidates[index]]
+
+    def models(self):
+        return sorted({r["model"] for r in self.records.values()})
+
+    def append(self, record):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+            if self._records is not None:
+                self._records[record["key"]] = record
+
+    def __len__(self):
+        return len(self.records)
+
+
+def make_record(model, prompt, chunks, final):
+    return {
+        "key": corpus_key(model, prompt),
+        "model": model,
+        "chunks": chunks,
+        "stats": {k: final[k] for k in TIMING_FIELDS if k in final},
+        "done_reason": final.get("done_reason", "stop"),
+        "recorded_at": int(time.time()),
+    }
+
+
+def completion_text(record):
+    return "".join(text for _, text in record["chunks"])
+
+
+class RecordingBackend:
+    def __init__(self, inner, corpus):
+        self.inner = inner
+        self.corpus = corpus
+
+    def generate(self, prompt, model, options=None, keep_alive=None):
+        data = self.inner.generate(prompt, model, options=options, keep_alive=keep_alive)
+        # non-streamed: no per-chunk timing, spread the eval time when replaying
+        self.corpus.append(make_record(model, prompt, [[0, data.get("response", "")]], data))
+        return data
+
+    def generate_stream(self, prompt, model, options=None, keep_alive=None):
+        chunks = []
+        tally = StreamTally()
+        last = tally.started
+        inner = self.inner.generate_stream(prompt, model, options=options, keep_alive=keep_alive)
+        try:
+            for obj in inner:
+                now = time.perf_counter()
+                tally.add(obj)
+                if obj.get("response"):
+                    chunks.append([round((now - last) * 1000, 1), obj["response"]])
+                    last = now
+                if obj.get("done"):
+                    self.corpus.append(make_record(model, prompt, chunks, obj))
+                yield obj
+        finally:
+            inner.close()
+            # the consumer stopped early (e.g. the step list ended): keep the
+            # text it saw, which is all a replay of this prompt will be asked for
+            if not tally.done and chunks:
+                self.corpus.append(make_record(model, prompt, chunks, tally.final()))
+
+    def tags(self):
+        return self.inner.tags()
+
+    def close(self):
+        self.inner.close()
+
+
+class ReplayBackend:
+    def __init__(self, corpus, speed=REPLAY_SPEED, miss_policy=REPLAY_MISS_POLICY):
+        self.corpus = corpus
+        self.speed = speed
+        self.miss_policy = miss_policy
+
+    def _lookup(self, model, prompt):
+        record = self.corpus.get(model, prompt)
+        if record is None and self.miss_policy == "any":
+            record = self.corpus.pick(model, prompt)
+        if record is None:
+            raise OllamaError(f"No recording for this prompt in {self.corpus.path}")
+        return record
+
+    def _sleep(self, seconds):
+        if self.speed > 0 and seconds > 0:
+            time.sleep(seconds / self.speed)
+
+    def _final(self, record, model):
+        final = {"model": model, "done": True, "done_reason": record.get("done_reason", "stop"),
+                 "response": ""}
+        final.update(record["stats"])
+        return final
+
+    def generate(self, prompt, model, options=None, keep_alive=None):
+        record = self._lookup(model, prompt)
+        self._sleep(record["stats"].get("total_duration", 0) / 1e9)
+        final = self._final(record, model)
+        final["response"] = completion_text(record)
+        return final
+
+    def generate_stream(self, prompt, model, options=None, keep_alive=None):
+        record = self._lookup(model, prompt)
+        chunks = record["chunks"]
+        if len(chunks) == 1 and chunks[0][0] == 0:
+            # recorded without streaming: pace it like the original generation
+            self._sleep(record["stats"].get("total_duration", 0) / 1e9)
+        for delay_ms, text in chunks:
+            self._sleep(delay_ms / 1000)
+            yield {"model": model, "response": text, "done": False}
+        yield self._final(record, model)
+
+    def tags(self):
+        return {"models": [{"name": m, "model": m} for m in self.corpus.models()]}
+
+    def close(self):
+        pass
+
+
+def backend_from_env(mode, corpus_path=CORPUS_PATH):
+    corpus = Corpus(corpus_path)
+    if mode == "record":
+        return RecordingBackend(live_client(), corpus)
+    if mode == "replay":
+        return ReplayBackend(corpus)
+    raise ValueError(f"Unknown FLOWCHART_BACKEND_MODE {mode!r} (expected live, record or replay)")
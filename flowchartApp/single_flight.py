@@ -0,0 +1,189 @@
+"""
+Coalesce identical in-flight generations.
+
+When a whole classroom submits the same prompt at once, the first caller
+(the leader) runs the generation and everyone else with the same key
+attaches to it. Followers get the leader's result or its exception, and
+streaming followers also get each partial chart as it is produced. The
+cache can't help with this burst, because no result exists yet.
+
+    result = inflight.do(key, lambda: expensive(prompt))
+    for partial in inflight.stream(key, lambda: expensive_stream(prompt)):
+        ...
+"""
+
+import contextvars
+import os
+import threading
+
+import metrics
+
+COALESCE_TIMEOUT = float(os.getenv("FLOWCHART_COALESCE_TIMEOUT", 180))
+
+COALESCE_CALLS = metrics.counter("flowchart_coalesce_calls_total",
+                                 "Generation requests by single-flight role", ("role",))
+COALESCE_TIMEOUTS = metrics.counter("flowchart_coalesce_timeouts_total",
+                                    "Followers that gave up waiting on a shared generation")
+
+
+class CoalesceTimeout(TimeoutError):
+    """A follower waited longer than the coalescing timeout."""
+
+
+class FlightAbandoned(Exception):
+    """Every caller stopped reading a shared stream, so the generation was stopped."""
+
+
+class _Flight:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.seq = 0            # partial results published so far
+        self.latest = None
+        self.done = False
+        self.result = None
+        self.error = None
+        self.subscribers = 0    # guarded by SingleFlight._lock
+
+
+class SingleFlight:
+    def __init__(self, timeout=COALESCE_TIMEOUT):
+        self.timeout = timeout
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def _join(self, key):
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+            flight.subscribers += 1
+        COALESCE_CALLS.inc(role="leader" if leader else "follower")
+        if not leader:
+            metrics.annotate(coalesced=True)
+        return flight, leader
+
+    def _leave(self, flight):
+        with self._lock:
+            flight.subscribers -= 1
+
+    def _finish(self, key, flight, result=None, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        with flight.cond:
+            if result is not None and result is not flight.latest:
+                # a do() leader publishes nothing along the way; stream() followers
+                # of its key still have to get the result
+                flight.latest = result
+                flight.seq += 1
+            flight.done = True
+            flight.result = result
+            flight.error = error
+            flight.cond.notify_all()
+
+    def _wait(self, flight, predicate, timeout):
+        # caller holds flight.cond
+        if not flight.cond.wait_for(predicate, timeout):
+            with self._lock:
+                self.timeouts += 1
+            COALESCE_TIMEOUTS.inc()
+            raise CoalesceTimeout(f"Gave up after {timeout:g}s waiting for an identical request in progress")
+
+    def do(self, key, fn, timeout=None):
+        """Run fn() once per key at a time; concurrent callers share its outcome."""
+        timeout = self.timeout if timeout is None else timeout
+        flight, leader = self._join(key)
+        try:
+            if leader:
+                try:
+                    result = fn()
+                except BaseException as e:
+                    self._finish(key, flight, error=e)
+                    raise
+                self._finish(key, flight, result=result)
+                return result
+
+            with flight.cond:
+                self._wait(flight, lambda: flight.done, timeout)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        finally:
+            self._leave(flight)
+
+    def stream(self, key, make_iter, timeout=None):
+        """
+        Like do() for generators. The leader's iterator runs on a background
+        thread and every caller, leader included, gets the latest value as
+        it is published. Slow readers skip intermediate values, but always
+        get the last one. If every caller stops reading, the iterator is
+        closed. Followers time out after `timeout` seconds with no progress.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        flight, leader = self._join(key)
+        if leader:
+            # run under the leader's context so stage timings land on its trace
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(self._produce, key, flight, make_iter),
+                             name="single-flight", daemon=True).start()
+
+        seen = 0
+        try:
+            while True:
+                with flight.cond:
+                    self._wait(flight, lambda: flight.seq > seen or flight.done, None if leader else timeout)
+                    seq, latest, done, error = flight.seq, flight.latest, flight.done, flight.error
+                if seq > seen:
+                    seen = seq
+                    yield latest
+                if done:
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            self._leave(flight)
+
+    def _produce(self, key, flight, make_iter):
+        iterator = make_iter()
+        try:
+            for item in iterator:
+                with flight.cond:
+                    flight.latest = item
+                    flight.seq += 1
+                    flight.cond.notify_all()
+                with self._lock:
+                    abandoned = flight.subscribers == 0
+                    if abandoned and self._flights.get(key) is flight:
+                        # new callers start a fresh generation rather than join a dying one
+                        del self._flights[key]
+                if abandoned:
+                    iterator.close()
+                    self._finish(key, flight, error=FlightAbandoned(key))
+                    return
+        except BaseException as e:
+            self._finish(key, flight, error=e)
+            return
+        self._finish(key, flight, result=flight.latest)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+    def stats(self):
+        with self._lock:
+            calls = self.calls
+            return {
+                "calls": calls,
+                "leaders": calls - self.coalesced,
+                "coalesced": self.coalesced,
+                "coalescing_rate": self.coalesced / calls if calls else 0.0,
+                "timeouts": self.timeouts,
+                "in_flight": len(self._flights),
+            }
@@ -0,0 +1,310 @@
+"""
+Numbered step list -> Flowchart, in one pass.
+
+The model (or an imported file) writes steps like
+
+    1. Start
+    2. Read n
+    3. Decision: Is n > 0?
+    4. (Yes) Print n
+    5. (Yes) Go to step 3
+    6. (No) Print "done"
+    7. End
+
+StepParser keeps an explicit stack of open decisions:
+- "(Yes)/(No)/(Else) ..." attaches to the innermost open decision that can
+  take that branch. A repeated label continues the same branch while it is
+  open. A label the innermost decision already used and ended (with a go-to)
+  closes that decision (its branches merge into the enclosing branch) and
+  goes to the next decision out.
+- An unlabeled step after branches is their merge point: every open branch
+  ends in it. A decision that only got one branch gets the other one
+  straight to the merge point ("if without else").
+- "Go to step N", "go back to / return to / repeat from step N" and a bare
+  "Repeat" become edges back to that step (a bare "Repeat" goes to the
+  innermost decision), and end the branch they are on. References to
+  steps not written yet are resolved when the step arrives. A branch that
+  would go straight back to its own decision (a loop with nothing in it)
+  goes back to the step before the decision instead, with a diagnostic.
+- Start/End/decision typing matches whole words, so "Append" stays a
+  process and "Start timer" is not a terminal.
+
+Lines that can't be used are reported in `diagnostics` rather than silently
+dropped. Every line is handled in O(1) amortized time (each decision is
+pushed and closed once, each pending branch end is joined once), so 100k-line
+imports parse in linear time. The chart is usable at any point, which is
+what streaming relies on.
+
+    flowchart, diagnostics = parse_flowchart(text)
+"""
+
+import re
+
+from flowchart_model import Edge, Flowchart, Node
+
+STEP_RE = re.compile(r"^\s*(\d+)\s*[.)]\s*(?:[(\[](yes|no|else)[)\]]\s*:?|(yes|no|else)\s*:)?\s*(.*)", re.IGNORECASE)
+START_RE = re.compile(r"^(?:start|begin)(?:\s+(?:of\s+)?(?:the\s+)?(?:program|process|algorithm|flowchart))?\W*$",
+                      re.IGNORECASE)
+END_RE = re.compile(r"^(?:end|stop|exit|finish|terminate)(?:\s+(?:of\s+)?(?:the\s+)?(?:program|process|algorithm|flowchart))?\W*$",
+                    re.IGNORECASE)
+DECISION_PREFIX_RE = re.compile(r"^(?:decision|condition)\s*:\s*", re.IGNORECASE)
+GOTO_RE = re.compile(r"^(?:go\s*to|go\s+back\s+to|jump\s+to|return\s+to|loop\s+back\s+to|back\s+to|"
+                     r"repeat(?:\s+from)?|continue\s+(?:from|at))\s+(?:steps?\s+)?(\d+)\b", re.IGNORECASE)
+REPEAT_RE = re.compile(r"^repeat(?:\s+(?:until|while|again|the\s+(?:loop|process|steps?)|above\s+steps?)\b.*)?\W*$",
+                       re.IGNORECASE)
+# markdown emphasis and the like around a step's text
+STRIP_CHARS = " .*_`"
+
+BRANCH_LABELS = {"yes": "Yes", "no": "No", "else": "Else"}
+
+
+def parse_step_line(line: str):
+    """{"id", "branch", "text", "raw"} for a numbered line, else None."""
+    match = STEP_RE.match(line)
+    if not match:
+        return None
+    branch = match.group(2) or match.group(3)
+    return {
+        "id": match.group(1),
+        "branch": branch.lower() if branch else None,
+        "text": match.group(4).strip(),
+        "raw": line,
+    }
+
+
+def parse_steps(raw_text: str):
+    steps = []
+    for line in raw_text.splitlines():
+        step = parse_step_line(line)
+        if step:
+            steps.append(step)
+    return steps
+
+
+def classify(text):
+    """(node type, display text) for a step's text."""
+    bare = text.strip(STRIP_CHARS)
+    if START_RE.match(bare):
+        return "start", "Start"
+    if END_RE.match(bare):
+        return "end", "End"
+    prefix = DECISION_PREFIX_RE.match(bare)
+    if prefix:
+        return "decision", bare[prefix.end():].strip()
+    if "?" in bare:
+        return "decision", text
+    return "process", text
+
+
+class _Decision:
+    __slots__ = ("id", "branches", "current")
+
+    def __init__(self, node_id):
+        self.id = node_id
+        self.branches = {}      # label -> pending branch ends [(source id, edge label)]
+        self.current = None     # label of the branch being written
+
+
+class StepParser:
+    """
+    Builds the chart one step at a time. Feed raw lines with feed(), or
+    parsed steps with add_step(), then call finish().
+    """
+
+    def __init__(self):
+        self.flowchart = Flowchart()
+        self.diagnostics = []
+        self.ended = False
+        self._stack = []
+        self._pending = []      # ends waiting for the next step of the main flow
+        self._by_number = {}    # step number as written -> node id (first one wins)
+        self._waiting = {}      # step number -> [(source id, edge label)] of gotos to it
+        self._repeats = {}      # base id -> how many times it was reused
+        self._last_decision = None
+        self._line = 0
+
+    @property
+    def nodes(self):
+        return self.flowchart.nodes
+
+    @property
+    def open_decisions(self):
+        """Decisions still missing a branch."""
+        return [d.id for d in self._stack if len(d.branches) < 2]
+
+    def _warn(self, message, line=None):
+        self.diagnostics.append({"line": line or self._line, "message": message})
+
+    def feed(self, line):
+        """One raw line of model output or an imported file; returns the parsed step or None."""
+        self._line += 1
+        step = parse_step_line(line)
+        if step is None:
+            if line.strip():
+                self._warn(f"not a numbered step, ignored: {line.strip()[:60]!r}")
+            return None
+        self.add_step(step)
+        return step
+
+    def _unique_id(self, number):
+        # models sometimes restart numbering; keep ids unique so edges stay unambiguous
+        if number not in self.flowchart:
+            return number
+        k = self._repeats.get(number, 1) + 1
+        while f"{number}_{k}" in self.flowchart:
+            k += 1
+        self._repeats[number] = k
+        self._warn(f"step number {number} used again; kept as {number}_{k}")
+        return f"{number}_{k}"
+
+    # -- where a step attaches ---------------------------------------------
+
+    def _close(self, decision):
+        """Pending ends of every branch of a finished decision."""
+        ends = []
+        for branch_ends in decision.branches.values():
+            ends.extend(branch_ends)
+        if len(decision.branches) < 2:
+            # if without else: the missing branch goes straight on
+            missing = "No" if decision.branches and "no" not in decision.branches else "Yes"
+            ends.append((decision.id, missing if decision.branches else None))
+        return ends
+
+    def _flow_ends(self):
+        # the pending list the innermost open flow continues from
+        if self._stack:
+            top = self._stack[-1]
+            return top.branches[top.current] if top.current else None
+        return self._pending
+
+    def _pop(self):
+        ends = self._close(self._stack.pop())
+        outer = self._flow_ends()
+        if outer is None:
+            # nested decision sat directly under an outer decision with no branch open (malformed)
+            self._pending.extend(ends)
+        else:
+            outer.extend(ends)
+
+    def _attach(self, label):
+        """The pending list a step with branch `label` (or None) continues; updates the stack."""
+        if label is None:
+            while self._stack:
+                self._pop()
+            return self._pending
+
+        while self._stack:
+            top = self._stack[-1]
+            if label not in top.branches or (top.current == label and top.branches[label]):
+                break
+            self._pop()
+        if not self._stack:
+            self._warn(f"({BRANCH_LABELS[label]}) branch without an open decision; joined to the previous step")
+            return self._pending
+
+        top = self._stack[-1]
+        if top.current != label:
+            top.current = label
+            top.branches[label] = [(top.id, BRANCH_LABELS[label])]
+        return top.branches[label]
+
+    def _connect(self, ends, target):
+        for source, label in ends:
+            self.flowchart.add_edge(Edge(source, target, label))
+
+    # -- steps ---------------------------------------------------------------
+
+    def add_step(self, step):
+        text = step["text"]
+        branch = step["branch"]
+        bare = text.strip(STRIP_CHARS)
+
+        goto = GOTO_RE.match(bare)
+        if goto or REPEAT_RE.match(bare):
+            self._goto(goto.group(1) if goto else None, branch)
+            return None
+
+        ends = self._attach(branch)
+        node_type, text = classify(text)
+        node_id = self._unique_id(step["id"])
+        node = self.flowchart.add_node(Node(node_id, node_type, text, branch))
+
+        if self.flowchart.nodes[0] is not node and not ends:
+            self._warn(f"step {step['id']} can't be reached: the step before it ended its branch")
+        self._connect(ends, node_id)
+        ends.clear()
+
+        if step["id"] not in self._by_number:
+            self._by_number[step["id"]] = node_id
+            self._connect(self._waiting.pop(step["id"], ()), node_id)
+
+        if node_type == "decision":
+            self._stack.append(_Decision(node_id))
+            self._last_decision = node_id
+        elif node_type != "end":
+            ends.append((node_id, None))
+        self.ended = node_type == "end"
+        return node
+
+    def _loop_target(self, target, ends):
+        if not (len(ends) == 1 and ends[0][0] == target and self.flowchart.node(target).type == "decision"):
+            return target
+        # the branch has no steps: decision -> itself would loop without doing anything,
+        # what's meant is going round again from the step that leads to the decision
+        feeds = [edge.source for edge in self.flowchart.in_edges(target) if edge.source != target]
+        if len(feeds) == 1:
+            self._warn(f"branch of decision {target} goes straight back to it; looped to step {feeds[0]} before it")
+            return feeds[0]
+        self._warn(f"branch of decision {target} goes straight back to it")
+        return target
+
+    def _goto(self, number, branch):
+        ends = self._attach(branch)
+        if number is None:
+            # bare "Repeat": back to the loop's condition
+            target = self._stack[-1].id if self._stack else self._last_decision
+            if target is None:
+                self._warn("'Repeat' with no decision to go back to; ignored")
+                return
+            self._connect(ends, self._loop_target(target, ends))
+        elif number in self._by_number:
+            self._connect(ends, self._loop_target(self._by_number[number], ends))
+        else:
+            self._waiting.setdefault(number, []).extend(ends)
+        ends.clear()
+        self.ended = False
+
+    def complete(self):
+        """Last step was End, every decision got both of its branches and every goto landed."""
+        return self.ended and not self.open_decisions and not self._waiting
+
+    def finish(self):
+        """Report whatever is still unresolved; returns the diagnostics."""
+        for number in self._waiting:
+            self._warn(f"'go to step {number}' points at a step that doesn't exist")
+        self._waiting = {}
+        for decision in self._stack:
+            if len(decision.branches) < 2:
+                self._warn(f"decision {decision.id} has only {len(decision.branches)} branch(es)")
+        if not any(node.type == "end" for node in self.flowchart.nodes):
+            self._warn("no End step")
+        return self.diagnostics
+
+    def snapshot(self):
+        return self.flowchart.to_dict()
+
+
+def parse_flowchart(text):
+    """(flowchart dict, diagnostics) for a whole step list."""
+    parser = StepParser()
+    for line in text.splitlines():
+        parser.feed(line)
+    parser.finish()
+    return parser.snapshot(), parser.diagnostics
+
+
+def build_flowchart(steps):
+    parser = StepParser()
+    for step in steps:
+        parser.add_step(step)
+    return parser.snapshot()
@@ -0,0 +1,229 @@
+"""
+Streaming SVG output for flowcharts.
+
+The document is produced as a sequence of string chunks, so it can be joined
+once, written straight to a file, or handed to an HTTP response as an
+iterable body. Styling lives in one <style> block of short classes instead
+of being repeated on every element. Numbers go through `fmt`, so identical
+input always gives byte-identical output.
+"""
+
+from html import escape
+
+from edge_routing import route_edges
+from text_metrics import LINE_HEIGHT, measure_node
+
+FONT_FAMILY = "'Segoe UI', sans-serif"
+
+DEFS = (
+    '<defs>'
+    '<marker id="arrow" markerWidth="12" markerHeight="12" refX="10" refY="3" '
+    'orient="auto" markerUnits="strokeWidth"><path d="M0,0 L0,6 L9,3 z" fill="#a0a0a0"/></marker>'
+    '<filter id="glow" x="-20%" y="-20%" width="140%" height="140%">'
+    '<feGaussianBlur stdDeviation="2" result="blur"/>'
+    '<feComposite in="SourceGraphic" in2="blur" operator="over"/></filter>'
+    '<linearGradient id="nodeGrad" x1="0%" y1="0%" x2="100%" y2="100%">'
+    '<stop offset="0%" stop-color="#2b313e"/><stop offset="100%" stop-color="#1e2330"/>'
+    '</linearGradient>'
+    '</defs>'
+)
+
+STYLE = (
+    '<style>'
+    '.e{stroke:#a0a0a0;stroke-width:2;fill:none;marker-end:url(#arrow)}'
+    '.e.y{stroke:#4caf50}.e.n{stroke:#ff5252}'
+    '.lb{fill:#0e1117}'
+    '.lt{fill:#a0a0a0;text-anchor:middle;font-size:11px;font-weight:bold}'
+    '.lt.y{fill:#4caf50}.lt.n{fill:#ff5252}'
+    '.nd{stroke:#4fd1c5;stroke-width:2;fill:url(#nodeGrad)}'
+    '.nd.t{stroke:#f6e05e;filter:url(#glow)}.nd.d{stroke:#ff79c6}'
+    '.nd.c{stroke:#8b949e;stroke-dasharray:6 4}'
+    '.tx{fill:white;text-anchor:middle;font-size:14px;font-weight:500}'
+    '</style>'
+)
+
+
+def fmt(value):
+    """Shortest stable text for a coordinate: 2 decimals max, no trailing zeros."""
+    if value == int(value):
+        return str(int(value))
+    text = f"{value:.2f}".rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def edge_class(label):
+    # same precedence as before: "No" wins over "Yes" when both appear
+    if not label:
+        return ""      # str(None) contains "No", which made every unlabeled edge red
+    label = str(label)
+    if "No" in label:
+        return "n"
+    if "Yes" in label:
+        return "y"
+    return ""
+
+
+def canvas_size(positions, routes=None):
+    """(width, height, x_offset) of the SVG canvas for a set of positions (and edge routes)."""
+    max_y = max((p["y"] for p in positions.values()), default=800) + 150
+    min_x = min((p["x"] for p in positions.values()), default=0) - 100
+    max_x = max((p["x"] for p in positions.values()), default=1000) + 100
+    if routes:
+        # loop lanes can run outside the outermost boxes
+        xs = [x for route in routes.values() for x, _ in route.points]
+        min_x = min(min_x, min(xs) - 40)
+        max_x = max(max_x, max(xs) + 40)
+    x_offset = abs(min(0, min_x))
+    return max(1000, max_x) + x_offset, max_y, x_offset
+
+
+def path_data(points, x_offset):
+    """Compact orthogonal path: M then H/V for axis-aligned steps."""
+    x, y = points[0]
+    parts = [f"M{fmt(x + x_offset)},{fmt(y)}"]
+    for nx, ny in points[1:]:
+        if nx == x:
+            parts.append(f"V{fmt(ny)}")
+        elif ny == y:
+            parts.append(f"H{fmt(nx + x_offset)}")
+        else:
+            parts.append(f"L{fmt(nx + x_offset)},{fmt(ny)}")
+        x, y = nx, ny
+    return "".join(parts)
+
+
+def edge_chunks(edge, route, x_offset):
+    cls = edge_class(edge.label)
+    extra = " " + cls if cls else ""
+    yield f'<path class="e{extra}" d="{path_data(route.points, x_offset)}"/>'
+
+    if edge.label:
+        mx, my, w, h = route.label
+        mx += x_offset
+        yield (f'<rect class="lb" x="{fmt(mx - w / 2)}" y="{fmt(my - h / 2)}" width="{fmt(w)}" height="{fmt(h)}" rx="4"/>'
+               f'<text class="lt{extra}" x="{fmt(mx)}" y="{fmt(my + 4)}">{escape(str(edge.label))}</text>')
+
+
+def node_chunks(node, pos, x_offset):
+    x, y = pos["x"] + x_offset, pos["y"]
+    metrics = measure_node(node.text, node.type)
+    text_lines = metrics.lines
+    width = pos.get("width", metrics.width)
+    height = pos.get("height", metrics.height)
+    half_w, half_h = width / 2, height / 2
+
+    if node.type in ("start", "end"):
+        yield (f'<rect class="nd t" x="{fmt(x - half_w)}" y="{fmt(y - half_h)}" rx="25" ry="25" '
+               f'width="{fmt(width)}" height="{fmt(height)}"/>')
+    elif node.type == "decision":
+        yield (f'<path class="nd d" d="M{fmt(x)},{fmt(y - half_h)} L{fmt(x + half_w)},{fmt(y)} '
+               f'L{fmt(x)},{fmt(y + half_h)} L{fmt(x - half_w)},{fmt(y)} Z"/>')
+    elif node.type == "cluster":
+        # collapsed group of steps (see clustering.py)
+        yield (f'<rect class="nd c" x="{fmt(x - half_w)}" y="{fmt(y - half_h)}" rx="6" '
+               f'width="{fmt(width)}" height="{fmt(height)}"/>')
+    else:
+        yield (f'<rect class="nd" x="{fmt(x - half_w)}" y="{fmt(y - half_h)}" rx="6" '
+               f'width="{fmt(width)}" height="{fmt(height)}"/>')
+
+    start_text_y = y - ((len(text_lines) - 1) * LINE_HEIGHT) / 2 + 5
+    for i, line in enumerate(text_lines):
+        yield f'<text class="tx" x="{fmt(x)}" y="{fmt(start_text_y + i * LINE_HEIGHT)}">{escape(line)}</text>'
+
+
+class FragmentCache:
+    """
+    SVG text per element, keyed by everything that affects it (content and
+    coordinates), for re-rendering an edited chart. Only elements that
+    changed or moved get formatted again. Entries the latest render did not
+    use are dropped, so the cache stays the size of one chart.
+    """
+
+    def __init__(self):
+        self._current = {}
+        self._previous = {}
+        self.reused = 0
+        self.rendered = 0
+
+    def start_render(self):
+        self._previous, self._current = self._current, {}
+        self.reused = self.rendered = 0
+
+    def get(self, key, make):
+        text = self._current.get(key)
+        if text is None:
+            text = self._previous.pop(key, None)
+            if text is None:
+                text = "".join(make())
+                self.rendered += 1
+            else:
+                self.reused += 1
+            self._current[key] = text
+        return text
+
+
+def _edge_key(edge, route, x_offset):
+    # the route already reflects the boxes around the edge, not just its two ends
+    return ("e", edge.label, x_offset, route.points, route.label)
+
+
+def _node_key(node, pos, x_offset):
+    return ("n", node.type, node.text, x_offset, pos["x"], pos["y"], pos.get("width"), pos.get("height"))
+
+
+def iter_svg(fc, positions, background=None, fragments=None, routes=None):
+    """
+    Yield the SVG document for a laid-out Flowchart chunk by chunk.
+    With a FragmentCache as `fragments`, unchanged elements reuse their text
+    from the previous render. `routes` comes from edge_routing.route_edges
+    and is computed here when not given.
+    """
+    if routes is None:
+        routes = route_edges(fc, positions)
+    width, height, x_offset = canvas_size(positions, routes)
+
+    yield (f'<svg xmlns="http://www.w3.org/2000/svg" width="{fmt(width)}" height="{fmt(height)}" '
+           f'style="font-family: {FONT_FAMILY};">')
+    yield DEFS
+    yield STYLE
+    if background:
+        yield f'<rect x="0" y="0" width="100%" height="100%" fill="{escape(background)}"/>'
+
+    if fragments is not None:
+        fragments.start_render()
+        for index, edge in enumerate(fc.edges):
+            route = routes.get(index)
+            if route is not None:
+                yield fragments.get(_edge_key(edge, route, x_offset),
+                                    lambda: edge_chunks(edge, route, x_offset))
+        for node in fc.nodes:
+            pos = positions[node.id]
+            yield fragments.get(_node_key(node, pos, x_offset), lambda: node_chunks(node, pos, x_offset))
+    else:
+        for index, edge in enumerate(fc.edges):
+            route = routes.get(index)
+            if route is not None:
+                yield from edge_chunks(edge, route, x_offset)
+
+        for node in fc.nodes:
+            yield from node_chunks(node, positions[node.id], x_offset)
+
+    yield "</svg>"
+
+
+def write_svg(fc, positions, sink, background=None, chunk_size=64 * 1024, fragments=None, routes=None):
+    """
+    Write the SVG into any object with .write(str) (open file, socket wrapper,
+    response stream). Small chunks are batched up to `chunk_size` characters.
+    """
+    pending = []
+    pending_len = 0
+    for chunk in iter_svg(fc, positions, background, fragments, routes):
+        pending.append(chunk)
+        pending_len += len(chunk)
+        if pending_len >= chunk_size:
+            sink.write("".join(pending))
+            pending = []
+            pending_len = 0
+    if pending:
+        sink.write("".join(pending))
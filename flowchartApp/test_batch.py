@@ -0,0 +1,23 @@
+import sqlite3
+
+import batch
+
+
+def test_batch_saves_charts_to_library(fake_ollama, isolated_storage, tmp_path):
+    items = [{"prompt": p, "id": None} for p in ("even or odd", "bubble sort a list", "factorial of n")]
+    summary = batch.run_batch(items, str(tmp_path / "out"), concurrency=2, log=lambda *_: None)
+    assert summary["generated"] == 3
+
+    # read the file as a new process would, without the writer thread's connection
+    conn = sqlite3.connect(isolated_storage.path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0] == 3
+    finally:
+        conn.close()
+
+
+def test_batch_without_library_saves_nothing(fake_ollama, isolated_storage, tmp_path):
+    items = [{"prompt": "even or odd", "id": None}]
+    summary = batch.run_batch(items, str(tmp_path / "out"), save=False, log=lambda *_: None)
+    assert summary["generated"] == 1
+    assert isolated_storage.stats()["generations"] == 0
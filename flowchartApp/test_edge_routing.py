@@ -0,0 +1,48 @@
+from edge_routing import route_edges
+from fake_ollama import synthetic_steps
+from flowchart_layout import layered_layout
+from flowchart_model import Flowchart
+from step_parser import parse_flowchart
+
+LOOP = """1. Start
+2. Read n
+3. Decision: Is n > 0?
+4. (Yes) Print n
+5. (Yes) Go to step 3
+6. (No) Print "done"
+7. End"""
+
+
+def on_box(point, pos, slack=1):
+    x, y = point
+    return (abs(x - pos["x"]) <= pos["width"] / 2 + slack
+            and abs(y - pos["y"]) <= pos["height"] / 2 + slack)
+
+
+def route(text):
+    fc = Flowchart.coerce(parse_flowchart(text)[0])
+    positions = layered_layout(fc)
+    return fc, positions, route_edges(fc, positions)
+
+
+def test_every_edge_is_routed_orthogonally():
+    fc, positions, routes = route(LOOP)
+    assert set(routes) == set(range(len(fc.edges)))
+    for index, edge in enumerate(fc.edges):
+        points = routes[index].points
+        assert len(points) >= 2
+        assert on_box(points[0], positions[edge.source])
+        assert on_box(points[-1], positions[edge.target])
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            assert x0 == x1 or y0 == y1
+
+
+def test_labels_are_placed_for_labelled_edges():
+    fc, _, routes = route(LOOP)
+    for index, edge in enumerate(fc.edges):
+        assert (routes[index].label is not None) == bool(edge.label)
+
+
+def test_large_chart():
+    fc, _, routes = route(synthetic_steps(1000, seed=3))
+    assert len(routes) == len(fc.edges)
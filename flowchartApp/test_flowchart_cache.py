@@ -0,0 +1,45 @@
+import time
+
+from flowchart_cache import FlowchartCache, make_cache_key
+
+CHART = {"nodes": [{"id": "1", "type": "start", "text": "Start"}], "edges": []}
+
+
+def test_put_get_and_normalized_key(tmp_path):
+    cache = FlowchartCache(directory=str(tmp_path))
+    key = make_cache_key("Sort a list of numbers", "llama3", 1)
+    assert cache.get(key) is None
+    cache.put(key, CHART)
+    assert cache.get(make_cache_key("  sort a LIST of   numbers?", "llama3", 1)) == CHART
+    assert make_cache_key("Sort a list of numbers", "llama3", 2) != key
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_memory_lru_and_disk_tier(tmp_path):
+    cache = FlowchartCache(directory=str(tmp_path), max_memory=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, {"key": key})
+    assert cache.stats()["evictions"] == 1
+    # evicted from memory, still on disk
+    assert cache.get("a") == {"key": "a"}
+    assert cache.stats()["disk_hits"] == 1
+    # a new instance (a restart) reads the disk tier
+    assert FlowchartCache(directory=str(tmp_path)).get("c") == {"key": "c"}
+
+
+def test_expired_entries_are_misses(tmp_path, monkeypatch):
+    cache = FlowchartCache(directory=str(tmp_path), ttl=60)
+    cache.put("a", CHART)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    assert cache.get("a") is None
+    assert FlowchartCache(directory=str(tmp_path), ttl=60).get("a") is None
+
+
+def test_clear(tmp_path):
+    cache = FlowchartCache(directory=str(tmp_path))
+    cache.put("a", CHART)
+    cache.clear()
+    assert cache.get("a") is None
+    assert cache.stats()["memory_entries"] == 0
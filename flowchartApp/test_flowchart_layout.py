@@ -0,0 +1,51 @@
+from fake_ollama import synthetic_steps
+from flowchart_layout import layered_layout
+from flowchart_model import Flowchart
+from step_parser import parse_flowchart
+
+LOOP = """1. Start
+2. Read n
+3. Decision: Is n > 0?
+4. (Yes) Print n
+5. (Yes) Go to step 3
+6. (No) Print "done"
+7. End"""
+
+
+def overlapping(a, b):
+    return (abs(a["x"] - b["x"]) < (a["width"] + b["width"]) / 2
+            and abs(a["y"] - b["y"]) < (a["height"] + b["height"]) / 2)
+
+
+def check(chart):
+    fc = Flowchart.coerce(chart)
+    positions = layered_layout(fc)
+    assert set(positions) == {n.id for n in fc.nodes}
+    boxes = sorted(positions.values(), key=lambda p: p["y"])
+    for i, a in enumerate(boxes):
+        for b in boxes[i + 1:]:
+            if b["y"] - b["height"] / 2 >= a["y"] + a["height"] / 2:
+                break
+            assert not overlapping(a, b)
+    return fc, positions
+
+
+def test_loop_chart():
+    fc, positions = check(parse_flowchart(LOOP)[0])
+    # the loop body sits below its condition, the exit below the loop
+    assert positions["4"]["y"] > positions["3"]["y"]
+    assert positions["7"]["y"] > positions["6"]["y"] > positions["3"]["y"]
+
+
+def test_large_synthetic_chart():
+    chart, _ = parse_flowchart(synthetic_steps(2000, seed=1))
+    check(chart)
+
+
+def test_memo_gives_the_same_layout():
+    chart, _ = parse_flowchart(synthetic_steps(300, seed=2))
+    memo = {}
+    first = layered_layout(chart, memo=memo)
+    assert memo
+    assert layered_layout(chart, memo=memo) == first
+    assert layered_layout({"nodes": [], "edges": []}) == {}
@@ -0,0 +1,49 @@
+from flowchart_library import FlowchartLibrary
+from flowchart_model import Flowchart
+from step_parser import parse_flowchart
+
+STEPS = """1. Start
+2. Read the invoice total
+3. Decision: Is the total over 1000?
+4. (Yes) Ask a manager to approve
+5. (No) Pay the invoice
+6. End"""
+
+
+def test_save_flush_get_round_trip(tmp_path):
+    library = FlowchartLibrary(str(tmp_path / "library.db"), batch_delay=0.01)
+    chart, _ = parse_flowchart(STEPS)
+    chart_hash = library.save(chart, "Approve an invoice", model="llama3", svg="<svg/>")
+    assert library.flush(timeout=5)
+
+    stored = library.get(chart_hash)
+    assert stored["flowchart"] == Flowchart.coerce(chart).to_dict()
+    assert stored["svg"] == "<svg/>"
+    assert stored["node_count"] == 6
+    assert [p["prompt"] for p in stored["prompts"]] == ["Approve an invoice"]
+    assert library.get("0" * 64) is None
+
+
+def test_same_chart_from_two_prompts_is_stored_once(tmp_path):
+    library = FlowchartLibrary(str(tmp_path / "library.db"), batch_delay=0.01)
+    chart, _ = parse_flowchart(STEPS)
+    first = library.save(chart, "Approve an invoice", svg="<svg/>")
+    second = library.save(chart, "Invoice approval process", svg="<svg/>")
+    assert library.flush(timeout=5)
+    assert first == second
+    stats = library.stats()
+    assert (stats["charts"], stats["generations"]) == (1, 2)
+    assert len(library.get(first)["prompts"]) == 2
+
+
+def test_search_matches_prompts_and_steps(tmp_path):
+    library = FlowchartLibrary(str(tmp_path / "library.db"), batch_delay=0.01)
+    chart_hash = library.save(parse_flowchart(STEPS)[0], "Approve an invoice", svg="<svg/>")
+    library.save({"nodes": [{"id": "1", "type": "start", "text": "Start"}], "edges": []},
+                 "Empty chart", svg="<svg/>")
+    assert library.flush(timeout=5)
+
+    assert [r["hash"] for r in library.search("invoice")] == [chart_hash]
+    assert [r["hash"] for r in library.search("manager")] == [chart_hash]
+    assert library.search("nothing like this") == []
+    assert len(library.recent()) == 2
@@ -0,0 +1,30 @@
+import pytest
+
+from api import _load_chart
+from flowchart_model import Flowchart, content_hash
+
+CHART = {
+    "nodes": [{"id": "1", "type": "start", "text": "Start"},
+              {"id": "2", "type": "process", "text": "Read n"},
+              {"id": "3", "type": "end", "text": "End"}],
+    "edges": [{"from": "1", "to": "2"}, {"from": "2", "to": "3"}],
+}
+
+
+def test_round_trip():
+    fc = Flowchart.from_dict(CHART)
+    assert [n.id for n in fc.nodes] == ["1", "2", "3"]
+    assert Flowchart.from_dict(fc.to_dict()).to_dict() == fc.to_dict()
+    assert content_hash(fc) == content_hash(Flowchart.from_dict(fc.to_dict()))
+
+
+def test_duplicate_node_id_is_rejected():
+    chart = dict(CHART, nodes=CHART["nodes"] + [{"id": "2", "type": "process", "text": "Other"}])
+    with pytest.raises(ValueError, match="duplicate node id '2'"):
+        Flowchart.from_dict(chart)
+
+
+def test_api_rejects_duplicate_node_ids():
+    body = b'{"nodes": [{"id": "1", "text": "a"}, {"id": "1", "text": "b"}], "edges": []}'
+    with pytest.raises(ValueError, match="duplicate node id"):
+        _load_chart(body, "application/json")
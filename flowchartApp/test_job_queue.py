@@ -0,0 +1,74 @@
+import threading
+import time
+
+from job_queue import CANCELLED, DONE, FINISHED, RUNNING, JobQueue
+
+CHART = {"nodes": [{"id": "1", "type": "start", "text": "Start"}], "edges": []}
+
+
+class SilentBackend:
+    """A generation that yields nothing until released, like a stalled Ollama."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.closed = threading.Event()
+
+    def generate(self, prompt, profile=None):
+        try:
+            if prompt == "silent":
+                self.release.wait(10)
+            yield CHART
+        finally:
+            self.closed.set()
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_cancel_while_backend_is_silent():
+    backend = SilentBackend()
+    jobs = JobQueue(workers=1, generate=backend.generate)
+    try:
+        job_id = jobs.submit("silent")
+        assert _wait_for(lambda: jobs.get(job_id).status == RUNNING)
+
+        cancelled_at = time.monotonic()
+        assert jobs.cancel(job_id)
+        assert _wait_for(lambda: jobs.get(job_id).status in FINISHED, timeout=1.0)
+        assert time.monotonic() - cancelled_at < 0.5
+        assert jobs.get(job_id).status == CANCELLED
+
+        # the worker is free again while the stalled stream is still open
+        other = jobs.submit("quick")
+        assert _wait_for(lambda: jobs.get(other).status == DONE)
+        assert jobs.get(other).result == CHART
+
+        # and the stalled stream is closed once the backend speaks again
+        backend.release.set()
+        assert backend.closed.wait(2)
+    finally:
+        backend.release.set()
+        jobs.stop()
+
+
+def test_job_result_and_failure():
+    def generate(prompt, profile=None):
+        if prompt == "bad":
+            raise ValueError("AI did not return a valid step list")
+        yield {"nodes": [], "edges": []}
+        yield CHART
+
+    jobs = JobQueue(workers=1, generate=generate)
+    try:
+        ok, bad = jobs.submit("good"), jobs.submit("bad")
+        assert _wait_for(lambda: jobs.get(ok).status in FINISHED and jobs.get(bad).status in FINISHED)
+        assert jobs.get(ok).result == CHART
+        assert jobs.get(bad).error == "AI did not return a valid step list"
+    finally:
+        jobs.stop()
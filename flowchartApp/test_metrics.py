@@ -0,0 +1,30 @@
+import json
+import logging
+
+import metrics
+
+
+def test_trace_log_writes_json_lines(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "_trace_log_handler", None)
+    monkeypatch.setattr(metrics.logger, "handlers", [])
+    monkeypatch.setattr(metrics.logger, "propagate", True)
+    monkeypatch.setattr(metrics.logger, "level", logging.NOTSET)
+    path = tmp_path / "traces.jsonl"
+    handler = metrics.enable_trace_log(str(path))
+    assert metrics.enable_trace_log(str(path)) is handler
+
+    with metrics.start_trace(model="phi3"):
+        metrics.add_stage_time("layout", 0.25)
+    handler.flush()
+    handler.close()
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 1
+    record = json.loads(lines[0])
+    assert record["model"] == "phi3"
+    assert record["stages_s"] == {"layout": 0.25}
+    assert record["outcome"] == "ok"
+
+
+def test_trace_log_off_by_default():
+    assert metrics.enable_trace_log("") is None
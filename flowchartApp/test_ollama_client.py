@@ -0,0 +1,100 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import ollama_client
+from ollama_client import OllamaClient, OllamaConnectError, OllamaHTTPError
+
+
+class Scripted(ThreadingHTTPServer):
+    """Answers each request with the next status from `statuses` (0 = drop the connection)."""
+
+    daemon_threads = True
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+        super().__init__(("127.0.0.1", 0), Handler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _answer(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        self.server.calls += 1
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        if status == 0:
+            self.close_connection = True
+            self.connection.close()
+            return
+        body = json.dumps({"models": []} if self.command == "GET" else {"response": "1. Start", "done": True})
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode("utf-8"))
+
+    do_GET = do_POST = _answer
+
+
+@pytest.fixture
+def scripted(monkeypatch):
+    monkeypatch.setattr(ollama_client, "backoff_delay", lambda attempt: 0)
+    servers = []
+
+    def start(*statuses):
+        server = Scripted(statuses)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_generate_is_not_resent_after_a_gateway_error(scripted):
+    server = scripted(502, 200)
+    with pytest.raises(OllamaHTTPError):
+        OllamaClient(host=server.url, max_retries=3).generate("p", "phi3")
+    assert server.calls == 1
+
+
+def test_generate_is_not_resent_after_a_disconnect(scripted):
+    server = scripted(0, 200)
+    with pytest.raises(OllamaConnectError):
+        OllamaClient(host=server.url, max_retries=3).generate("p", "phi3")
+    assert server.calls == 1
+
+
+def test_generate_retries_503(scripted):
+    server = scripted(503, 503, 200)
+    assert OllamaClient(host=server.url, max_retries=3).generate("p", "phi3")["response"] == "1. Start"
+    assert server.calls == 3
+
+
+def test_tags_retries_gateway_errors(scripted):
+    server = scripted(502, 504, 200)
+    assert OllamaClient(host=server.url, max_retries=3).tags() == {"models": []}
+    assert server.calls == 3
+
+
+def test_refused_connection_is_retried(monkeypatch):
+    monkeypatch.setattr(ollama_client, "backoff_delay", lambda attempt: 0)
+    attempts = []
+    client = OllamaClient(host="http://127.0.0.1:9", max_retries=2)
+    original = client.session.request
+    monkeypatch.setattr(client.session, "request", lambda *a, **k: attempts.append(1) or original(*a, **k))
+    with pytest.raises(OllamaConnectError):
+        client.generate("p", "phi3")
+    assert len(attempts) == 3
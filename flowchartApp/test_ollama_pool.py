@@ -0,0 +1,62 @@
+from ollama_client import OllamaHTTPError
+from ollama_pool import Endpoint, OllamaPool
+
+
+class BrokenGenerate:
+    """/api/tags answers, /api/generate fails with a 500."""
+
+    def tags(self):
+        return {"models": [{"name": "phi3:latest"}]}
+
+    def generate(self, prompt, model, options=None, keep_alive=None):
+        raise OllamaHTTPError(500, "out of memory")
+
+    def close(self):
+        pass
+
+
+class DownHost(BrokenGenerate):
+    def tags(self):
+        raise OllamaHTTPError(503, "loading")
+
+
+def _pool(client, cooldown=30):
+    pool = OllamaPool([Endpoint("http://gpu1", "phi3", client=client)], cooldown=cooldown,
+                      failures_to_eject=2, start_health_thread=False)
+    pool._probe_clients["http://gpu1"] = client
+    return pool
+
+
+def test_passing_probe_keeps_request_ejection():
+    pool = _pool(BrokenGenerate())
+    endpoint = pool.endpoints[0]
+    for _ in range(2):
+        try:
+            pool.generate("p", "phi3")
+        except OllamaHTTPError:
+            pass
+    assert endpoint.ejected_for == "requests"
+    assert pool.check_health() == {"http://gpu1": True}
+    assert not pool.status()[0]["healthy"]
+
+
+def test_passing_probe_ends_probe_ejection():
+    client = DownHost()
+    pool = _pool(client)
+    assert pool.check_health() == {"http://gpu1": False}
+    assert not pool.status()[0]["healthy"]
+    client.tags = BrokenGenerate().tags
+    pool.check_health()
+    assert pool.status()[0]["healthy"]
+
+
+def test_request_ejection_ends_after_cooldown():
+    pool = _pool(BrokenGenerate(), cooldown=0)
+    for _ in range(2):
+        try:
+            pool.generate("p", "phi3")
+        except OllamaHTTPError:
+            pass
+    pool.check_health()
+    assert pool.status()[0]["healthy"]
+    assert pool.endpoints[0].ejected_for is None
@@ -0,0 +1,52 @@
+import threading
+import time
+
+from single_flight import SingleFlight
+
+
+def _follow_stream(flights, key, out):
+    out.extend(flights.stream(key, lambda: iter(["never used"])))
+
+
+def test_stream_follower_of_do_leader_gets_result():
+    flights = SingleFlight(timeout=5)
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(0.2)
+        return {"nodes": [1, 2]}
+
+    leader = threading.Thread(target=lambda: flights.do("k", slow))
+    leader.start()
+    started.wait(1)
+    got = []
+    follower = threading.Thread(target=_follow_stream, args=(flights, "k", got))
+    follower.start()
+    leader.join(2)
+    follower.join(2)
+    assert got == [{"nodes": [1, 2]}]
+
+
+def test_do_follower_of_stream_leader_gets_last_value():
+    flights = SingleFlight(timeout=5)
+    release = threading.Event()
+
+    def produce():
+        yield 1
+        release.wait(1)
+        yield 2
+
+    seen = []
+    leader = threading.Thread(target=lambda: seen.extend(flights.stream("k", produce)))
+    leader.start()
+    time.sleep(0.05)
+    result = []
+    follower = threading.Thread(target=lambda: result.append(flights.do("k", lambda: "unused")))
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join(2)
+    follower.join(2)
+    assert result == [2]
+    assert seen[-1] == 2 and seen.count(2) == 1
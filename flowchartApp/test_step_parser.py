@@ -0,0 +1,104 @@
+from step_parser import classify, parse_flowchart
+
+
+def edges(chart):
+    return {(e["from"], e["to"], e["label"]) for e in chart["edges"]}
+
+
+def types(chart):
+    return {n["id"]: n["type"] for n in chart["nodes"]}
+
+
+def test_loop_with_goto():
+    chart, diagnostics = parse_flowchart("""1. Start
+2. Read n
+3. Decision: Is n > 0?
+4. (Yes) Print n
+5. (Yes) Go to step 3
+6. (No) Print "done"
+7. End""")
+    assert diagnostics == []
+    assert types(chart)["3"] == "decision"
+    assert edges(chart) == {("1", "2", None), ("2", "3", None), ("3", "4", "Yes"), ("4", "3", None),
+                            ("3", "6", "No"), ("6", "7", None)}
+
+
+def test_forward_goto_is_resolved_when_the_step_arrives():
+    chart, diagnostics = parse_flowchart("""1. Start
+2. Is x valid?
+3. (No) Go to step 5
+4. (Yes) Print x
+5. End""")
+    assert diagnostics == []
+    assert ("2", "5", "No") in edges(chart)
+
+
+def test_nested_decisions():
+    chart, diagnostics = parse_flowchart("""1. Start
+2. Read n
+3. Is n > 0?
+4. (Yes) Is n even?
+5. (No) Print odd
+6. (Yes) Print even
+7. (No) Print "not positive"
+8. End""")
+    assert diagnostics == []
+    assert edges(chart) == {("1", "2", None), ("2", "3", None), ("3", "4", "Yes"), ("4", "5", "No"),
+                            ("4", "6", "Yes"), ("3", "7", "No"), ("5", "8", None), ("6", "8", None),
+                            ("7", "8", None)}
+
+
+def test_outer_branch_after_inner_branch_loops_back():
+    # the inner No ends with a goto; the next (No) belongs to the outer decision
+    chart, diagnostics = parse_flowchart("""1. Start
+2. Read n
+3. Decision: Is n > 0?
+4. (Yes) Decision: Is n even?
+5. (Yes) Print "even"
+6. (No) Go to step 3
+7. (No) Print "not positive"
+8. End""")
+    assert diagnostics == []
+    assert {("4", "3", "No"), ("3", "7", "No"), ("5", "8", None), ("7", "8", None)} <= edges(chart)
+
+
+def test_branch_straight_back_to_its_decision_is_not_a_self_loop():
+    chart, diagnostics = parse_flowchart("""1. Start
+2. Is x valid?
+3. (No) Is retry allowed?
+4. (Yes) Go to step 2
+5. (No) Go to step 3
+6. (Yes) Print x
+7. End""")
+    assert all(e["from"] != e["to"] for e in chart["edges"])
+    assert ("3", "2", "No") in edges(chart)
+    assert [d["line"] for d in diagnostics] == [5]
+
+
+def test_else_and_bare_repeat():
+    chart, diagnostics = parse_flowchart("""1. Start
+2. Is i < 10?
+3. (Yes) Add 1 to i
+4. (Yes) Repeat
+5. (Else) Print i
+6. End""")
+    assert diagnostics == []
+    assert edges(chart) == {("1", "2", None), ("2", "3", "Yes"), ("3", "2", None), ("2", "5", "Else"),
+                            ("5", "6", None)}
+
+
+def test_unreachable_step_is_reported():
+    _, diagnostics = parse_flowchart("""1. Start
+2. Go to step 1
+3. Print x
+4. End""")
+    assert [d["line"] for d in diagnostics] == [3]
+
+
+def test_whole_word_typing():
+    assert classify("Append x to the list") == ("process", "Append x to the list")
+    assert classify("Start timer")[0] == "process"
+    assert classify("Ending balance = 0")[0] == "process"
+    assert classify("Start") == ("start", "Start")
+    assert classify("Stop.") == ("end", "End")
+    assert classify("Decision: n > 0") == ("decision", "n > 0")
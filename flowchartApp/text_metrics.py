@@ -0,0 +1,150 @@
+"""
+Text measurement for node sizing.
+
+Widths come from per-glyph advance tables (units per 1000 em) rather than
+character counts, so "WWWW" and "iiii" no longer get the same box. Results
+are memoized in bounded LRU caches keyed by (text, font, size, max width);
+layout and rendering share them, so each label is wrapped once.
+"""
+
+from functools import lru_cache
+
+TEXT_CACHE_SIZE = 8192
+
+# Helvetica/Arial advance widths; close enough to Segoe UI (the CSS font)
+# for box sizing, and available everywhere the SVG ends up.
+_SANS_ASCII = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,  # ' ' .. '/'
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556,                                # '0' .. '9'
+    278, 278, 584, 584, 584, 556, 1015,                                              # ':' .. '@'
+    667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833,                 # 'A' .. 'M'
+    722, 778, 667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611,                 # 'N' .. 'Z'
+    278, 278, 278, 469, 556, 333,                                                    # '[' .. '`'
+    556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833,                 # 'a' .. 'm'
+    556, 556, 556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500,                 # 'n' .. 'z'
+    334, 260, 334, 584,                                                              # '{' .. '~'
+)
+
+FONTS = {
+    "sans": {chr(32 + i): w for i, w in enumerate(_SANS_ASCII)},
+}
+FONT_ALIASES = {"segoe ui": "sans", "sans-serif": "sans", "arial": "sans", "helvetica": "sans"}
+DEFAULT_FONT = "sans"
+
+DEFAULT_ADVANCE = 556
+WIDE_ADVANCE = 1000
+BOLD_FACTOR = 1.05
+
+NODE_FONT_SIZE = 14
+LINE_HEIGHT = 18
+MIN_BOX_HEIGHT = 40
+DECISION_EXTRA_HEIGHT = 20
+
+# per node type: smallest box width, widest a line may get, horizontal padding
+NODE_BOXES = {
+    "start": (160, 140, 40),
+    "end": (160, 140, 40),
+    "decision": (200, 140, 80),
+    "process": (180, 160, 24),
+}
+
+
+def _font_table(font):
+    key = FONT_ALIASES.get(font.lower(), font.lower())
+    return FONTS.get(key, FONTS[DEFAULT_FONT])
+
+
+def _advance(table, ch):
+    width = table.get(ch)
+    if width is not None:
+        return width
+    # CJK, emoji and other full-width glyphs
+    return WIDE_ADVANCE if ord(ch) >= 0x1100 else DEFAULT_ADVANCE
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def text_width(text, font=DEFAULT_FONT, size=NODE_FONT_SIZE, bold=False):
+    """Rendered width of a single line in px."""
+    table = _font_table(font)
+    units = sum(_advance(table, ch) for ch in text)
+    width = units * size / 1000
+    return width * BOLD_FACTOR if bold else width
+
+
+def _split_long_word(word, font, size, max_width):
+    parts = []
+    current = ""
+    for ch in word:
+        if current and text_width(current + ch, font, size) > max_width:
+            parts.append(current)
+            current = ch
+        else:
+            current += ch
+    if current:
+        parts.append(current)
+    return parts
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def wrap_lines(text, font=DEFAULT_FONT, size=NODE_FONT_SIZE, max_width=160):
+    """Greedy word wrap by measured width. Returns a tuple of lines."""
+    lines = []
+    current = ""
+    space = text_width(" ", font, size)
+    current_width = 0.0
+
+    for word in text.split():
+        word_width = text_width(word, font, size)
+        if word_width > max_width:
+            if current:
+                lines.append(current)
+            *full, current = _split_long_word(word, font, size, max_width)
+            lines.extend(full)
+            current_width = text_width(current, font, size)
+            continue
+        if not current:
+            current, current_width = word, word_width
+        elif current_width + space + word_width <= max_width:
+            current += " " + word
+            current_width += space + word_width
+        else:
+            lines.append(current)
+            current, current_width = word, word_width
+
+    if current:
+        lines.append(current)
+    return tuple(lines)
+
+
+class NodeMetrics:
+    __slots__ = ("lines", "width", "height")
+
+    def __init__(self, lines, width, height):
+        self.lines = lines
+        self.width = width
+        self.height = height
+
+    def __iter__(self):
+        return iter((self.lines, self.width, self.height))
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def measure_node(text, node_type, font=DEFAULT_FONT, size=NODE_FONT_SIZE):
+    """Wrapped lines and box size (px) for a node label."""
+    min_width, max_text_width, padding = NODE_BOXES.get(node_type, NODE_BOXES["process"])
+    lines = wrap_lines(text, font, size, max_text_width)
+
+    widest = max((text_width(line, font, size) for line in lines), default=0)
+    width = max(min_width, round(widest + padding))
+    height = MIN_BOX_HEIGHT + len(lines) * LINE_HEIGHT
+    if node_type == "decision":
+        height += DECISION_EXTRA_HEIGHT
+    return NodeMetrics(lines, width, height)
+
+
+def cache_stats():
+    return {
+        "text_width": text_width.cache_info()._asdict(),
+        "wrap_lines": wrap_lines.cache_info()._asdict(),
+        "measure_node": measure_node.cache_info()._asdict(),
+    }